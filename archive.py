@@ -0,0 +1,131 @@
+import os, sqlite3, threading, time
+from typing import Any, Dict, Optional
+from config import ARCHIVE_FILE
+
+class DownloadArchive:
+    """SQLite record of finished downloads, keyed by "<extractor> <video id>".
+
+    Each row also holds the codec and resolution that were produced, plus the
+    output path and size, so a video is only skipped when the same output
+    already exists. Safe to share between worker threads.
+    """
+
+    def __init__(self, path: str = ARCHIVE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS downloads (
+                archive_id    TEXT NOT NULL,
+                codec         TEXT NOT NULL,
+                resolution    TEXT NOT NULL,
+                filepath      TEXT NOT NULL,
+                size          INTEGER NOT NULL,
+                title         TEXT,
+                downloaded_at REAL NOT NULL,
+                PRIMARY KEY (archive_id, codec, resolution)
+            )""")
+        self._conn.commit()
+
+    @staticmethod
+    def _resolution_key(codec: str, resolution: str) -> str:
+        # Resolution does not matter for audio-only output
+        return "" if "Audio Only" in codec else resolution
+
+    def lookup(self, archive_id: str, codec: str, resolution: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT filepath, size, title, downloaded_at FROM downloads "
+                "WHERE archive_id = ? AND codec = ? AND resolution = ?",
+                (archive_id, codec, self._resolution_key(codec, resolution))).fetchone()
+        if row is None:
+            return None
+        return {"filepath": row[0], "size": row[1], "title": row[2], "downloaded_at": row[3]}
+
+    def is_satisfied(self, archive_id: str, codec: str, resolution: str, verify: bool = False) -> bool:
+        """True if this output was already produced (and, with verify, is still intact on disk)"""
+        record = self.lookup(archive_id, codec, resolution)
+        if record is None:
+            return False
+        if verify:
+            try:
+                size: Optional[int] = os.path.getsize(record["filepath"])
+            except OSError:
+                size = None
+            if size != record["size"]:
+                # Missing or changed: forget it so the video is fetched again. Only a file cut
+                # short of the recorded size is removed (yt-dlp would take it as downloaded),
+                # and never one another row vouches for: that is a complete output of its own.
+                if (size is not None and size < record["size"]
+                        and not self._claimed(record["filepath"], size, archive_id, codec, resolution)):
+                    try:
+                        os.remove(record["filepath"])
+                    except OSError:
+                        pass
+                self.forget(archive_id, codec, resolution)
+                return False
+        return True
+
+    def _claimed(self, filepath: str, size: int, archive_id: str, codec: str, resolution: str) -> bool:
+        """True if another output row records this file at this size"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM downloads WHERE filepath = ? AND size = ? "
+                "AND NOT (archive_id = ? AND codec = ? AND resolution = ?)",
+                (filepath, size, archive_id, codec, self._resolution_key(codec, resolution))).fetchone() is not None
+
+    def record(self, archive_id: str, codec: str, resolution: str, filepath: str,
+               title: Optional[str] = None) -> None:
+        try:
+            size = os.path.getsize(filepath)
+        except OSError:
+            return  # Nothing on disk to vouch for
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (archive_id, codec, self._resolution_key(codec, resolution),
+                 os.path.abspath(filepath), size, title, time.time()))
+            self._conn.commit()
+
+    def forget(self, archive_id: str, codec: Optional[str] = None, resolution: Optional[str] = None) -> None:
+        """Drop one output of a video, or every output when no codec is given"""
+        with self._lock:
+            if codec is None:
+                self._conn.execute("DELETE FROM downloads WHERE archive_id = ?", (archive_id,))
+            else:
+                self._conn.execute(
+                    "DELETE FROM downloads WHERE archive_id = ? AND codec = ? AND resolution = ?",
+                    (archive_id, codec, self._resolution_key(codec, resolution or "")))
+            self._conn.commit()
+
+    def view(self, codec: str, resolution: str, verify: bool = False) -> "ArchiveView":
+        return ArchiveView(self, codec, resolution, verify)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class ArchiveView:
+    """Set-like adapter for yt-dlp's `download_archive` option.
+
+    yt-dlp checks membership before extracting a URL or playlist entry, so
+    satisfied videos are skipped without any network fetch. Records are
+    written by the engine once the file is in place, so `add` is a no-op.
+    """
+
+    def __init__(self, archive: DownloadArchive, codec: str, resolution: str, verify: bool):
+        self.archive = archive
+        self.codec = codec
+        self.resolution = resolution
+        self.verify = verify
+
+    def __contains__(self, archive_id: object) -> bool:
+        return isinstance(archive_id, str) and self.archive.is_satisfied(
+            archive_id, self.codec, self.resolution, self.verify)
+
+    def __bool__(self) -> bool:
+        return True  # yt-dlp skips archive checks for an empty (falsy) archive
+
+    def add(self, archive_id: str) -> None:
+        pass
@@ -0,0 +1,161 @@
+import re, threading, time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# === Bandwidth governor ===
+PRIORITY_WEIGHTS = {"low": 1, "normal": 4, "high": 16}  # Share of the cap per running job
+DEFAULT_PRIORITY = "normal"
+BURST_SECONDS = 0.5    # Tokens a job may save up, in seconds of its allocation
+IDLE_AFTER = 2.0       # A job that transferred nothing for this long leaves its share to others
+WAIT_SLICE = 0.25      # Longest sleep before limits, shares and cancellation are checked again
+
+_RATE_RE = re.compile(r'(?i)^(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?(?:/s)?$')
+_SCHEDULE_RE = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(\S+)\s*$')
+
+def parse_rate(value: Any) -> Optional[float]:
+    """'2M', '500K', 1048576 -> bytes/s; None, '', '0' or 'unlimited' -> None (no cap)"""
+    if value is None or str(value).strip().lower() in ("", "0", "none", "unlimited"):
+        return None
+    if isinstance(value, (int, float)):
+        rate = float(value)
+    else:
+        # Same binary units as yt-dlp's --limit-rate
+        match = _RATE_RE.match(str(value).strip())
+        if not match:
+            raise ValueError(f"invalid rate: {value}")
+        rate = float(match.group(1)) * 1024 ** " kmgt".index(match.group(2).lower() or " ")
+    return rate if rate > 0 else None
+
+def parse_schedule(entries: Optional[Iterable[str]]) -> List[Tuple[int, int, Optional[float]]]:
+    """['09:00-18:00=2M', '22:00-06:00=unlimited'] -> [(start minute, end minute, bytes/s), ...]"""
+    schedule = []
+    for entry in entries or ():
+        match = _SCHEDULE_RE.match(str(entry))
+        if not match:
+            raise ValueError(f"invalid schedule entry: {entry}")
+        h1, m1, h2, m2, rate = match.groups()
+        start, end = int(h1) * 60 + int(m1), int(h2) * 60 + int(m2)
+        if start >= 24 * 60 or end > 24 * 60 or int(m1) > 59 or int(m2) > 59:
+            raise ValueError(f"invalid schedule entry: {entry}")
+        schedule.append((start, end, parse_rate(rate)))
+    return schedule
+
+def priority_weight(priority: Any) -> int:
+    """Named priority or a positive number -> weight"""
+    if priority in PRIORITY_WEIGHTS:
+        return PRIORITY_WEIGHTS[priority]
+    try:
+        return max(1, int(priority))
+    except (TypeError, ValueError):
+        return PRIORITY_WEIGHTS[DEFAULT_PRIORITY]
+
+class _Flow:
+    def __init__(self, weight: int):
+        self.weight = weight
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.active = 0.0          # Last time the flow transferred or waited
+        self.waiting = False
+
+class BandwidthGovernor:
+    """Process-wide token bucket shared by every running download.
+
+    The cap (fixed, or from the time-of-day schedule) is split between the
+    jobs currently transferring in proportion to their weights; a job that
+    goes idle, e.g. while it encodes, leaves its share to the others. Jobs
+    pay for each chunk after receiving it and sleep off the debt, so changes
+    to the cap or to weights take effect on the next chunk. Thread-safe.
+    """
+
+    def __init__(self, limit: Optional[float] = None,
+                 schedule: Optional[List[Tuple[int, int, Optional[float]]]] = None):
+        self._cond = threading.Condition()
+        self.limit = limit
+        self.schedule = schedule or []
+        self._flows: Dict[str, _Flow] = {}
+
+    # === Settings (may change while jobs run) ===
+    def set_limit(self, limit: Optional[float]) -> None:
+        with self._cond:
+            self.limit = limit
+            self._cond.notify_all()
+
+    def set_schedule(self, schedule: List[Tuple[int, int, Optional[float]]]) -> None:
+        with self._cond:
+            self.schedule = list(schedule)
+            self._cond.notify_all()
+
+    def current_limit(self, now: Optional[datetime] = None) -> Optional[float]:
+        """The cap in force: the first schedule window containing `now`, else `limit`"""
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end, rate in self.schedule:
+            inside = start <= minute < end if start < end else (minute >= start or minute < end)
+            if inside:
+                return rate
+        return self.limit
+
+    # === Jobs ===
+    def register(self, key: str, weight: int = PRIORITY_WEIGHTS[DEFAULT_PRIORITY]) -> None:
+        with self._cond:
+            self._flows[key] = _Flow(max(1, int(weight)))
+            self._cond.notify_all()
+
+    def unregister(self, key: str) -> None:
+        with self._cond:
+            self._flows.pop(key, None)
+            self._cond.notify_all()
+
+    def set_weight(self, key: str, weight: int) -> None:
+        with self._cond:
+            flow = self._flows.get(key)
+            if flow is not None:
+                flow.weight = max(1, int(weight))
+                self._cond.notify_all()
+
+    def _share(self, key: str, limit: Optional[float], now: float) -> Optional[float]:
+        # Caller holds self._cond
+        flow = self._flows.get(key)
+        if limit is None or flow is None:
+            return None
+        active = sum(f.weight for k, f in self._flows.items()
+                     if k != key and (f.waiting or now - f.active < IDLE_AFTER))
+        return limit * flow.weight / (active + flow.weight)
+
+    def allocation(self, key: str) -> Optional[float]:
+        """Bytes/s currently granted to a job, or None when nothing is capped"""
+        with self._cond:
+            return self._share(key, self.current_limit(), time.monotonic())
+
+    def consume(self, key: str, nbytes: int, cancel_event: Optional[threading.Event] = None) -> None:
+        """Account for `nbytes` a job just received, sleeping while it is over its share"""
+        if nbytes <= 0:
+            return
+        with self._cond:
+            flow = self._flows.get(key)
+            if flow is None:
+                return
+            flow.tokens -= nbytes
+            flow.waiting = True
+            try:
+                while True:
+                    now = time.monotonic()
+                    rate = self._share(key, self.current_limit(), now)
+                    if rate is None:
+                        flow.tokens = 0.0
+                    else:
+                        flow.tokens = min(rate * BURST_SECONDS, flow.tokens + (now - flow.updated) * rate)
+                    flow.updated = now
+                    if flow.tokens >= 0 or key not in self._flows or (cancel_event and cancel_event.is_set()):
+                        return
+                    self._cond.wait(min(WAIT_SLICE, -flow.tokens / rate))  # pyright: ignore[reportOptionalOperand]
+            finally:
+                flow.waiting = False
+                flow.active = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            limit, now = self.current_limit(), time.monotonic()
+            return {"limit": limit,
+                    "jobs": {key: {"weight": flow.weight, "allocation": self._share(key, limit, now)}
+                             for key, flow in self._flows.items()}}
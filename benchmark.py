@@ -0,0 +1,441 @@
+"""Offline end-to-end benchmark with synthetic media and a local server stand-in.
+
+    python -m benchmark [--output bench.json] [--heights 360,720] [--seconds 10]
+                        [--latency 0.05] [--bandwidth 4M] [--codec libx264] [--ui]
+    python -m benchmark --compare before.json after.json
+
+Test media is generated once with ffmpeg's lavfi sources (progressive MP4,
+DASH and HLS at each height) and served from a local HTTP server that adds
+per-request latency and per-connection bandwidth shaping. Every case runs
+through the download engine and yt-dlp's generic extractor, so no network
+access is needed. Results are written as JSON for comparison across commits.
+"""
+import argparse, http.server, json, os, platform, shutil, socketserver, subprocess, sys
+import tempfile, threading, time
+from typing import Any, Dict, List, Optional
+from config import BASE_DIR, get_ffmpeg_path, get_startupinfo
+from downloader import (DownloadManager, DownloadOptions, detect_available_codecs,
+                        cached_available_codecs, resolve_codec_name, get_process_registry, JOB_DONE)
+from processes import TERMINATE_GRACE
+from progress import JobProgress, PHASE_DOWNLOAD, PHASE_POST, FINAL_PHASES
+from bandwidth import parse_rate
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MEDIA_DIR = os.path.join(BASE_DIR, "bench_media")
+FRAME_RATE = 30
+SEGMENT_SECONDS = 2
+SOURCE_VCODEC = "mpeg4"  # Fast to generate, and unlike YouTube's codecs never stream-copied
+CANCEL_AFTER = 0.2       # Seconds into the encode at which the cancel case cancels
+UI_TICK = 0.05           # Simulated main loop interval for the UI case (matches UI_PUMP_INTERVAL_MS)
+
+# === Media generation ===
+def _ffmpeg(*args: str) -> None:
+    subprocess.run([get_ffmpeg_path(), "-hide_banner", "-loglevel", "error", "-y", *args],
+                   check=True, startupinfo=get_startupinfo())
+
+def generate_media(media_dir: str, heights: List[int], seconds: int) -> List[Dict[str, Any]]:
+    """Progressive, DASH and HLS renditions per height; reuses files from earlier runs"""
+    cases = []
+    for height in heights:
+        width = (height * 16 // 9) // 2 * 2
+        stem = f"{height}p_{seconds}s"
+        progressive = os.path.join(media_dir, f"{stem}.mp4")
+        if not os.path.exists(progressive):
+            _ffmpeg("-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={FRAME_RATE}:duration={seconds}",
+                    "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+                    "-c:v", SOURCE_VCODEC, "-q:v", "5", "-g", str(FRAME_RATE * SEGMENT_SECONDS),
+                    "-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", progressive + ".tmp.mp4")
+            os.replace(progressive + ".tmp.mp4", progressive)
+
+        dash = os.path.join(media_dir, f"{stem}_dash", "manifest.mpd")
+        if not os.path.exists(dash):
+            os.makedirs(os.path.dirname(dash), exist_ok=True)
+            _ffmpeg("-i", progressive, "-map", "0:v", "-map", "0:a", "-c", "copy",
+                    "-f", "dash", "-seg_duration", str(SEGMENT_SECONDS), "-use_template", "1",
+                    "-use_timeline", "0", "-adaptation_sets", "id=0,streams=v id=1,streams=a", dash)
+
+        hls = os.path.join(media_dir, f"{stem}_hls", "index.m3u8")
+        if not os.path.exists(hls):
+            os.makedirs(os.path.dirname(hls), exist_ok=True)
+            _ffmpeg("-i", progressive, "-c", "copy", "-f", "hls", "-hls_time", str(SEGMENT_SECONDS),
+                    "-hls_playlist_type", "vod",
+                    "-hls_segment_filename", os.path.join(os.path.dirname(hls), "seg%03d.ts"), hls)
+
+        for kind, path in (("progressive", progressive), ("dash", dash), ("hls", hls)):
+            cases.append({"name": f"{kind}-{height}p", "kind": kind, "height": height,
+                          "path": os.path.relpath(path, media_dir).replace(os.sep, "/"),
+                          "frames": FRAME_RATE * seconds})
+    return cases
+
+# === Shaped HTTP server ===
+class ShapedHandler(http.server.SimpleHTTPRequestHandler):
+    """Static files with a delay before each response and a per-connection rate cap"""
+    latency = 0.0
+    bandwidth: Optional[float] = None  # bytes/s per connection
+    chunk_size = 16 * 1024
+    counters: Dict[str, int] = {"requests": 0, "bytes": 0}
+    counters_lock = threading.Lock()
+
+    def send_head(self):
+        time.sleep(self.latency)
+        with self.counters_lock:
+            self.counters["requests"] += 1
+        return super().send_head()
+
+    def copyfile(self, source, outputfile) -> None:
+        started, sent = time.monotonic(), 0
+        while True:
+            chunk = source.read(self.chunk_size)
+            if not chunk:
+                return
+            outputfile.write(chunk)
+            sent += len(chunk)
+            with self.counters_lock:
+                self.counters["bytes"] += len(chunk)
+            if self.bandwidth:
+                ahead = sent / self.bandwidth - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+class _ThreadingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)  # Clients hanging up early is normal
+
+def start_server(media_dir: str, latency: float, bandwidth: Optional[float]):
+    """Serve `media_dir` on a free localhost port; returns (server, base URL)"""
+    handler = type("Handler", (ShapedHandler,), {
+        "latency": latency, "bandwidth": bandwidth,
+        "counters": {"requests": 0, "bytes": 0}, "counters_lock": threading.Lock(),
+        "__init__": lambda self, *a, **kw: ShapedHandler.__init__(self, *a, directory=media_dir, **kw)})
+    server = _ThreadingServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+# === Measurements ===
+class CaseRecorder:
+    """Timestamps of a job's phases, taken from engine progress events"""
+
+    def __init__(self):
+        self.submitted = time.monotonic()
+        self.first_byte: Optional[float] = None
+        self.last_byte: Optional[float] = None
+        self.encode_started: Optional[float] = None
+        self.encode_seconds = 0.0
+        self.events = 0
+
+    def on_progress(self, job: Any, progress: JobProgress) -> None:
+        now = time.monotonic()
+        self.events += 1
+        if progress.phase == PHASE_DOWNLOAD and progress.downloaded_bytes:
+            self.first_byte = self.first_byte or now
+            self.last_byte = now
+        encoding = progress.phase == PHASE_POST and progress.postprocessor in ("Merger", "VideoConvertor")
+        if encoding and self.encode_started is None:
+            self.encode_started = now
+        elif not encoding and self.encode_started is not None:
+            self.encode_seconds += now - self.encode_started
+            self.encode_started = None
+        if progress.phase in FINAL_PHASES and self.encode_started is not None:
+            self.encode_seconds += now - self.encode_started
+            self.encode_started = None
+
+def _round(value: Optional[float], digits: int = 3) -> Optional[float]:
+    return round(value, digits) if value is not None else None
+
+def case_options(options: DownloadOptions, output_dir: str, case: Dict[str, Any]) -> DownloadOptions:
+    """Same settings, but a directory of its own so no case finds another's output"""
+    return DownloadOptions.from_dict({**options.to_dict(), "output_dir": os.path.join(output_dir, case["name"])})
+
+def run_case(manager: DownloadManager, case: Dict[str, Any], base_url: str, server: Any,
+             options: DownloadOptions) -> Dict[str, Any]:
+    counters = server.RequestHandlerClass.counters
+    bytes_before = counters["bytes"]
+    recorder = CaseRecorder()
+    batch = manager.submit([base_url + case["path"]], options, _QuietLogger(),
+                           on_progress=recorder.on_progress)
+    batch.wait()
+    finished = time.monotonic()
+    job = batch.jobs[0]
+    served = counters["bytes"] - bytes_before
+    download_seconds = (recorder.last_byte - recorder.first_byte
+                        if recorder.first_byte and recorder.last_byte else None)
+    return {"name": case["name"], "kind": case["kind"], "height": case["height"],
+            "state": job.state, "error": job.error,
+            "wall_seconds": _round(finished - recorder.submitted),
+            "ttfb_seconds": _round(recorder.first_byte - recorder.submitted if recorder.first_byte else None),
+            "bytes": served,
+            "throughput_bps": _round(served / download_seconds if download_seconds else None, 1),
+            "transcode_seconds": _round(recorder.encode_seconds or None),
+            "transcode_fps": _round(case["frames"] / recorder.encode_seconds
+                                    if recorder.encode_seconds else None, 1),
+            "progress_events": recorder.events}
+
+def measure_cancel(manager: DownloadManager, case: Dict[str, Any], base_url: str,
+                   options: DownloadOptions) -> Dict[str, Any]:
+    """Cancel a job while ffmpeg encodes; time until the job has finished and its processes are gone"""
+    registry = get_process_registry()
+    batch = manager.submit([base_url + case["path"]], options, _QuietLogger())
+    job = batch.jobs[0]
+    while not job.finished and registry.active(job.key) == 0:
+        time.sleep(0.01)
+    time.sleep(CANCEL_AFTER)
+    processes = registry.processes(job.key)
+    if job.finished or not any(proc.poll() is None for proc in processes):
+        return {"case": case["name"], "state": job.state, "cancel_to_idle_seconds": None}
+    started = time.monotonic()
+    manager.cancel(job.id)
+    while not job.finished or any(proc.poll() is None for proc in processes):
+        time.sleep(0.005)
+    idle = time.monotonic() - started
+    time.sleep(TERMINATE_GRACE)  # Partial outputs are removed once their process is reaped
+    leftovers = [name for name in os.listdir(options.output_dir) if ".temp." in name]
+    return {"case": case["name"], "state": job.state, "cancel_to_idle_seconds": _round(idle),
+            "processes_killed": len(processes), "partial_outputs_left": len(leftovers)}
+
+def measure_codec_probe() -> Dict[str, Any]:
+    """Cold (every encoder test-encoded) and warm (cache hit) capability detection"""
+    started = time.monotonic()
+    codecs = detect_available_codecs(get_ffmpeg_path(), use_cache=False)
+    cold = time.monotonic() - started
+    started = time.monotonic()
+    cached_available_codecs(get_ffmpeg_path())
+    warm = time.monotonic() - started
+    return {"cold_seconds": _round(cold), "warm_seconds": _round(warm, 5), "codecs": len(codecs)}
+
+class _QuietLogger:
+    def debug(self, msg: str) -> None:
+        pass
+
+    def warning(self, msg: str) -> None:
+        pass
+
+    def error(self, msg: str) -> None:
+        print(msg, file=sys.stderr)
+
+# === UI event rate ===
+class _FakeWidget:
+    """Stands in for a CTk widget: counts what the UI code does to it"""
+
+    def __init__(self, counts: Dict[str, int]):
+        self.counts = counts
+
+    def configure(self, **kwargs: Any) -> None:
+        self.counts["widget_updates"] += 1
+
+    def set(self, value: Any) -> None:
+        self.counts["widget_updates"] += 1
+
+class _FakeLogView:
+    """Stands in for ui.LogView: counts the ticks that had new log lines to show"""
+
+    def __init__(self, counts: Dict[str, int]):
+        self.counts = counts
+        self.pending = 0
+
+    def on_record(self, record: Dict[str, Any]) -> None:
+        self.counts["log_lines"] += 1
+        self.pending += 1
+
+    def refresh(self) -> None:
+        if self.pending:
+            self.pending = 0
+            self.counts["log_inserts"] += 1
+
+class _FakeRoot:
+    """Runs `after` callbacks on a timer thread the way Tk's main loop would"""
+
+    def __init__(self, counts: Dict[str, int]):
+        self.counts = counts
+        self.alive = True
+
+    def winfo_exists(self) -> bool:
+        return self.alive
+
+    def after(self, ms: int, func: Any) -> None:
+        def tick():
+            self.counts["main_loop_ticks"] += 1
+            func()
+        timer = threading.Timer(ms / 1000, tick)
+        timer.daemon = True
+        timer.start()
+
+def measure_ui(case: Dict[str, Any], base_url: str, options: DownloadOptions) -> Dict[str, Any]:
+    """Run one case through ui.download_videos with counting widgets instead of Tk"""
+    import ui
+    counts = {"main_loop_ticks": 0, "widget_updates": 0, "log_inserts": 0,
+              "log_lines": 0, "progress_events": 0}
+    root = _FakeRoot(counts)
+    widget = _FakeWidget(counts)
+    log_view = _FakeLogView(counts)
+    ui.get_job_log().add_listener(log_view.on_record)
+    pump = ui.UiPump(root, log_view)
+    pump_set = pump.set
+
+    def set_update(key: str, func: Any) -> None:
+        counts["progress_events"] += 1
+        pump_set(key, func)
+    pump.set = set_update  # type: ignore[method-assign]
+    pump.start()
+
+    # The GUI only accepts YouTube URLs; let the local stand-in through for this run
+    validate = ui.validate_youtube_url
+    ui.validate_youtube_url = lambda url: True
+    try:
+        started = time.monotonic()
+        batch = ui.download_videos([base_url + case["path"]], options.codec_choice, options.res_choice,
+                                   log_view, widget, widget, widget, widget, widget, root,
+                                   pump=pump, options=options)
+    finally:
+        ui.validate_youtube_url = validate
+    if batch is not None:
+        batch.wait()
+    time.sleep(UI_TICK * 3)  # Let the final updates drain
+    elapsed = time.monotonic() - started
+    root.alive = False
+    ui.get_job_log().remove_listener(log_view.on_record)
+    return {"case": case["name"], "seconds": _round(elapsed),
+            **counts, **{f"{key}_per_second": _round(value / elapsed, 1) for key, value in counts.items()}}
+
+def peak_rss_kb() -> Dict[str, Optional[int]]:
+    if resource is None:
+        return {"self": None, "children": None}
+    scale = 1024 if sys.platform == "darwin" else 1  # ru_maxrss is bytes on macOS, KiB elsewhere
+    return {"self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale}
+
+def environment() -> Dict[str, Any]:
+    import yt_dlp
+    commit = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                                text=True, timeout=5, startupinfo=get_startupinfo()).stdout.strip() or None
+    except Exception:
+        pass
+    return {"commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "yt_dlp": yt_dlp.version.__version__,
+            "ffmpeg": get_ffmpeg_path()}
+
+# === Comparison ===
+COMPARED_METRICS = ("wall_seconds", "ttfb_seconds", "throughput_bps", "transcode_fps")
+
+def compare(before: Dict[str, Any], after: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Per-case metric changes between two result files"""
+    rows = []
+    old_cases = {case["name"]: case for case in before.get("cases", [])}
+    for case in after.get("cases", []):
+        old = old_cases.get(case["name"])
+        if not old:
+            continue
+        for metric in COMPARED_METRICS:
+            a, b = old.get(metric), case.get(metric)
+            if a and b:
+                rows.append({"case": case["name"], "metric": metric, "before": a, "after": b,
+                             "change": f"{(b - a) / a * 100:+.1f}%"})
+    for section, metric in (("codec_probe", "cold_seconds"), ("peak_rss_kb", "self")):
+        a, b = (before.get(section) or {}).get(metric), (after.get(section) or {}).get(metric)
+        if a and b:
+            rows.append({"case": section, "metric": metric, "before": a, "after": b,
+                         "change": f"{(b - a) / a * 100:+.1f}%"})
+    return rows
+
+# === Entry point ===
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmark",
+                                     description="Benchmark the download engine offline against synthetic media.")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="JSON file for the results")
+    parser.add_argument("--heights", default="360,720", help="comma-separated video heights to generate")
+    parser.add_argument("--seconds", type=int, default=10, help="length of the generated media")
+    parser.add_argument("--latency", type=float, default=0.05, help="server delay before each response (s)")
+    parser.add_argument("--bandwidth", default="8M", help="per-connection rate cap, e.g. 4M, or 'unlimited'")
+    parser.add_argument("-c", "--codec", default="libx264", help="target codec (CLI codec names/aliases)")
+    parser.add_argument("-f", "--fragments", type=int, default=4, help="parallel DASH/HLS fragments")
+    parser.add_argument("--media-dir", default=MEDIA_DIR, help="where generated media is kept between runs")
+    parser.add_argument("--skip-probe", action="store_true", help="do not time codec detection")
+    parser.add_argument("--ui", action="store_true", help="also measure UI event rates (needs customtkinter)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="print metric changes between two result files and exit")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            before = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            after = json.load(f)
+        for row in compare(before, after):
+            print(json.dumps(row))
+        return 0
+
+    if not get_ffmpeg_path():
+        print("FFMPEG not found", file=sys.stderr)
+        return 2
+    codec = resolve_codec_name(args.codec)
+    if codec is None:
+        parser.error(f"unknown codec: {args.codec}")
+    try:
+        heights = [int(h) for h in args.heights.split(",") if h.strip()]
+        bandwidth = parse_rate(args.bandwidth)
+    except ValueError as e:
+        parser.error(str(e))
+
+    os.makedirs(args.media_dir, exist_ok=True)
+    started = time.monotonic()
+    cases = generate_media(args.media_dir, heights, args.seconds)
+    print(f"Media ready in {time.monotonic() - started:.1f}s", file=sys.stderr)
+
+    results: Dict[str, Any] = {"environment": environment(),
+                               "settings": {"heights": heights, "seconds": args.seconds,
+                                            "latency": args.latency, "bandwidth": bandwidth,
+                                            "codec": codec, "fragments": args.fragments}}
+    if not args.skip_probe:
+        results["codec_probe"] = measure_codec_probe()
+
+    server, base_url = start_server(args.media_dir, args.latency, bandwidth)
+    output_dir = tempfile.mkdtemp(prefix="yt-bench-")
+    try:
+        options = DownloadOptions(codec, f"{max(heights)}p", output_dir, use_archive=False,
+                                  fragments=args.fragments)
+        manager = DownloadManager(max_workers=1)
+        results["cases"] = []
+        for case in cases:
+            result = run_case(manager, case, base_url, server, case_options(options, output_dir, case))
+            print(f"{case['name']}: {result['state']} in {result['wall_seconds']}s", file=sys.stderr)
+            results["cases"].append(result)
+        # The largest DASH case with a forced transcode spends the longest in ffmpeg
+        dash = [case for case in cases if case["kind"] == "dash"][-1]
+        cancel_case = {**dash, "name": dash["name"] + "-cancel"}
+        results["cancel"] = measure_cancel(manager, cancel_case, base_url,
+                                           case_options(options, output_dir, cancel_case))
+        print(f"cancel: idle after {results['cancel']['cancel_to_idle_seconds']}s", file=sys.stderr)
+        if args.ui:
+            # The largest DASH case exercises merging, fragments and the most progress events
+            dash = [case for case in cases if case["kind"] == "dash"][-1]
+            ui_case = {**dash, "name": dash["name"] + "-ui"}
+            results["ui"] = measure_ui(ui_case, base_url, case_options(options, output_dir, ui_case))
+        results["server"] = dict(server.RequestHandlerClass.counters)
+        results["all_done"] = all(case["state"] == JOB_DONE for case in results["cases"])
+    finally:
+        server.shutdown()
+        shutil.rmtree(output_dir, ignore_errors=True)
+    results["peak_rss_kb"] = peak_rss_kb()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+    return 0 if results["all_done"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""Encoder speed/quality calibration for this machine, and goal-based preset choice.
+
+    python -m calibration [--encoders libx264,h264_nvenc] [--heights 480,720,1080] [--seconds 2]
+    python -m calibration --show [--goal fastest:0.95] [--resolution 1080p]
+
+Each usable encoder encodes a short synthetic clip (ffmpeg's testsrc2) with
+each of its presets at a few resolutions, all at the same bitrate for a given
+pixel count, so presets trade speed for quality rather than file size. The
+encode speed (fps) and the quality against the lossless source (SSIM and
+PSNR) are stored per machine in calibration.json. With a goal set (`--goal` on the CLI, "encoder_goal" in
+config.json) the engine then picks the encoder and preset for each job from
+these measurements:
+
+    fastest:0.95    fastest preset whose SSIM is at least 0.95 (above 1: PSNR in dB)
+    quality:1.0     best SSIM that still encodes at 1x real time or faster
+"""
+import argparse, json, os, platform, re, subprocess, sys, tempfile, time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config import get_ffmpeg_path, get_startupinfo, load_calibration, save_calibration
+
+CLIP_FPS = 30               # Real time for the speed multiplier
+CLIP_SECONDS = 2
+CALIBRATION_HEIGHTS = (480, 720, 1080)
+ENCODE_TIMEOUT = 120        # seconds allowed for one calibration encode
+BITRATE_1080P_KBPS = 5000   # Presets are compared at equal bitrate, scaled by pixel count per height
+
+GOAL_FASTEST = "fastest"    # Fastest preset meeting a quality floor
+GOAL_QUALITY = "quality"    # Best quality meeting a speed floor
+DEFAULT_THRESHOLDS = {GOAL_FASTEST: 0.95, GOAL_QUALITY: 1.0}
+
+def _presets(encoder: str, flag: str, values: Tuple[str, ...], extra: Tuple[str, ...] = ()) -> List[Tuple[str, List[str]]]:
+    return [(value, ['-c:v', encoder, *extra, flag, value]) for value in values]
+
+# Presets tried per encoder, fastest first: (name, full encoder arguments)
+ENCODER_PRESETS: Dict[str, List[Tuple[str, List[str]]]] = {
+    "libx264": _presets("libx264", "-preset", ("ultrafast", "superfast", "veryfast", "faster", "fast",
+                                               "medium", "slow")),
+    "libx265": _presets("libx265", "-preset", ("ultrafast", "superfast", "veryfast", "fast", "medium")),
+    "h264_nvenc": _presets("h264_nvenc", "-preset", ("p1", "p2", "p3", "p4", "p5", "p6", "p7")),
+    "hevc_nvenc": _presets("hevc_nvenc", "-preset", ("p1", "p2", "p3", "p4", "p5", "p6", "p7")),
+    "h264_qsv": _presets("h264_qsv", "-preset", ("veryfast", "faster", "fast", "medium", "slow", "veryslow")),
+    "hevc_qsv": _presets("hevc_qsv", "-preset", ("veryfast", "faster", "fast", "medium", "slow", "veryslow")),
+    "h264_amf": [(q, ['-c:v', 'h264_amf', '-quality', q, '-pix_fmt', 'yuv420p'])
+                 for q in ("speed", "balanced", "quality")],
+    "hevc_amf": [(q, ['-c:v', 'hevc_amf', '-quality', q, '-pix_fmt', 'yuv420p'])
+                 for q in ("speed", "balanced", "quality")],
+    "libvpx-vp9": [(f"{deadline}-{cpu}", ['-c:v', 'libvpx-vp9', '-deadline', deadline,
+                                          '-cpu-used', str(cpu), '-row-mt', '1'])
+                   for deadline, cpu in (("realtime", 8), ("realtime", 5), ("good", 4), ("good", 2))],
+}
+
+def machine_key() -> str:
+    """Results are only reused on the machine that measured them"""
+    return "|".join((platform.node(), platform.system(), platform.machine(), platform.processor() or ""))
+
+def bitrate_args(height: int) -> List[str]:
+    return ['-b:v', f"{max(500, round(BITRATE_1080P_KBPS * (height / 1080) ** 2))}k"]
+
+def preset_args(row: Dict[str, Any], height: int) -> List[str]:
+    """Encoder arguments for a calibrated preset, at the bitrate it was compared at for `height`"""
+    return list(row["args"]) + bitrate_args(height)
+
+# === Goals ===
+def parse_goal(value: Optional[str]) -> Optional[Tuple[str, float]]:
+    """'fastest:0.95', 'quality', 'quality:1.5' -> (goal, threshold); None/''/'off' -> None"""
+    if not value or str(value).strip().lower() in ("off", "none", "default"):
+        return None
+    name, _, threshold = str(value).strip().lower().partition(":")
+    if name not in DEFAULT_THRESHOLDS:
+        raise ValueError(f"invalid encoder goal: {value}")
+    try:
+        return name, float(threshold) if threshold else DEFAULT_THRESHOLDS[name]
+    except ValueError:
+        raise ValueError(f"invalid encoder goal: {value}")
+
+def machine_results(fingerprint: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """This machine's measurements; empty if they were taken with a different ffmpeg"""
+    entry = load_calibration().get(machine_key())
+    if not isinstance(entry, dict):
+        return []
+    if fingerprint and entry.get("ffmpeg", {}).get("version") != fingerprint.get("version"):
+        return []
+    return [row for row in entry.get("results") or () if isinstance(row, dict)]
+
+def _estimate(rows: List[Dict[str, Any]], height: int) -> Tuple[Dict[str, Any], float]:
+    """The measurement nearest `height` and its speed multiplier scaled to that height's pixel count"""
+    row = min(rows, key=lambda r: (abs(r["height"] - height), -r["height"]))
+    fps = row["fps"] * (row["height"] / height) ** 2
+    return row, fps / CLIP_FPS
+
+def choose_preset(results: List[Dict[str, Any]], encoders: List[str], height: int,
+                  goal: Tuple[str, float]) -> Optional[Dict[str, Any]]:
+    """Pick the measured encoder/preset among `encoders` that best meets `goal` at `height`.
+
+    When nothing meets the goal, the closest miss wins (best quality, or fastest).
+    """
+    grouped: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for row in results:
+        if row.get("encoder") in encoders and row.get("fps"):
+            grouped.setdefault((row["encoder"], row["preset"]), []).append(row)
+    if not grouped:
+        return None
+    candidates = [_estimate(rows, height) for rows in grouped.values()]
+    name, threshold = goal
+
+    def quality(row: Dict[str, Any]) -> float:
+        # Thresholds above 1 are PSNR in dB, otherwise SSIM
+        return (row.get("psnr") if threshold > 1 else row.get("ssim")) or 0.0
+
+    if name == GOAL_FASTEST:
+        meeting = [c for c in candidates if quality(c[0]) >= threshold]
+        if meeting:
+            return max(meeting, key=lambda c: c[1])[0]
+        return max(candidates, key=lambda c: (c[0].get("ssim") or 0.0, c[1]))[0]
+    meeting = [c for c in candidates if c[1] >= threshold]
+    if meeting:
+        return max(meeting, key=lambda c: (c[0].get("ssim") or 0.0, c[1]))[0]
+    return max(candidates, key=lambda c: c[1])[0]
+
+# === Measuring ===
+_SSIM_RE = re.compile(r'SSIM .*All:([\d.]+)')
+_PSNR_RE = re.compile(r'PSNR .*average:([\d.]+|inf)')
+
+def _run(ffmpeg_path: str, args: List[str]) -> subprocess.CompletedProcess:
+    return subprocess.run([ffmpeg_path, "-hide_banner", "-nostats", "-y", *args], capture_output=True,
+                          text=True, errors="replace", timeout=ENCODE_TIMEOUT, startupinfo=get_startupinfo())
+
+def make_source(ffmpeg_path: str, directory: str, height: int, seconds: int) -> str:
+    """Lossless 16:9 test clip, so encoding speed is not limited by generating the input"""
+    path = os.path.join(directory, f"source_{height}.mkv")
+    width = (height * 16 // 9 + 1) // 2 * 2
+    _run(ffmpeg_path, ["-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={CLIP_FPS}:duration={seconds}",
+                       "-pix_fmt", "yuv420p", "-c:v", "ffv1", path]).check_returncode()
+    return path
+
+def measure(ffmpeg_path: str, source: str, args: List[str], frames: int, directory: str) -> Optional[Dict[str, Any]]:
+    """Encode `source` with `args`; fps and SSIM/PSNR against the source, or None if the encode fails"""
+    output = os.path.join(directory, "encoded.mkv")
+    started = time.monotonic()
+    try:
+        encode = _run(ffmpeg_path, ["-i", source, "-pix_fmt", "yuv420p", *args, "-an", output])
+    except subprocess.TimeoutExpired:
+        return None
+    elapsed = time.monotonic() - started
+    if encode.returncode != 0:
+        return None
+    compare = _run(ffmpeg_path, ["-i", output, "-i", source, "-filter_complex",
+                                 "[0:v]split[a][b];[1:v]split[c][d];[a][c]ssim;[b][d]psnr", "-f", "null", "-"])
+    ssim, psnr = _SSIM_RE.search(compare.stderr), _PSNR_RE.search(compare.stderr)
+    return {"fps": round(frames / elapsed, 2), "realtime": round(frames / elapsed / CLIP_FPS, 3),
+            "ssim": float(ssim.group(1)) if ssim else None,
+            "psnr": (100.0 if psnr.group(1) == "inf" else float(psnr.group(1))) if psnr else None,
+            "size": os.path.getsize(output)}
+
+def calibrate(ffmpeg_path: str, encoders: List[str], heights: Iterable[int] = CALIBRATION_HEIGHTS,
+              seconds: int = CLIP_SECONDS, report: Any = None) -> List[Dict[str, Any]]:
+    """Measure every preset of `encoders` at each height; `report(row)` sees each result"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="yt-calibrate-") as directory:
+        for height in heights:
+            source = make_source(ffmpeg_path, directory, height, seconds)
+            for encoder in encoders:
+                for preset, args in ENCODER_PRESETS.get(encoder, ()):
+                    row = {"encoder": encoder, "preset": preset, "height": height, "args": args}
+                    measured = measure(ffmpeg_path, source, args + bitrate_args(height),
+                                       seconds * CLIP_FPS, directory)
+                    if measured is None:
+                        print(f"{encoder} {preset} failed at {height}p", file=sys.stderr)
+                        continue
+                    row.update(measured)
+                    results.append(row)
+                    if report:
+                        report(row)
+    return results
+
+# === Command line ===
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m calibration",
+                                     description="Measure encoder presets on this machine.")
+    parser.add_argument("--encoders", help="comma-separated ffmpeg encoders (default: every usable one)")
+    parser.add_argument("--heights", default=",".join(str(h) for h in CALIBRATION_HEIGHTS),
+                        help="clip heights to measure")
+    parser.add_argument("--seconds", type=int, default=CLIP_SECONDS, help="clip length")
+    parser.add_argument("--show", action="store_true", help="print the stored results instead of measuring")
+    parser.add_argument("--goal", help="with --show: the choice per codec for a goal, e.g. fastest:0.95")
+    parser.add_argument("--resolution", default="1080p", help="with --goal: the job resolution")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from downloader import (CODEC_MAP, RES_MAP, detect_available_codecs, ffmpeg_fingerprint,
+                            resolve_resolution, video_family)
+    from sessions import video_encoder
+    args = build_parser().parse_args(argv)
+    ffmpeg_path = get_ffmpeg_path()
+    if not ffmpeg_path:
+        print("FFMPEG not found", file=sys.stderr)
+        return 2
+    fingerprint = ffmpeg_fingerprint(ffmpeg_path)
+
+    if args.show:
+        results = machine_results(fingerprint)
+        for row in results:
+            print(json.dumps({k: v for k, v in row.items() if k != "args"}))
+        if args.goal:
+            goal = parse_goal(args.goal)
+            height = RES_MAP.get(resolve_resolution(args.resolution) or "", 1080)
+            families: Dict[str, List[str]] = {}
+            for name, codec_args in CODEC_MAP.items():
+                if codec_args:
+                    families.setdefault(video_family(name), []).append(video_encoder(codec_args))
+            for family, encoders in families.items():
+                row = choose_preset(results, encoders, height, goal) if goal else None
+                if row:
+                    print(json.dumps({"codec": family, "goal": args.goal, "height": height,
+                                      "encoder": row["encoder"], "preset": row["preset"]}))
+        return 0
+
+    available = detect_available_codecs(ffmpeg_path)
+    usable = [video_encoder(a) for a in available.values() if a]
+    encoders = [e.strip() for e in args.encoders.split(",")] if args.encoders else usable
+    encoders = [e for e in encoders if e in ENCODER_PRESETS]
+    heights = [int(h) for h in args.heights.split(",") if h.strip()]
+    print(f"Calibrating {', '.join(encoders)} at {', '.join(f'{h}p' for h in heights)}", file=sys.stderr)
+    results = calibrate(ffmpeg_path, encoders, heights, args.seconds,
+                        lambda row: print(f"{row['encoder']:>12} {row['preset']:>12} {row['height']:>5}p "
+                                          f"{row['fps']:8.1f} fps {row['realtime']:6.2f}x  "
+                                          f"SSIM {row['ssim']}  PSNR {row['psnr']}"))
+    calibration = load_calibration()
+    calibration[machine_key()] = {"machine": {"node": platform.node(), "system": platform.system(),
+                                              "machine": platform.machine(), "cpus": os.cpu_count()},
+                                  "ffmpeg": fingerprint, "measured": time.time(),
+                                  "clip": {"source": "testsrc2", "fps": CLIP_FPS, "seconds": args.seconds},
+                                  "results": results}
+    save_calibration(calibration)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
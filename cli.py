@@ -0,0 +1,254 @@
+"""Headless command-line front-end for the download engine.
+
+    python -m cli URL [URL ...] [--codec libx264] [--resolution 1080p] [--output-dir DIR] [--jobs 3]
+                  [--fragments auto|N] [--encoder-sessions h264_nvenc=3] [--spill-to-cpu]
+                  [--limit-rate 2M] [--schedule 09:00-18:00=1M] [--priority high] [--metrics-port 9464]
+                  [--goal fastest:0.95] [--stream-cache 4G]
+    python -m cli - < urls.txt
+    python -m cli links.csv
+
+Progress is written to stdout as JSON lines; yt-dlp's log goes to stderr.
+"""
+import argparse, json, sys, threading, time
+from typing import Any, Dict, List, Optional, TextIO
+from config import DOWNLOAD_DIR, get_ffmpeg_path
+from downloader import (DownloadJob, DownloadOptions, download_manager, cancel_download,
+                        detect_available_codecs, codec_aliases,
+                        resolve_codec_name, resolve_resolution, RES_MAP, DEFAULT_CONCURRENCY,
+                        MAX_CONCURRENCY, JOB_DONE, JOB_FAILED, JOB_CANCELED, parse_fragments,
+                        resumable_batches, get_info_cache, DEFAULT_ENCODE_WORKERS,
+                        configure_encoder_sessions, get_encoder_sessions, configure_bandwidth,
+                        get_telemetry, configure_encoder_goal,
+                        configure_stream_cache, get_stream_cache)
+from bandwidth import PRIORITY_WEIGHTS, DEFAULT_PRIORITY, parse_rate, parse_schedule
+from calibration import parse_goal
+from streamcache import parse_size
+from progress import JobProgress, FINAL_PHASES, PHASE_EXPAND
+from ingest import collect
+
+PROGRESS_INTERVAL = 0.5  # Minimum seconds between progress lines for one job
+
+class JsonLinesReporter:
+    """Writes engine events to a stream, one JSON object per line.
+
+    Progress lines are throttled per job; phase changes are always written.
+    """
+
+    def __init__(self, stream: TextIO = sys.stdout, interval: float = PROGRESS_INTERVAL):
+        self.stream = stream
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last: Dict[int, tuple] = {}  # job id -> (phase, monotonic time)
+
+    def emit(self, event: str, **fields: Any) -> None:
+        record = {"event": event, "time": round(time.time(), 3), **fields}
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def on_progress(self, job: DownloadJob, progress: JobProgress) -> None:
+        now = time.monotonic()
+        last_phase, last_time = self._last.get(job.id, (None, 0.0))
+        if progress.phase == last_phase and now - last_time < self.interval:
+            return
+        self._last[job.id] = (progress.phase, now)
+
+        if progress.phase in FINAL_PHASES:
+            self.emit("job", job=job.id, url=job.url, state=progress.phase, error=job.error)
+            return
+        if progress.phase == PHASE_EXPAND:
+            estimate = progress.item_count if progress.item_count > progress.items_done else None
+            self.emit("discovered", job=job.id, url=job.url, found=progress.items_done, estimate=estimate)
+            return
+        self.emit("progress", job=job.id, url=job.url, phase=progress.phase,
+                  fraction=round(progress.fraction, 4), item=progress.item_index,
+                  items=progress.item_count, title=progress.title,
+                  downloaded_bytes=progress.downloaded_bytes, total_bytes=progress.total_bytes,
+                  speed=progress.speed, eta=progress.eta,
+                  fragment=progress.fragment_index, fragments=progress.fragment_count,
+                  postprocessor=progress.postprocessor, allocated_rate=progress.allocated_rate)
+
+class StderrLogger:
+    """yt-dlp logger for headless runs"""
+
+    def __init__(self, quiet: bool = False):
+        self.quiet = quiet
+
+    def debug(self, msg: str) -> None:
+        if not self.quiet and not msg.startswith("[debug] "):
+            print(msg, file=sys.stderr)
+
+    def warning(self, msg: str) -> None:
+        print(f"WARNING: {msg}", file=sys.stderr)
+
+    def error(self, msg: str) -> None:
+        print(msg, file=sys.stderr)
+
+def read_urls(values: List[str], stdin: TextIO = sys.stdin) -> List[str]:
+    """URLs from the arguments, or from stdin when none are given or one is '-'"""
+    urls = [v for v in values if v != "-"]
+    if not values or "-" in values:
+        urls += [line.strip() for line in stdin
+                 if line.strip() and not line.lstrip().startswith("#")]
+    return urls
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m cli",
+        description="Download YouTube videos without the GUI; progress is printed as JSON lines.")
+    parser.add_argument("urls", nargs="*", help="URLs, or .txt/.csv files of URLs, to download; '-' or none reads them from stdin")
+    parser.add_argument("-c", "--codec", default="libx264",
+                        help="codec name or alias, e.g. libx264, h264_nvenc, vp9, mp3 (see --list-codecs)")
+    parser.add_argument("-r", "--resolution", default="1080p",
+                        help=f"maximum height: {', '.join(str(h) for h in RES_MAP.values())}")
+    parser.add_argument("-o", "--output-dir", default=DOWNLOAD_DIR, help="directory for finished files")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"simultaneous downloads (1-{MAX_CONCURRENCY})")
+    parser.add_argument("-e", "--encode-jobs", type=int, default=DEFAULT_ENCODE_WORKERS,
+                        help=f"simultaneous transcodes, separate from downloads (1-{MAX_CONCURRENCY})")
+    parser.add_argument("-f", "--fragments", default="auto",
+                        help="parallel fragments per DASH/HLS stream, or 'auto' to tune it per host (default)")
+    parser.add_argument("--encoder-sessions", action="append", default=[], metavar="ENCODER=N",
+                        help="simultaneous sessions a hardware encoder accepts, instead of probing it (repeatable)")
+    parser.add_argument("--spill-to-cpu", action="store_true",
+                        help="encode on the CPU when waiting for a hardware encoder session would take longer")
+    parser.add_argument("--limit-rate", metavar="RATE",
+                        help="total download rate of all jobs together, e.g. 500K or 2M (bytes/s)")
+    parser.add_argument("--schedule", action="append", default=[], metavar="HH:MM-HH:MM=RATE",
+                        help="different total rate during a time of day, e.g. 09:00-18:00=1M (repeatable)")
+    parser.add_argument("-p", "--priority", choices=list(PRIORITY_WEIGHTS), default=DEFAULT_PRIORITY,
+                        help="queue order and share of the rate limit for these URLs")
+    parser.add_argument("--goal", metavar="GOAL",
+                        help="pick encoder and preset per job from `python -m calibration` results: "
+                             "fastest:MIN_SSIM or quality:MIN_REALTIME, e.g. fastest:0.95")
+    parser.add_argument("--stream-cache", metavar="SIZE",
+                        help="disk budget for downloaded source streams reused by later jobs, e.g. 4G (0 disables)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics while downloading")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="download even if the archive says the output already exists")
+    parser.add_argument("--verify-archive", action="store_true",
+                        help="re-download archived videos whose files were deleted or truncated")
+    parser.add_argument("--resume", action="store_true",
+                        help="also resume downloads left unfinished by an earlier run (from their .part files)")
+    parser.add_argument("--discard-unfinished", action="store_true",
+                        help="forget unfinished downloads of earlier runs and delete their partial files")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only log warnings and errors to stderr")
+    parser.add_argument("--list-codecs", action="store_true", help="print the usable codecs and exit")
+    return parser
+
+def list_codecs(reporter: JsonLinesReporter) -> int:
+    ffmpeg_path = get_ffmpeg_path()
+    available = detect_available_codecs(ffmpeg_path) if ffmpeg_path else {}
+    aliases: Dict[str, List[str]] = {}
+    for alias, name in codec_aliases().items():
+        aliases.setdefault(name, []).append(alias)
+    for name in available:
+        reporter.emit("codec", name=name, aliases=sorted(aliases.get(name, [])))
+    return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    reporter = JsonLinesReporter()
+
+    if args.list_codecs:
+        return list_codecs(reporter)
+
+    codec = resolve_codec_name(args.codec)
+    if codec is None:
+        parser.error(f"unknown codec: {args.codec}")
+    resolution = resolve_resolution(args.resolution)
+    if resolution is None:
+        parser.error(f"unknown resolution: {args.resolution}")
+    try:
+        fragments = parse_fragments(args.fragments)
+    except ValueError:
+        parser.error(f"invalid fragment count: {args.fragments}")
+    overrides = {}
+    for value in args.encoder_sessions:
+        encoder, _, sessions = value.partition("=")
+        if not encoder or not sessions.isdigit() or int(sessions) < 1:
+            parser.error(f"invalid encoder sessions: {value}")
+        overrides[encoder] = int(sessions)
+    configure_encoder_sessions(overrides, args.spill_to_cpu)
+    try:
+        parse_rate(args.limit_rate)
+        parse_schedule(args.schedule)
+    except ValueError as e:
+        parser.error(str(e))
+    configure_bandwidth(args.limit_rate, args.schedule)
+    try:
+        parse_goal(args.goal)
+    except ValueError as e:
+        parser.error(str(e))
+    configure_encoder_goal(args.goal)
+    try:
+        parse_size(args.stream_cache)
+    except ValueError as e:
+        parser.error(str(e))
+    configure_stream_cache(args.stream_cache)
+    if args.metrics_port:
+        try:
+            get_telemetry().serve(args.metrics_port)
+        except OSError as e:
+            parser.error(f"cannot serve metrics on port {args.metrics_port}: {e}")
+    if not get_ffmpeg_path():
+        print("WARNING: FFMPEG not found; merging and conversion will fail", file=sys.stderr)
+
+    journal = download_manager.journal
+    unfinished = journal.pending() if journal and (args.resume or args.discard_unfinished) else []
+    if args.discard_unfinished:
+        journal.discard(unfinished, remove_partials=True)
+        unfinished = []
+        if not args.urls:
+            return 0
+
+    # With --resume alone, do not wait for more URLs on stdin
+    given = read_urls(args.urls) if args.urls or not unfinished else []
+    ingest = collect(given, download_manager.queued_keys(), read_files=True)
+    urls = ingest.urls
+    for url in ingest.invalid:
+        reporter.emit("invalid", url=url)
+    if ingest.duplicates:
+        reporter.emit("duplicates", count=ingest.duplicates)
+    if not urls and not unfinished:
+        print("No valid YouTube URLs given", file=sys.stderr)
+        return 2
+
+    download_manager.set_max_workers(args.jobs)
+    download_manager.set_encode_workers(args.encode_jobs)
+    started = time.monotonic()
+    logger = StderrLogger(args.quiet)
+    batches = []
+    for resumed_options, resumed_urls in resumable_batches(unfinished):
+        reporter.emit("resume", urls=resumed_urls, options=resumed_options.to_dict())
+        batches.append(download_manager.submit(resumed_urls, resumed_options,
+                                               logger, on_progress=reporter.on_progress))
+    if unfinished:
+        journal.discard(unfinished)  # Resubmitted above under new journal entries
+    if urls:
+        options = DownloadOptions(codec, resolution, args.output_dir,
+                                  use_archive=not args.no_archive, verify_archive=args.verify_archive,
+                                  fragments=fragments, priority=args.priority)
+        batches.append(download_manager.submit(urls, options, logger, on_progress=reporter.on_progress))
+    try:
+        while not all(batch.wait(0.5) for batch in batches):
+            pass
+    except KeyboardInterrupt:
+        cancel_download()
+        for batch in batches:
+            batch.wait(10)
+
+    done, failed, canceled = (sum(batch.count(state) for batch in batches)
+                              for state in (JOB_DONE, JOB_FAILED, JOB_CANCELED))
+    reporter.emit("summary", done=done, failed=failed, canceled=canceled, invalid=len(ingest.invalid),
+                  elapsed=round(time.monotonic() - started, 3), info_cache=get_info_cache().stats(),
+                  encoder_sessions=get_encoder_sessions().stats(), stream_cache=get_stream_cache().stats())
+    if canceled:
+        return 130
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
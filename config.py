@@ -1,5 +1,5 @@
-import os, sys, json, shutil, platform, subprocess
-from typing import Dict, Any
+import os, sys, json, shutil, platform, subprocess, threading
+from typing import Dict, Any, Optional
 
 # === Base Path Setup ===
 if getattr(sys, 'frozen', False):
@@ -7,32 +7,120 @@ if getattr(sys, 'frozen', False):
 else:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Enhanced FFMPEG path detection with validation
-def find_ffmpeg_path():
-    """Find and validate FFMPEG executable"""
-    paths_to_try = [
+# Version banners captured while probing, keyed by ffmpeg path
+_ffmpeg_versions: Dict[str, str] = {}
+
+def _ffmpeg_candidates():
+    return [
         shutil.which("ffmpeg"),  # System PATH
         os.path.join(BASE_DIR, "ffmpeg.exe"),  # Windows bundled
         os.path.join(BASE_DIR, "ffmpeg"),  # Linux/macOS bundled
         "/usr/bin/ffmpeg",  # Common Linux path
         "/usr/local/bin/ffmpeg",  # Homebrew macOS path
     ]
-    
-    for path in paths_to_try:
+
+# Enhanced FFMPEG path detection with validation
+def find_ffmpeg_path():
+    """Find and validate FFMPEG executable"""
+    for path in _ffmpeg_candidates():
         if path and os.path.isfile(path):
             try:
                 # Test if FFMPEG is executable
                 result = subprocess.run([path, "-version"], 
-                                       capture_output=True, timeout=5)
+                                       capture_output=True, timeout=5, startupinfo=get_startupinfo())
                 if result.returncode == 0:
+                    _ffmpeg_versions[path] = result.stdout.decode("utf-8", "replace").strip()
                     return path
             except Exception:
                 continue
     
     return None  # No valid FFMPEG found
 
-FFMPEG_PATH = find_ffmpeg_path()
+# === Deferred FFMPEG discovery ===
+# Nothing is probed at import. The first get_ffmpeg_path() call trusts the location
+# remembered from the last run if that binary is unchanged, and only validates
+# candidates with `ffmpeg -version` when it is not.
+_ffmpeg_path: Optional[str] = None
+_ffmpeg_resolved = False
+_ffmpeg_lock = threading.Lock()
+
+def _file_stamp(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        stat = os.stat(path)
+        return {"path": path, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+    except OSError:
+        return None
+
+def cached_ffmpeg_path() -> Optional[str]:
+    """The remembered ffmpeg location if it is still the first candidate and unchanged; never probes"""
+    if _ffmpeg_resolved:
+        return _ffmpeg_path
+    try:
+        with open(FFMPEG_LOCATION_FILE, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        path = saved.get("path")
+        first = next((p for p in _ffmpeg_candidates() if p and os.path.isfile(p)), None)
+        stamp = _file_stamp(path) if path else None
+        if path and first and os.path.samefile(path, first) and stamp \
+                and stamp["size"] == saved.get("size") and stamp["mtime"] == saved.get("mtime"):
+            if saved.get("version"):
+                _ffmpeg_versions.setdefault(path, saved["version"])
+            return path
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"FFMPEG location cache error: {e}")
+    return None
+
+def get_ffmpeg_path() -> Optional[str]:
+    """Path of a working ffmpeg, discovered on first use and remembered across runs"""
+    global _ffmpeg_path, _ffmpeg_resolved
+    with _ffmpeg_lock:
+        if _ffmpeg_resolved:
+            return _ffmpeg_path
+        path = cached_ffmpeg_path()
+        if path is None:
+            path = find_ffmpeg_path()
+            stamp = _file_stamp(path) if path else None
+            if stamp:
+                try:
+                    with open(FFMPEG_LOCATION_FILE, "w", encoding="utf-8") as f:
+                        json.dump({**stamp, "version": _ffmpeg_versions.get(path, "")}, f, indent=4)
+                except Exception as e:
+                    print(f"FFMPEG location cache save error: {e}")
+        _ffmpeg_path, _ffmpeg_resolved = path, True
+        return path
+
+def __getattr__(name: str) -> Any:
+    # `config.FFMPEG_PATH` keeps working, but resolves on first access instead of at import
+    if name == "FFMPEG_PATH":
+        return get_ffmpeg_path()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_ffmpeg_version(path: str) -> str:
+    """Return the `-version` banner of an ffmpeg binary (memoized per path)"""
+    if path in _ffmpeg_versions:
+        return _ffmpeg_versions[path]
+    try:
+        result = subprocess.run([path, "-version"], capture_output=True,
+                                timeout=5, startupinfo=get_startupinfo())
+        version = result.stdout.decode("utf-8", "replace").strip()
+    except Exception:
+        version = ""
+    _ffmpeg_versions[path] = version
+    return version
+
 CONFIG_FILE = os.path.join(BASE_DIR, "config.json")
+CODEC_CACHE_FILE = os.path.join(BASE_DIR, "codec_cache.json")
+ARCHIVE_FILE = os.path.join(BASE_DIR, "archive.sqlite3")
+FRAGMENT_TUNING_FILE = os.path.join(BASE_DIR, "fragment_tuning.json")
+JOURNAL_FILE = os.path.join(BASE_DIR, "jobs.journal")
+FFMPEG_LOCATION_FILE = os.path.join(BASE_DIR, "ffmpeg_location.json")
+SPANS_FILE = os.path.join(BASE_DIR, "job_spans.jsonl")
+METRICS_FILE = os.path.join(BASE_DIR, "metrics.prom")
+CALIBRATION_FILE = os.path.join(BASE_DIR, "calibration.json")
+STREAM_CACHE_DIR = os.path.join(BASE_DIR, "stream_cache")
+LOG_DIR = os.path.join(BASE_DIR, "logs")
 DOWNLOAD_DIR = os.path.join(BASE_DIR, "download")
 
 # Create download directory with error handling
@@ -86,6 +174,49 @@ def save_config(config: Dict[str, Any]) -> None:
     except Exception as e:
         print(f"Config save error: {e}")
 
+def _load_json(path: str, what: str) -> Dict[str, Any]:
+    """A JSON object stored next to config.json; {} when it is missing or unreadable"""
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+                if isinstance(data, dict):
+                    return data
+        except Exception as e:
+            print(f"{what} load error: {e}")
+    return {}
+
+def _save_json(path: str, data: Dict[str, Any], what: str) -> None:
+    """Replace `path` atomically, so a crash mid-write never leaves half a file"""
+    try:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"{what} save error: {e}")
+
+def load_codec_cache() -> Dict[str, Any]:
+    """Load the encoder capability cache stored next to config.json"""
+    return _load_json(CODEC_CACHE_FILE, "Codec cache")
+
+def save_codec_cache(cache: Dict[str, Any]) -> None:
+    _save_json(CODEC_CACHE_FILE, cache, "Codec cache")
+
+def load_fragment_tuning() -> Dict[str, Any]:
+    """Load the fragment concurrency chosen per host in earlier sessions"""
+    return _load_json(FRAGMENT_TUNING_FILE, "Fragment tuning")
+
+def save_fragment_tuning(tuning: Dict[str, Any]) -> None:
+    _save_json(FRAGMENT_TUNING_FILE, tuning, "Fragment tuning")
+
+def load_calibration() -> Dict[str, Any]:
+    """Load encoder calibration results, keyed by machine"""
+    return _load_json(CALIBRATION_FILE, "Calibration")
+
+def save_calibration(calibration: Dict[str, Any]) -> None:
+    _save_json(CALIBRATION_FILE, calibration, "Calibration")
+
 def open_folder(path: str) -> None:
     """Cross-platform folder opener (no terminal popup)"""
     try:
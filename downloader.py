@@ -1,15 +1,33 @@
-import re, threading, os, subprocess, sys
-from datetime import datetime
-from typing import List, Dict, Optional, Any
-from tkinter import messagebox
-from yt_dlp import YoutubeDL
-from config import DOWNLOAD_DIR, FFMPEG_PATH, get_startupinfo
+import importlib, re, threading, os, subprocess, sys, time, itertools, uuid
+from contextlib import nullcontext
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Any, Callable, Iterable, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+from archive import DownloadArchive
+from journal import JobJournal, JournalEntry
+from infocache import InfoCache
+from streamcache import StreamCache, parse_size, stream_key
+from bandwidth import BandwidthGovernor, DEFAULT_PRIORITY, parse_rate, parse_schedule, priority_weight
+from sessions import EncoderSession, EncoderSessionScheduler, is_hardware_encoder, video_encoder
+from fragments import FragmentTuner
+from calibration import choose_preset, machine_results, parse_goal, preset_args
+from telemetry import (Telemetry, JobSpans, SPAN_JOB, SPAN_QUEUE, SPAN_EXTRACT, SPAN_FORMAT_SELECT,
+                       SPAN_DOWNLOAD, SPAN_WAIT_ENCODE, SPAN_MERGE, SPAN_ENCODE, SPAN_EXTRACT_AUDIO,
+                       SPAN_FINALIZE)
+from joblog import JobLog, LEVEL_DEBUG, LEVEL_INFO, LEVEL_WARNING, LEVEL_ERROR
+from processes import ProcessRegistry, install_popen_hook
+from progress import JobProgress, ProgressTracker, PHASE_PREPARE, PHASE_STAGED
+from config import (DOWNLOAD_DIR, get_ffmpeg_path, get_startupinfo, get_ffmpeg_version,
+                    load_codec_cache, save_codec_cache)
 
 # === English only ===
 translations: Dict[str, str] = {
     "progress": "⏳ Progress",
+    "phase_expand": "📃 Listing videos...",
     "phase_prepare": "🔍 Preparing...",
     "phase_download": "⬇️ Downloading...",
+    "phase_staged": "⏸️ Waiting to encode...",
     "phase_post": "🛠️ Processing...",
     "phase_done": "✅ Done!",
     "done": "✅ Download completed!",
@@ -17,468 +35,1486 @@ translations: Dict[str, str] = {
     "error": "❌ Error",
     "warning": "Warning",
     "warn_url": "Please enter at least 1 YouTube URL",
-    "start_download": "🚀 Starting download..."
+    "start_download": "🚀 Starting download...",
+    "resume_title": "Resume downloads",
+    "resume_prompt": "{count} download(s) did not finish last time.\n"
+                     "Resume them? Choosing No deletes their partial files."
 }
 
-stop_event = threading.Event()
-download_active = threading.Lock()
-current_processes = []  # Module-level variable to track processes
+# === yt-dlp, imported on first use ===
+# Importing yt_dlp loads its networking stack and extractor registry, so the
+# engine only imports it when a job runs; the GUI warms it up in the background
+# once its window is painted.
+def preload_yt_dlp() -> None:
+    """Import yt-dlp, its extractor list and the engine's postprocessors (call from a background thread)"""
+    try:
+        from yt_dlp.extractor import gen_extractor_classes
+        importlib.import_module("postprocessors")
+        gen_extractor_classes()
+    except Exception as e:
+        print(f"yt-dlp preload failed: {e}")
+
+def is_cancellation(error: BaseException) -> bool:
+    from yt_dlp.utils import DownloadCancelled
+    return isinstance(error, DownloadCancelled)
+
+# Capability results already resolved in this process, keyed by ffmpeg path
+_codec_memo: Dict[str, Dict[str, Any]] = {}
+_codec_memo_lock = threading.Lock()
 
 # === Enhanced URL validation ===
+# === URL canonicalization ===
+YOUTUBE_HOSTS = ("youtube.com", "m.youtube.com", "music.youtube.com", "youtube-nocookie.com")
+VIDEO_PATH_PREFIXES = ("shorts", "embed", "live", "v")  # /<prefix>/<video id>
+_VIDEO_ID_RE = re.compile(r'^[\w-]{11}$')
+_PLAYLIST_ID_RE = re.compile(r'^[\w-]+$')
+_CHANNEL_PATH_RE = re.compile(r'^(?:@[\w.-]+|(?:c|channel|user)/[\w-]+)(?:/[\w-]+)?$')
+
+def canonical_youtube_url(url: str) -> Optional[Tuple[str, str]]:
+    """Any spelling of a YouTube video, playlist or channel link -> (key, canonical URL), or None.
+
+    The key is the extractor and ID: 'youtube <video id>' (the archive key),
+    'youtube:playlist <list id>' or 'youtube:tab <channel path>'. youtu.be,
+    m.youtube.com, shorts/ and watch?v=...&t=30 links to one video share it;
+    so do @Handle and @handle (channel/UC... IDs are case-sensitive and kept
+    as they are). A tab stays part of key and URL: @handle alone downloads
+    every upload, Shorts and streams included, @handle/videos only videos.
+    """
+    text = url.strip()
+    if "://" not in text:
+        text = "https://" + text
+    try:
+        parts = urlsplit(text)
+        host = (parts.hostname or "").lower()
+    except ValueError:
+        return None
+    if parts.scheme.lower() not in ("http", "https"):
+        return None
+    if host.startswith("www."):
+        host = host[len("www."):]
+    segments = [segment for segment in parts.path.split("/") if segment]
+    if host == "youtu.be":
+        video = segments[0] if segments else ""
+    elif host not in YOUTUBE_HOSTS or not segments:
+        return None
+    elif segments[0] == "watch":
+        video = (parse_qs(parts.query).get("v") or [""])[0]
+    elif segments[0] in VIDEO_PATH_PREFIXES and len(segments) > 1:
+        video = segments[1]
+    elif segments[0] == "playlist":
+        playlist = (parse_qs(parts.query).get("list") or [""])[0]
+        if not _PLAYLIST_ID_RE.match(playlist):
+            return None
+        return f"youtube:playlist {playlist}", f"https://www.youtube.com/playlist?list={playlist}"
+    else:
+        if not _CHANNEL_PATH_RE.match("/".join(segments)):
+            return None
+        # Handles and custom/legacy names are case-insensitive on YouTube; channel IDs are not
+        if segments[0].startswith("@"):
+            segments[0] = segments[0].lower()
+        elif segments[0] in ("c", "user"):
+            segments[1] = segments[1].lower()
+        path = "/".join(segments)
+        return f"youtube:tab {path}", f"https://www.youtube.com/{path}"
+    if not _VIDEO_ID_RE.match(video):
+        return None
+    return f"youtube {video}", f"https://www.youtube.com/watch?v={video}"
+
 def validate_youtube_url(url: str) -> bool:
     """Enhanced YouTube URL validation"""
-    patterns = [
-        r'(?:https?://)?(?:www\.)?youtube\.com/watch\?v=[\w-]+',
-        r'(?:https?://)?(?:www\.)?youtube\.com/playlist\?list=[\w-]+',
-        r'(?:https?://)?youtu\.be/[\w-]+',
-        r'(?:https?://)?(?:www\.)?youtube\.com/c/[\w-]+',
-        r'(?:https?://)?(?:www\.)?youtube\.com/@[\w-]+',
-        r'(?:https?://)?(?:www\.)?youtube\.com/channel/[\w-]+',
-        r'(?:https?://)?(?:www\.)?youtube\.com/user/[\w-]+'
-    ]
-    return any(re.match(pattern, url.strip()) for pattern in patterns)
+    return canonical_youtube_url(url) is not None
+
+# Channel and playlist URLs are expanded into one job per video
+COLLECTION_PATTERNS = [
+    r'(?:https?://)?(?:www\.|m\.)?youtube\.com/playlist\?',
+    r'(?:https?://)?(?:www\.|m\.)?youtube\.com/(?:c|channel|user)/[\w-]+',
+    r'(?:https?://)?(?:www\.|m\.)?youtube\.com/@[\w.-]+',
+]
+
+def is_collection_url(url: str) -> bool:
+    """True for playlist and channel URLs (but not a watch URL that carries a list)"""
+    return any(re.match(pattern, url.strip()) for pattern in COLLECTION_PATTERNS)
+
+VIDEO_ID_PATTERN = r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)([\w-]{11})'
+
+def youtube_video_key(url: str) -> Optional[str]:
+    """'https://youtu.be/<id>' -> 'youtube <id>' (the archive/info-cache key), if it names one video"""
+    match = re.search(VIDEO_ID_PATTERN, url.strip())
+    return f"youtube {match.group(1)}" if match else None
+
+# === Codec table ===
+CODEC_MAP: Dict[str, Optional[List[str]]] = {
+    "H.264 (CPU libx264)": ['-c:v','libx264','-preset','medium'],
+
+    # AMD AMF - stable with quality + pix_fmt
+    "H.264 (AMD AMF)": ['-c:v','h264_amf','-quality','balanced','-pix_fmt','yuv420p'],
+    "H.265 (AMD AMF)": ['-c:v','hevc_amf','-quality','balanced','-pix_fmt','yuv420p'],
+
+    # NVIDIA
+    "H.264 (NVIDIA NVENC)": ['-c:v','h264_nvenc','-preset','p4'],
+    "H.265 (NVIDIA NVENC)": ['-c:v','hevc_nvenc','-preset','p4'],
+
+    # Intel QSV
+    "H.264 (Intel QSV)": ['-c:v','h264_qsv'],
+    "H.265 (Intel QSV)": ['-c:v','hevc_qsv'],
+
+    "H.265 (CPU libx265)": ['-c:v','libx265','-crf','28','-preset','medium'],
+    "VP9 (CPU libvpx-vp9)": ['-c:v','libvpx-vp9','-b:v','2M'],
+
+    # Audio
+    "MP3 (Audio Only)": None,
+    "AAC (Audio Only)": None,
+    "Opus (Audio Only)": None
+}
+
+FALLBACK_CODECS: Dict[str, Optional[List[str]]] = {
+    "H.264 (CPU libx264)": ['-c:v','libx264','-preset','medium'],
+    "MP3 (Audio Only)": None,
+    "AAC (Audio Only)": None,
+    "Opus (Audio Only)": None
+}
+
+PROBE_TIMEOUT = 10       # seconds allowed for a single encoder test encode
+PROBE_WORKERS = 4        # concurrent encoder test encodes
+SESSION_PROBE_SECONDS = 2  # length of each real-time test encode when probing session capacity
+MAX_PROBE_SESSIONS = 8     # stop probing session capacity here
+
+# Timing breakdown of the most recent detect_available_codecs() call (seconds)
+detection_timings: Dict[str, float] = {}
+
+def is_software_codec(name: str) -> bool:
+    """CPU encoders and audio-only modes need no hardware driver"""
+    return "CPU" in name or "Audio Only" in name
+
+def software_codecs() -> Dict[str, Optional[List[str]]]:
+    """Codecs the UI can offer before hardware discovery finishes"""
+    return {name: args for name, args in CODEC_MAP.items() if is_software_codec(name)}
 
 # === Helper: test encoder works ===
-def encoder_is_usable(ffmpeg_path: str, encoder: str) -> bool:
-    """Test if an encoder actually works on this system"""
+def encoder_is_usable(ffmpeg_path: str, encoder: str, timeout: float = PROBE_TIMEOUT,
+                      cancel_event: Optional[threading.Event] = None,
+                      seconds: float = 1, realtime: bool = False) -> bool:
+    """Test if an encoder actually works on this system.
+
+    The test encode is killed after `timeout` seconds or as soon as
+    `cancel_event` is set, so a hung hardware driver cannot block the caller.
+    With `realtime` the input is read at its native rate, so the encode
+    session stays open for `seconds`.
+    """
+    test_cmd = [
+        ffmpeg_path,
+        "-hide_banner", "-loglevel", "error",
+        *(["-re"] if realtime else []),
+        "-f", "lavfi", "-i", "testsrc2",
+        "-t", str(seconds),
+        "-c:v", encoder,
+        "-f", "null", "-"
+    ]
     try:
-        test_cmd = [
-            ffmpeg_path,
-            "-hide_banner", "-loglevel", "error",
-            "-f", "lavfi", "-i", "testsrc2",
-            "-t", "1",
-            "-c:v", encoder,
-            "-f", "null", "-"
-        ]
-        result = subprocess.run(
+        proc = subprocess.Popen(
             test_cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            startupinfo=get_startupinfo()
+        )
+    except Exception:
+        return False
+
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                return proc.wait(timeout=0.05) == 0
+            except subprocess.TimeoutExpired:
+                if time.monotonic() >= deadline or (cancel_event and cancel_event.is_set()):
+                    return False
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            try:
+                proc.wait(timeout=2)
+            except Exception:
+                pass
+
+def list_compiled_encoders(ffmpeg_path: str, timeout: float = PROBE_TIMEOUT) -> Optional[set]:
+    """Return the encoder names compiled into ffmpeg, or None if listing failed"""
+    try:
+        result = subprocess.run(
+            [ffmpeg_path, "-hide_banner", "-encoders"],
             capture_output=True,
             text=True,
+            timeout=timeout,
             startupinfo=get_startupinfo()
         )
-        return result.returncode == 0
     except Exception:
-        return False
+        return None
+    if result.returncode != 0:
+        return None
+
+    encoders = set()
+    for line in result.stdout.splitlines():
+        # Lines look like " V....D libx264   libx264 H.264 / AVC ..."
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS":
+            encoders.add(parts[1])
+    return encoders or None
+
+# === Encoder capability cache ===
+def ffmpeg_fingerprint(ffmpeg_path: str) -> Optional[Dict[str, Any]]:
+    """Identify an ffmpeg binary by path, size, mtime and version banner"""
+    try:
+        path = os.path.abspath(ffmpeg_path)
+        st = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return {
+        "path": path,
+        "size": st.st_size,
+        "mtime": st.st_mtime_ns,
+        "version": get_ffmpeg_version(ffmpeg_path),
+    }
+
+def _cached_codecs(fingerprint: Dict[str, Any]) -> Optional[Dict[str, list]]:
+    """Return cached capabilities if they were probed with this exact binary"""
+    memo = _codec_memo.get(fingerprint["path"])
+    if memo and memo["fingerprint"] == fingerprint:
+        return memo["codecs"]
+    entry = load_codec_cache().get(fingerprint["path"])
+    if isinstance(entry, dict) and entry.get("fingerprint") == fingerprint \
+            and isinstance(entry.get("codecs"), dict):
+        _codec_memo[fingerprint["path"]] = entry
+        return entry["codecs"]
+    return None
+
+def _store_codecs(fingerprint: Dict[str, Any], codecs: Dict[str, list]) -> None:
+    entry = {"fingerprint": fingerprint, "codecs": codecs,
+             "sessions": _cached_sessions(fingerprint)}
+    _codec_memo[fingerprint["path"]] = entry
+    cache = load_codec_cache()
+    cache[fingerprint["path"]] = entry
+    save_codec_cache(cache)
+
+def _cached_sessions(fingerprint: Dict[str, Any]) -> Dict[str, int]:
+    """Encoder session capacities probed with this exact binary"""
+    entry = load_codec_cache().get(fingerprint["path"])
+    if isinstance(entry, dict) and entry.get("fingerprint") == fingerprint \
+            and isinstance(entry.get("sessions"), dict):
+        return dict(entry["sessions"])
+    return {}
+
+def probe_session_capacity(ffmpeg_path: str, encoder: str, max_sessions: int = MAX_PROBE_SESSIONS) -> int:
+    """How many simultaneous encodes a hardware encoder accepts (cached per ffmpeg binary).
+
+    Runs 2, 3, ... overlapping real-time test encodes until one of them fails.
+    """
+    fingerprint = ffmpeg_fingerprint(ffmpeg_path) if ffmpeg_path else None
+    if not fingerprint:
+        return 1
+    cached = _cached_sessions(fingerprint).get(encoder)
+    if isinstance(cached, int) and cached > 0:
+        return cached
+
+    capacity = max_sessions
+    for sessions in range(2, max_sessions + 1):
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            results = list(pool.map(
+                lambda _: encoder_is_usable(ffmpeg_path, encoder, seconds=SESSION_PROBE_SECONDS,
+                                            realtime=True), range(sessions)))
+        if not all(results):
+            capacity = sessions - 1
+            break
+
+    cache = load_codec_cache()
+    entry = cache.get(fingerprint["path"])
+    if not (isinstance(entry, dict) and entry.get("fingerprint") == fingerprint):
+        entry = {"fingerprint": fingerprint}
+    entry.setdefault("sessions", {})[encoder] = capacity
+    cache[fingerprint["path"]] = entry
+    save_codec_cache(cache)
+    return capacity
+
+def cached_available_codecs(ffmpeg_path: str) -> Optional[Dict[str, list]]:
+    """Return cached capabilities without probing, or None on a cold cache"""
+    fingerprint = ffmpeg_fingerprint(ffmpeg_path) if ffmpeg_path else None
+    if not fingerprint:
+        return None
+    with _codec_memo_lock:
+        cached = _cached_codecs(fingerprint)
+    return dict(cached) if cached is not None else None
 
 # === Detect available codecs ===
-def detect_available_codecs(ffmpeg_path: str) -> Dict[str, list]:
-    """Detect encoders supported and usable by ffmpeg on this system with enhanced safety"""
+def detect_available_codecs(ffmpeg_path: str, use_cache: bool = True,
+                            on_codec: Optional[Callable[[str, Optional[List[str]]], None]] = None,
+                            cancel_event: Optional[threading.Event] = None) -> Dict[str, list]:
+    """Detect encoders supported and usable by ffmpeg on this system with enhanced safety.
+
+    Results are cached on disk per ffmpeg binary and reused until the binary changes.
+    On a cold cache, `ffmpeg -encoders` first prunes encoders that are not compiled in,
+    then the rest are test-encoded concurrently; `on_codec(name, args)` is called from
+    a worker thread as each one verifies. A timing breakdown is left in `detection_timings`.
+    """
     if not ffmpeg_path or not isinstance(ffmpeg_path, str) or not os.path.exists(ffmpeg_path):
         # Return only safe fallback options
-        return {  # pyright: ignore[reportReturnType]
-            "H.264 (CPU libx264)": ['-c:v','libx264','-preset','medium'],
-            "MP3 (Audio Only)": None,
-            "AAC (Audio Only)": None,
-            "Opus (Audio Only)": None
-        }
-        
-    codec_map = {
-        "H.264 (CPU libx264)": ['-c:v','libx264','-preset','medium'],
-
-        # AMD AMF - stable with quality + pix_fmt
-        "H.264 (AMD AMF)": ['-c:v','h264_amf','-quality','balanced','-pix_fmt','yuv420p'],
-        "H.265 (AMD AMF)": ['-c:v','hevc_amf','-quality','balanced','-pix_fmt','yuv420p'],
-
-        # NVIDIA
-        "H.264 (NVIDIA NVENC)": ['-c:v','h264_nvenc','-preset','p4'],
-        "H.265 (NVIDIA NVENC)": ['-c:v','hevc_nvenc','-preset','p4'],
-
-        # Intel QSV
-        "H.264 (Intel QSV)": ['-c:v','h264_qsv'],
-        "H.265 (Intel QSV)": ['-c:v','hevc_qsv'],
-
-        "H.265 (CPU libx265)": ['-c:v','libx265','-crf','28','-preset','medium'],
-        "VP9 (CPU libvpx-vp9)": ['-c:v','libvpx-vp9','-b:v','2M'],
-
-        # Audio
-        "MP3 (Audio Only)": None,
-        "AAC (Audio Only)": None,
-        "Opus (Audio Only)": None
-    }
+        return dict(FALLBACK_CODECS)  # pyright: ignore[reportReturnType]
+
+    with _codec_memo_lock:
+        detection_timings.clear()
+        started = time.perf_counter()
+        fingerprint = ffmpeg_fingerprint(ffmpeg_path)
+        if use_cache and fingerprint:
+            cached = _cached_codecs(fingerprint)
+            detection_timings["cache"] = time.perf_counter() - started
+            if cached is not None:
+                detection_timings["total"] = time.perf_counter() - started
+                return dict(cached)
+
+        available_codecs = _probe_codecs(ffmpeg_path, on_codec, cancel_event)
+        detection_timings["total"] = time.perf_counter() - started
+        if available_codecs is not None:
+            # A canceled discovery is incomplete and must not be cached
+            if fingerprint and not (cancel_event and cancel_event.is_set()):
+                _store_codecs(fingerprint, available_codecs)
+            return dict(available_codecs)
+
+    # Fallback to basic codecs if detection fails (never cached)
+    return dict(FALLBACK_CODECS)  # pyright: ignore[reportReturnType]
+
+def _probe_codecs(ffmpeg_path: str,
+                  on_codec: Optional[Callable[[str, Optional[List[str]]], None]] = None,
+                  cancel_event: Optional[threading.Event] = None) -> Optional[Dict[str, list]]:
+    """Two-phase probe of CODEC_MAP, returning None if detection itself failed"""
+    verified: Dict[str, Any] = {}
+
+    def report(name: str, args: Optional[List[str]]) -> None:
+        verified[name] = args
+        if on_codec:
+            try:
+                on_codec(name, args)
+            except Exception:
+                pass
 
-    available_codecs = {}
-    
     try:
-        for name, args in codec_map.items():
+        # Phase 1: prune encoders that are not compiled into this build
+        phase_start = time.perf_counter()
+        compiled = list_compiled_encoders(ffmpeg_path)
+        detection_timings["list_encoders"] = time.perf_counter() - phase_start
+
+        candidates = {}
+        for name, args in CODEC_MAP.items():
             if args is None:  # audio always available
-                available_codecs[name] = args
-            else:
-                encoder_name = args[1] if len(args) > 1 else None
-                if encoder_name and encoder_is_usable(ffmpeg_path, encoder_name):
-                    available_codecs[name] = args
+                report(name, args)
+                continue
+            encoder_name = args[1] if len(args) > 1 else None
+            if encoder_name and (compiled is None or encoder_name in compiled):
+                candidates[name] = encoder_name
+
+        # Phase 2: verify the survivors with concurrent, bounded test encodes
+        def probe(name: str, encoder_name: str):
+            probe_start = time.perf_counter()
+            usable = encoder_is_usable(ffmpeg_path, encoder_name, cancel_event=cancel_event)
+            detection_timings[f"probe:{encoder_name}"] = time.perf_counter() - probe_start
+            if usable:
+                report(name, CODEC_MAP[name])
+
+        phase_start = time.perf_counter()
+        if candidates:
+            with ThreadPoolExecutor(max_workers=min(PROBE_WORKERS, len(candidates))) as pool:
+                futures = [pool.submit(probe, name, enc) for name, enc in candidates.items()]
+                for future in futures:
+                    future.result()
+        detection_timings["verify"] = time.perf_counter() - phase_start
     except Exception:
-        # Fallback to basic codecs if detection fails
-        available_codecs = {
-            "H.264 (CPU libx264)": ['-c:v','libx264','-preset','medium'],
-            "MP3 (Audio Only)": None,
-            "AAC (Audio Only)": None,
-            "Opus (Audio Only)": None
-        }
-
-    return available_codecs
-
-# === Thread-safe Logger ===
-class TkinterLogger:
-    def __init__(self, log_widget: Any, prog_label: Any, speed_label: Any, progress_bar: Any, phase_label: Any, root: Any):
-        self.log_widget = log_widget
-        self.prog_label = prog_label
-        self.speed_label = speed_label
-        self.progress_bar = progress_bar
-        self.phase_label = phase_label
-        self.root = root
-        self.progress_pattern = re.compile(r"(\d{1,3}\.?\d*)%")
-        self.speed_pattern = re.compile(r"at ([0-9\.]+[KMG]iB/s)")
-
-    def debug(self, msg: str) -> None: 
-        self._log(msg)
-    
-    def warning(self, msg: str) -> None: 
-        self._log(f"⚠️ {msg}", "warning")
-    
-    def error(self, msg: str) -> None: 
-        self._log(f"❌ {msg}", "error")
-
-    def _safe_ui_update(self, func) -> None:
-        """Thread-safe UI updates"""
-        if self.root and hasattr(self.root, 'winfo_exists'):
+        return None
+
+    # Keep the dropdown order stable regardless of which probe finished first
+    return {name: args for name, args in CODEC_MAP.items() if name in verified}  # pyright: ignore[reportReturnType]
+
+def codec_aliases() -> Dict[str, str]:
+    """Short command-line names for CODEC_MAP entries (encoder or audio codec name)"""
+    aliases = {}
+    for name, args in CODEC_MAP.items():
+        if args is None:
+            aliases[name.split(" ", 1)[0].lower()] = name  # "mp3", "aac", "opus"
+        else:
+            aliases[args[1]] = name                         # "libx264", "h264_nvenc", ...
+    aliases.update({"h264": "H.264 (CPU libx264)", "h265": "H.265 (CPU libx265)",
+                    "hevc": "H.265 (CPU libx265)", "vp9": "VP9 (CPU libvpx-vp9)"})
+    return aliases
+
+def resolve_codec_name(value: str) -> Optional[str]:
+    """Accept a CODEC_MAP name or one of its aliases"""
+    if value in CODEC_MAP:
+        return value
+    return codec_aliases().get(value.strip().lower())
+
+def format_detection_timings() -> str:
+    """One-line summary of detection_timings for the log"""
+    parts = [f"{key} {value * 1000:.0f}ms" for key, value in detection_timings.items()]
+    return ", ".join(parts)
+
+# === Download jobs ===
+DEFAULT_CONCURRENCY = 3
+MAX_CONCURRENCY = 8
+DEFAULT_ENCODE_WORKERS = 1   # One libx264 encode already keeps every core busy
+MAX_STAGED = 4               # Downloaded items allowed to wait for an encode slot
+
+RES_MAP: Dict[str, int] = {"144p":144,"240p":240,"360p":360,"480p":480,"720p":720,"1080p":1080,
+                           "1440p (2K)":1440,"2160p (4K)":2160,"4320p (8K)":4320}
+
+def resolve_resolution(value: str) -> Optional[str]:
+    """Accept a RES_MAP name, a bare height ("1080") or a height with "p" ("1080p")"""
+    if value in RES_MAP:
+        return value
+    height = value.strip().lower().rstrip("p")
+    return next((name for name, h in RES_MAP.items() if str(h) == height), None)
+
+JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED, JOB_CANCELED = (
+    "queued", "running", "done", "failed", "canceled")
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELED)
+
+# === Job telemetry ===
+_telemetry = Telemetry()
+
+def get_telemetry() -> Telemetry:
+    return _telemetry
+
+# === Child processes of running jobs ===
+_process_registry = ProcessRegistry()
+
+def get_process_registry() -> ProcessRegistry:
+    return _process_registry
+
+# === Job log ===
+_job_log = JobLog()
+
+def get_job_log() -> JobLog:
+    return _job_log
+
+# Pipeline stages of a running job
+STAGE_DOWNLOAD = "download"  # Holds a network slot
+STAGE_STAGED = "staged"      # Sources downloaded, waiting for an encode slot
+STAGE_ENCODE = "encode"      # Holds an encode slot
+STAGE_WAITING = "waiting"    # Waiting for a network slot again
+
+class DownloadOptions:
+    """What a job should produce: codec, resolution and output directory"""
+
+    def __init__(self, codec_choice: str = "H.264 (CPU libx264)", res_choice: str = "1080p",
+                 output_dir: str = DOWNLOAD_DIR, use_archive: bool = True, verify_archive: bool = False,
+                 fragments: Optional[int] = None, priority: str = DEFAULT_PRIORITY):
+        self.codec_choice = codec_choice if isinstance(codec_choice, str) else "H.264 (CPU libx264)"
+        self.res_choice = res_choice
+        self.output_dir = output_dir
+        self.use_archive = use_archive        # Skip videos already produced with these options
+        self.verify_archive = verify_archive  # ...but only if the recorded file is still intact
+        self.fragments = fragments            # Parallel DASH/HLS fragments; None tunes it per host
+        self.priority = priority              # Share of the bandwidth cap and place in the queue
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"codec": self.codec_choice, "resolution": self.res_choice, "output_dir": self.output_dir,
+                "use_archive": self.use_archive, "verify_archive": self.verify_archive,
+                "fragments": self.fragments, "priority": self.priority}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DownloadOptions":
+        return cls(data.get("codec", "H.264 (CPU libx264)"), data.get("resolution", "1080p"),
+                   data.get("output_dir", DOWNLOAD_DIR), data.get("use_archive", True),
+                   data.get("verify_archive", False), data.get("fragments"),
+                   data.get("priority", DEFAULT_PRIORITY))
+
+class DownloadJob:
+    """One URL with its own options, state and cancel flag"""
+    _ids = itertools.count(1)
+
+    def __init__(self, url: str, options: DownloadOptions,
+                 batch: Optional["DownloadBatch"] = None, logger: Any = None):
+        self.id = next(DownloadJob._ids)
+        self.url = url
+        self.options = options
+        self.batch = batch
+        self.expands = is_collection_url(url)  # Enumerates videos instead of downloading
+        self.logger = logger
+        self.state = JOB_QUEUED
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self.tracker = ProgressTracker(self.id, self._progress_changed)
+        self.key = uuid.uuid4().hex             # Identifies the job in the journal across restarts
+        self.parent_key: Optional[str] = None   # Playlist/channel job that queued this one
+        self.journal: Optional[JobJournal] = None
+        self.pipeline: Optional["DownloadManager"] = None  # Hands out network/encode slots
+        self.priority = options.priority
+        self.spans = JobSpans(get_telemetry(), self.key, self.id, url, self.cancel_event)
+
+    @property
+    def progress(self) -> JobProgress:
+        return self.tracker.progress
+
+    def _progress_changed(self, progress: JobProgress) -> None:
+        if self.batch and self.batch.on_progress:
             try:
-                if self.root.winfo_exists():
-                    self.root.after(0, func)
-            except Exception:
-                pass
+                self.batch.on_progress(self, progress)
+            except Exception as e:
+                print(f"Progress callback error: {e}")
+
+    @property
+    def canceled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
 
-    def _log(self, msg: str, tag: Optional[str] = None):
-        if stop_event.is_set():
-            raise Exception("Canceled by user")
+    def cancel(self) -> None:
+        """Flag the job and stop the processes it is running (ffmpeg), without waiting for them"""
+        self.cancel_event.set()
+        _process_registry.kill(self.key)
 
+    def check_canceled(self) -> None:
+        """Abort the running yt-dlp call if this job was canceled"""
+        if self.cancel_event.is_set():
+            from yt_dlp.utils import DownloadCancelled
+            raise DownloadCancelled("Canceled by user")
+
+class DownloadBatch:
+    """Jobs submitted together.
+
+    `on_progress(job, progress)` fires on every progress change of any job,
+    `on_queued(job)` for each job as it is queued (playlist entries included,
+    before they can start) and `on_done(batch)` once all of them have finished.
+    """
+
+    def __init__(self, on_done: Optional[Callable[["DownloadBatch"], None]] = None,
+                 on_progress: Optional[Callable[[DownloadJob, JobProgress], None]] = None,
+                 on_queued: Optional[Callable[[DownloadJob], None]] = None):
+        self.jobs: List[DownloadJob] = []
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.on_queued = on_queued
+        self._peak = 0.0
+        self._done_event = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until every job has finished; returns False on timeout"""
+        return self._done_event.wait(timeout)
+
+    def count(self, state: str) -> int:
+        return sum(1 for job in self.jobs if job.state == state)
+
+    def downloads(self) -> List[DownloadJob]:
+        """Jobs that download a video (playlist/channel expansion jobs excluded)"""
+        return [job for job in self.jobs if not job.expands]
+
+    def discovery(self) -> Optional[tuple]:
+        """(videos discovered, expected total or None) while a playlist/channel is being listed"""
+        expanding = [job for job in self.jobs if job.expands and not job.finished]
+        if not expanding:
+            return None
+        found = sum(job.progress.items_done for job in expanding)
+        total = sum(job.progress.item_count for job in expanding)
+        return found, (total if total > found else None)
+
+    def fraction(self) -> float:
+        """Overall completion of the batch in [0, 1]"""
+        downloads = self.downloads()
+        # Videos an expansion job expects but has not discovered yet
+        undiscovered = sum(max(0, job.progress.item_count - job.progress.items_done)
+                           for job in self.jobs if job.expands and not job.finished)
+        expected = len(downloads) + undiscovered
+        if not expected:
+            return 1.0 if self.finished else 0.0
+        # Size estimates of fragmented streams can grow; never move the bar backwards
+        fraction = sum(job.progress.fraction for job in downloads) / expected
+        self._peak = max(self._peak, fraction)
+        return self._peak
+
+    def speed(self) -> float:
+        """Combined download speed of the batch's running jobs in bytes/s"""
+        return sum(job.progress.speed or 0 for job in self.jobs if job.state == JOB_RUNNING)
+
+    @property
+    def finished(self) -> bool:
+        return all(job.finished for job in self.jobs)
+
+class JobLogger:
+    """yt-dlp logger that enforces the job's cancel flag, records its last error
+    and writes every message to the job log"""
+
+    def __init__(self, job: DownloadJob, sink: Any = None):
+        self.job = job
+        self.sink = sink
+
+    def _record(self, level: int, msg: str) -> None:
         if msg.strip():
-            timestamp = datetime.now().strftime("[%H:%M:%S] ")
-            clean_msg = re.sub(r"\x1B\[[0-9;]*[a-zA-Z]", "", msg)
-            
-            def update_log():
-                try:
-                    self.log_widget.insert("end", timestamp + clean_msg + "\n", tag)
-                    self.log_widget.see("end")
-                    
-                    # Keep log widget from growing too large (memory management)
-                    lines = int(self.log_widget.index('end-1c').split('.')[0])
-                    if lines > 1000:
-                        self.log_widget.delete("1.0", "100.0")
-                        
-                except Exception:
-                    pass
-            
-            self._safe_ui_update(update_log)
-
-            # Progress updates
-            if "Downloading webpage" in msg or "Extracting" in msg:
-                def update_progress():
-                    try:
-                        self.progress_bar.configure(mode="determinate")
-                        self.progress_bar.set(0.05)
-                        self.phase_label.configure(text=translations["phase_prepare"])
-                    except Exception:
-                        pass
-                self._safe_ui_update(update_progress)
-
-            match = self.progress_pattern.search(msg)
-            if match:
-                try:
-                    val = float(match.group(1))
-                    mapped = 0.1 + (val / 100.0) * 0.8
-                    
-                    def update_progress():
-                        try:
-                            self.progress_bar.configure(mode="determinate")
-                            self.progress_bar.set(mapped)
-                            self.phase_label.configure(text=translations["phase_download"])
-                            self.prog_label.configure(text=f"{translations['progress']} ({val:.1f}%)")
-                        except Exception:
-                            pass
-                    self._safe_ui_update(update_progress)
-                except Exception as e:
-                    print(f"Progress parse error: {e}")
-
-            if any(word in msg for word in ["Merging", "Post-process", "Converting", "Extracting audio"]):
-                def update_progress():
-                    try:
-                        self.progress_bar.configure(mode="determinate")
-                        self.progress_bar.set(0.95)
-                        self.phase_label.configure(text=translations["phase_post"])
-                    except Exception:
-                        pass
-                self._safe_ui_update(update_progress)
-
-            smatch = self.speed_pattern.search(msg)
-            if smatch:
-                def update_speed():
-                    try:
-                        self.speed_label.configure(text=f"⚡ {smatch.group(1)}")
-                    except Exception:
-                        pass
-                self._safe_ui_update(update_speed)
-
-# === Enhanced Download Function with Better Thread Safety ===
-def download_videos(urls: List[str], codec_choice: str, res_choice: str,
-                    log_widget: Any, prog_label: Any, speed_label: Any, 
-                    download_btn: Any, progress_bar: Any, phase_label: Any, root: Any) -> None:
-    # Prevent multiple simultaneous downloads
-    if not download_active.acquire(blocking=False):
-        def show_warning():
+            _job_log.append(level, msg, self.job.id)
+
+    def debug(self, msg: str) -> None:
+        self._record(LEVEL_DEBUG if msg.startswith("[debug] ") else LEVEL_INFO, msg)
+        self.job.check_canceled()
+        if self.sink:
+            self.sink.debug(msg)
+
+    def warning(self, msg: str) -> None:
+        self._record(LEVEL_WARNING, msg)
+        self.job.check_canceled()
+        if "Retrying" in msg:
+            self.job.spans.retry()
+        if self.sink:
+            self.sink.warning(msg)
+
+    def error(self, msg: str) -> None:
+        self._record(LEVEL_ERROR, msg)
+        self.job.error = msg
+        self.job.check_canceled()
+        if self.sink:
+            self.sink.error(msg)
+
+# === Codec-aware format selection ===
+# Source codecs that can be kept as-is for each output choice
+SOURCE_VCODECS: Dict[str, tuple] = {
+    "H.264": ("avc1", "avc3", "h264"),
+    "H.265": ("hev1", "hvc1", "hevc", "h265"),
+    "VP9": ("vp09", "vp9"),
+}
+SOURCE_ACODECS: Dict[str, tuple] = {
+    "MP3 (Audio Only)": ("mp3",),
+    "AAC (Audio Only)": ("mp4a", "aac"),
+    "Opus (Audio Only)": ("opus",),
+}
+# yt-dlp format_sort codec names used to rank matching sources first
+SORT_VCODECS: Dict[str, str] = {"H.264": "h264", "H.265": "h265", "VP9": "vp9"}
+MP4_AUDIO_CODECS = ("mp4a", "aac")
+AUDIO_ARGS = ['-c:a','aac','-b:a','192k']
+
+def codec_matches(codec: Optional[str], prefixes: tuple) -> bool:
+    return bool(codec) and codec.lower().startswith(prefixes)  # pyright: ignore[reportOptionalMemberAccess]
+
+def video_family(codec_choice: str) -> str:
+    """'H.264 (NVIDIA NVENC)' -> 'H.264'"""
+    return codec_choice.split(" ", 1)[0]
+
+def output_tag(codec_choice: str) -> str:
+    """Codec part of output file names: 'H.265 (NVIDIA NVENC)' -> 'h265', 'MP3 (Audio Only)' -> 'mp3'"""
+    return re.sub(r'[^a-z0-9]', '', video_family(codec_choice).lower()) or "media"
+
+def resolve_codec_args(codec_choice: str) -> Optional[List[str]]:
+    """Encoder arguments for a codec choice, if that encoder is usable here"""
+    try:
+        ffmpeg_path = get_ffmpeg_path()
+        if ffmpeg_path is not None:
+            return detect_available_codecs(ffmpeg_path).get(codec_choice)
+    except Exception:
+        pass
+    return None
+
+# === Download archive ===
+_archive: Optional[DownloadArchive] = None
+_archive_lock = threading.Lock()
+
+def get_download_archive() -> Optional[DownloadArchive]:
+    """Shared archive, opened on first use; None if the database cannot be opened"""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
             try:
-                messagebox.showwarning("Warning", "Download already in progress!")
-            except Exception:
-                pass
-        if root and hasattr(root, 'after'):
-            root.after(0, show_warning)
+                _archive = DownloadArchive()
+            except Exception as e:
+                print(f"Download archive unavailable: {e}")
+        return _archive
+
+# === Fragment concurrency ===
+_fragment_tuner = FragmentTuner()
+
+def get_fragment_tuner() -> FragmentTuner:
+    return _fragment_tuner
+
+def parse_fragments(value: Any) -> Optional[int]:
+    """'auto' -> None (tuned per host), '8' -> 8; raises ValueError for anything else"""
+    if value is None or str(value).strip().lower() in ("", "auto"):
+        return None
+    fragments = int(value)
+    if fragments < 1:
+        raise ValueError(f"fragment count must be at least 1: {value}")
+    return fragments
+
+def attach_fragment_tuning(ydl: Any, fragments: Optional[int]) -> None:
+    """Use a fixed fragment count, or tune it per host when none is given"""
+    if fragments:
+        ydl.params['concurrent_fragment_downloads'] = fragments
         return
-    
-    lock_acquired = True  # Track lock state
-    
+    from postprocessors import FragmentTuningPP
+    tuning = FragmentTuningPP(ydl, get_fragment_tuner())
+    ydl.add_post_processor(tuning, when='before_dl')
+    ydl.add_progress_hook(tuning.progress_hook)
+
+# === Extraction cache ===
+_info_cache = InfoCache()
+
+def get_info_cache() -> InfoCache:
+    return _info_cache
+
+# Errors that mean the cached media URLs were rejected rather than the download itself failing
+STALE_INFO_ERRORS = re.compile(r'HTTP Error (?:403|404|410)|expired', re.IGNORECASE)
+
+def download_with_info_cache(ydl: Any, url: str, logger: Any = None,
+                             spans: Optional[JobSpans] = None) -> Tuple[int, Optional[str]]:
+    """Like ydl.download([url]), but the extraction result comes from (or goes into) the info cache.
+
+    Returns yt-dlp's return code and, when cached info was used, its cache key.
+    """
+    cache = get_info_cache()
+    key = cache.key_for(url, youtube_video_key(url))
+    with spans.span(SPAN_EXTRACT) if spans else nullcontext() as extract:
+        info = cache.get(key)
+        if extract:
+            extract.note(cached=info is not None)
+        if info is None:
+            key = None
+            info = ydl.extract_info(url, download=False, process=False)
+            cache.put(info, url)
+        elif logger:
+            logger.debug(f"[InfoCache] Reusing extracted metadata for {key}")
+    if info is not None:
+        from yt_dlp.utils import ExtractorError, UnavailableVideoError
+        try:
+            ydl.process_ie_result(info, download=True)
+        except (ExtractorError, UnavailableVideoError) as e:
+            # What extract_info would have reported for a fresh extraction
+            ydl.report_error(e)
+    return ydl._download_retcode, key
+
+# === Source stream cache ===
+_stream_cache = StreamCache()
+
+def get_stream_cache() -> StreamCache:
+    return _stream_cache
+
+def configure_stream_cache(max_size: Any = None) -> None:
+    """Set the stream cache budget ('4G', '500M'; 0 disables it)"""
     try:
-        stop_event.clear()
+        _stream_cache.set_max_bytes(parse_size(max_size))
+    except ValueError as e:
+        print(f"Ignoring stream cache size: {e}")
 
-        # Validate inputs with thread safety
-        if not urls or not isinstance(urls, list):
-            return
-            
-        # Enhanced URL validation
-        valid_urls = []
-        for url in urls:
-            if isinstance(url, str) and validate_youtube_url(url.strip()):
-                valid_urls.append(url.strip())
-        
-        if not valid_urls:
-            def show_warning():
-                try:
-                    messagebox.showwarning(translations["warning"], translations["warn_url"])
-                    download_btn.configure(text="⬇️ Download")
-                except Exception:
-                    pass
-            if root and hasattr(root, 'after'):
-                root.after(0, show_warning)
-            return
+def attach_stream_cache(ydl: Any, cache: StreamCache,
+                        on_restore: Optional[Callable[[str], None]] = None) -> None:
+    """Serve source streams from the cache and keep the ones downloaded.
+
+    Wraps this instance's `dl`, which yt-dlp calls once per stream with the
+    file name it will merge or convert: a cached stream is placed there, and
+    yt-dlp's own "already downloaded" path takes over.
+    """
+    download = ydl.dl
+
+    def dl(name, info, subtitle=False, test=False):
+        key = None if subtitle or test or name == '-' else stream_key(info)
+        if key and not os.path.exists(name) and cache.restore(key, name):
+            ydl.to_screen(f"[StreamCache] Reusing format {info.get('format_id')} of {info.get('id')}")
+            if on_restore:
+                on_restore(name)
+        success, real_download = download(name, info, subtitle=subtitle, test=test)
+        if key and success and real_download:
+            cache.store(key, name)
+        return success, real_download
+
+    ydl.dl = dl
+
+def build_ydl_opts(codec_choice: str, res_choice: str, logger: Any = None,
+                   output_dir: str = DOWNLOAD_DIR) -> Dict[str, Any]:
+    """Translate the codec/resolution choice into YoutubeDL options.
+
+    Sources already in the chosen codec are ranked first, so a real transcode
+    only happens when no matching stream exists (see StreamCopyPolicyPP).
+    """
+    res_value = RES_MAP.get(res_choice, 1080)
+
+    # Validate codec choice
+    if not isinstance(codec_choice, str):
+        codec_choice = "H.264 (CPU libx264)"
 
-        # Validate resolution choice
-        res_map = {"144p":144,"240p":240,"360p":360,"480p":480,"720p":720,"1080p":1080,
-                   "1440p (2K)":1440,"2160p (4K)":2160,"4320p (8K)":4320}
-        res_value = res_map.get(res_choice, 1080)
+    format_selector = f'bestvideo[height<={res_value}]+bestaudio/best/best'
+    # Resolution still wins; among equal resolutions the matching codec is preferred
+    format_sort = ['res', f'vcodec:{SORT_VCODECS.get(video_family(codec_choice), "h264")}', 'acodec:aac']
+    postprocessors = []
 
-        # Validate codec choice
-        if not isinstance(codec_choice, str):
-            codec_choice = "H.264 (CPU libx264)"
+    if "Audio Only" in codec_choice:
+        # FFmpegExtractAudio copies the stream when it is already in the target codec
+        # Format filters cannot be OR-ed inside one [...], so each codec prefix is its own alternative
+        matching = [f"bestaudio[acodec^={prefix}]" for prefix in SOURCE_ACODECS.get(codec_choice, ())]
+        format_selector = "/".join(matching + ['bestaudio', 'best'])
+        format_sort = []
+        if codec_choice == "MP3 (Audio Only)":
+            postprocessors=[{'key':'FFmpegExtractAudio','preferredcodec':'mp3','preferredquality':'192'}]
+        elif codec_choice == "AAC (Audio Only)":
+            postprocessors=[{'key':'FFmpegExtractAudio','preferredcodec':'aac','preferredquality':'192'}]
+        elif codec_choice == "Opus (Audio Only)":
+            postprocessors=[{'key':'FFmpegExtractAudio','preferredcodec':'opus','preferredquality':'192'}]
 
-        format_selector = f'bestvideo[height<={res_value}]+bestaudio/best/best'
-        postprocessors, postprocessor_args = [], []
+    ydl_opts = {
+        'format': format_selector,
+        # One file per video and target codec: a later H.265 or MP3 job must not find the H.264 output
+        'outtmpl': os.path.join(output_dir, f'%(title)s [%(id)s].{output_tag(codec_choice)}.%(ext)s'),
+        'merge_output_format': 'mp4',
+        'postprocessors': postprocessors,
+        'noplaylist': False,
+        'ignoreerrors': True,
+        'logger': logger,
+        # Progress is reported through hooks, so keep the log free of progress lines and ANSI codes
+        'noprogress': True,
+        'color': 'no_color',
+    }
+    if format_sort:
+        ydl_opts['format_sort'] = format_sort
+
+    # Only add ffmpeg_location if ffmpeg was found
+    ffmpeg_path = get_ffmpeg_path()
+    if ffmpeg_path is not None:
+        ydl_opts['ffmpeg_location'] = ffmpeg_path
+    return ydl_opts
+
+# Postprocessors that run the video encoder
+ENCODING_PPS = ("Merger", "VideoConvertor")
+
+# === Hardware encoder sessions ===
+_encoder_sessions = EncoderSessionScheduler(lambda encoder: probe_session_capacity(get_ffmpeg_path(), encoder))
 
-        # Safe codec detection with None check
+def get_encoder_sessions() -> EncoderSessionScheduler:
+    return _encoder_sessions
+
+def configure_encoder_sessions(overrides: Optional[Dict[str, Any]] = None, spill_to_cpu: bool = False) -> None:
+    """Apply session capacity overrides ({"h264_nvenc": 3}) and the CPU spill-over setting"""
+    _encoder_sessions.spill_to_cpu = bool(spill_to_cpu)
+    for encoder, sessions in (overrides or {}).items():
         try:
-            if FFMPEG_PATH is not None:
-                available_codecs = detect_available_codecs(FFMPEG_PATH)
-                codec_args = available_codecs.get(codec_choice)
-            else:
-                codec_args = None
-        except Exception:
-            codec_args = None
-
-        if "Audio Only" in codec_choice:
-            format_selector = 'bestaudio/best'
-            if codec_choice == "MP3 (Audio Only)":
-                postprocessors=[{'key':'FFmpegExtractAudio','preferredcodec':'mp3','preferredquality':'192'}]
-            elif codec_choice == "AAC (Audio Only)":
-                postprocessors=[{'key':'FFmpegExtractAudio','preferredcodec':'aac','preferredquality':'192'}]
-            elif codec_choice == "Opus (Audio Only)":
-                postprocessors=[{'key':'FFmpegExtractAudio','preferredcodec':'opus','preferredquality':'192'}]
+            _encoder_sessions.set_override(encoder, int(sessions) if sessions else None)
+        except (TypeError, ValueError):
+            print(f"Ignoring invalid session count for {encoder}: {sessions}")
+
+# === Bandwidth ===
+_bandwidth_governor = BandwidthGovernor()
+
+def get_bandwidth_governor() -> BandwidthGovernor:
+    return _bandwidth_governor
+
+def configure_bandwidth(limit: Any = None, schedule: Optional[List[str]] = None) -> None:
+    """Set the global download cap ('2M', '500K', None) and time-of-day windows
+    (['09:00-18:00=2M']); running downloads follow on their next chunk"""
+    try:
+        _bandwidth_governor.set_limit(parse_rate(limit))
+    except ValueError as e:
+        print(f"Ignoring bandwidth limit: {e}")
+    try:
+        _bandwidth_governor.set_schedule(parse_schedule(schedule))
+    except ValueError as e:
+        print(f"Ignoring bandwidth schedule: {e}")
+
+def cpu_codec_for(codec_choice: str) -> str:
+    """CPU encoder producing the same codec: 'H.265 (NVIDIA NVENC)' -> 'H.265 (CPU libx265)'"""
+    family = video_family(codec_choice)
+    return next((name for name in CODEC_MAP if video_family(name) == family and "CPU" in name),
+                "H.264 (CPU libx264)")
+
+def next_fallback_codec(codec_choice: str, tried: List[str]) -> Optional[str]:
+    """Encoder to try after `codec_choice` failed: other usable hardware encoders of
+    the same codec in detection order, then its CPU encoder, then libx264"""
+    try:
+        ffmpeg_path = get_ffmpeg_path()
+        available = list(detect_available_codecs(ffmpeg_path)) if ffmpeg_path else []
+    except Exception:
+        available = []
+    family = video_family(codec_choice)
+    same_family = [name for name in available if video_family(name) == family and "Audio Only" not in name]
+    candidates = ([name for name in same_family if not is_software_codec(name)]
+                  + [name for name in same_family if is_software_codec(name)]
+                  + ["H.264 (CPU libx264)"])
+    return next((name for name in candidates if name not in tried), None)
+
+# === Calibrated encoder presets ===
+_encoder_goal: Optional[Tuple[str, float]] = None
+
+def configure_encoder_goal(goal: Optional[str]) -> None:
+    """Pick encoder and preset per job from calibration results: 'fastest:0.95', 'quality:1.0' or None"""
+    global _encoder_goal
+    try:
+        _encoder_goal = parse_goal(goal)
+    except ValueError as e:
+        print(f"Ignoring encoder goal: {e}")
+        _encoder_goal = None
+
+def auto_codec(codec_choice: str, res_choice: str) -> Tuple[str, Optional[List[str]]]:
+    """Encoder and arguments the configured goal picks for a job at its resolution.
+
+    Only encoders of the chosen codec that work here are considered. Returns
+    (codec_choice, None) when no goal is set or nothing was calibrated.
+    """
+    if _encoder_goal is None or "Audio Only" in codec_choice:
+        return codec_choice, None
+    try:
+        ffmpeg_path = get_ffmpeg_path()
+        available = detect_available_codecs(ffmpeg_path) if ffmpeg_path else {}
+        family = video_family(codec_choice)
+        encoders = {video_encoder(args): name for name, args in available.items()
+                    if args and video_family(name) == family}
+        results = machine_results(ffmpeg_fingerprint(ffmpeg_path)) if ffmpeg_path else []
+        height = RES_MAP.get(res_choice, 1080)
+        row = choose_preset(results, list(encoders), height, _encoder_goal)
+    except Exception as e:
+        print(f"Encoder preset selection error: {e}")
+        return codec_choice, None
+    if row is None:
+        return codec_choice, None
+    return encoders[row["encoder"]], preset_args(row, height)
+
+def attach_codec_policy(ydl: Any, codec_choice: str, codec_args: Optional[List[str]] = None) -> None:
+    """Register the per-item stream-copy/transcode decision for video codecs"""
+    if "Audio Only" not in codec_choice:
+        from postprocessors import StreamCopyPolicyPP
+        policy = StreamCopyPolicyPP(ydl, SOURCE_VCODECS.get(video_family(codec_choice), ()),
+                                    codec_args or resolve_codec_args(codec_choice), MP4_AUDIO_CODECS, AUDIO_ARGS)
+        ydl.add_post_processor(policy, when='before_dl')
+
+def run_job(job: DownloadJob) -> None:
+    """Download a single job with its own YoutubeDL instance"""
+    logger = JobLogger(job, job.logger)
+    options = job.options
+    codec_choice, auto_args = auto_codec(options.codec_choice, options.res_choice)
+    if auto_args:
+        logger.debug(f"[Calibration] Encoding with {codec_choice}: {' '.join(auto_args)}")
+
+    def encoder_args(choice: str) -> Optional[List[str]]:
+        """The calibrated arguments for the encoder the goal picked, else its defaults"""
+        return auto_args if auto_args and choice == tried[0] else resolve_codec_args(choice)
+
+    job.check_canceled()
+    os.makedirs(options.output_dir, exist_ok=True)
+    job.tracker.set_phase(PHASE_PREPARE)
+
+    governor = get_bandwidth_governor()
+    received: Dict[str, int] = {}  # Bytes already accounted per stream file
+    received_lock = threading.Lock()
+
+    def throttle(status: Dict[str, Any]) -> None:
+        filename = status.get('tmpfilename') or status.get('filename') or ""
+        with received_lock:
+            total = status.get('downloaded_bytes') or 0
+            new_bytes = max(0, total - received.get(filename, 0))
+            received[filename] = max(total, received.get(filename, 0))
+        governor.consume(job.key, new_bytes, job.cancel_event)
+
+    spans = job.spans
+
+    def time_stream(status: Dict[str, Any]) -> None:
+        """One download span per stream file"""
+        filename = status.get('filename') or ""
+        if status.get('status') == 'downloading':
+            if not spans.is_open(SPAN_DOWNLOAD, filename):
+                info = status.get('info_dict') or {}
+                spans.start(SPAN_DOWNLOAD, filename, format_id=info.get('format_id'),
+                            protocol=info.get('protocol'), fragments=status.get('fragment_count'))
+        elif status.get('status') == 'finished':
+            spans.end(SPAN_DOWNLOAD, filename,
+                      nbytes=status.get('total_bytes') or status.get('downloaded_bytes'))
         else:
-            postprocessor_args = (codec_args or []) + ['-c:a','aac','-b:a','192k']
+            spans.end(SPAN_DOWNLOAD, filename, "error", status.get('downloaded_bytes'))
+
+    def progress_hook(status: Dict[str, Any]) -> None:
+        job.check_canceled()
+        if job.pipeline and status.get('status') == 'downloading':
+            job.pipeline.enter_download(job)
+        time_stream(status)
+        if status.get('status') == 'downloading':
+            throttle(status)
+            job.check_canceled()
+        job.tracker.progress.allocated_rate = governor.allocation(job.key)
+        job.tracker.download_hook(status)
+        if job.journal:
+            job.journal.progress(job.key, status)
+
+    def needs_encode(status: Dict[str, Any]) -> bool:
+        """Whether a starting postprocessor transcodes (rather than copies) streams"""
+        name = status.get('postprocessor')
+        if name == 'Merger':
+            return bool((ydl.params.get('postprocessor_args') or {}).get('merger+ffmpeg'))
+        if name == 'ExtractAudio':
+            acodec = (status.get('info_dict') or {}).get('acodec')
+            return not codec_matches(acodec, SOURCE_ACODECS.get(options.codec_choice, ()))
+        return name in ENCODING_PPS
+
+    sessions = get_encoder_sessions()
+    held: List[EncoderSession] = []
+    cpu_encode: Dict[str, Any] = {}  # encoder, media seconds and start of a running CPU encode
+
+    def start_merge_encode(status: Dict[str, Any]) -> None:
+        """Take a hardware encoder session for the merge, or move the encode to the CPU"""
+        merge_args = (ydl.params.get('postprocessor_args') or {}).get('merger+ffmpeg') or []
+        encoder = video_encoder(merge_args)
+        if not encoder:
+            return
+        media_seconds = float((status.get('info_dict') or {}).get('duration') or 0)
+        if not is_hardware_encoder(encoder):
+            cpu_encode.update(encoder=encoder, media_seconds=media_seconds, started=time.monotonic())
+            return
+        cpu_choice = cpu_codec_for(codec_choice)
+        cpu_args = CODEC_MAP.get(cpu_choice) or []
+        session = sessions.acquire(encoder, media_seconds, video_encoder(cpu_args), job.cancel_event)
+        job.check_canceled()
+        if session is not None:
+            held.append(session)
+            return
+        # Waiting for a free session would take longer than encoding on the CPU
+        codec_args = encoder_args(codec_choice) or []
+        ydl.params['postprocessor_args'] = {**(ydl.params.get('postprocessor_args') or {}),
+                                            'merger+ffmpeg': cpu_args + merge_args[len(codec_args):]}
+        logger.debug(f"[EncoderSessions] Every {encoder} session is busy; encoding with {cpu_choice}")
+        cpu_encode.update(encoder=video_encoder(cpu_args), media_seconds=media_seconds,
+                          started=time.monotonic())
+
+    def finish_merge_encode() -> None:
+        while held:
+            sessions.release(held.pop())
+        if cpu_encode:
+            sessions.record(cpu_encode["encoder"], cpu_encode["media_seconds"],
+                            time.monotonic() - cpu_encode["started"])
+            cpu_encode.clear()
+
+    def postprocessor_span(status: Dict[str, Any]) -> Optional[str]:
+        name = status.get('postprocessor')
+        if name in ENCODING_PPS:
+            return SPAN_ENCODE if needs_encode(status) else SPAN_MERGE
+        return {'ExtractAudio': SPAN_EXTRACT_AUDIO, 'MoveFiles': SPAN_FINALIZE}.get(name)
+
+    def output_size(status: Dict[str, Any]) -> Optional[int]:
+        try:
+            return os.path.getsize((status.get('info_dict') or {})['filepath'])
+        except (KeyError, TypeError, OSError):
+            return None
 
-        # Validate output directory
-        if not os.path.exists(DOWNLOAD_DIR):
+    # Postprocessors that started but never finished: an encode that failed
+    interrupted = set()
+    pp_spans: Dict[str, str] = {}  # Running postprocessor -> its span
+
+    def postprocessor_hook(status: Dict[str, Any]) -> None:
+        job.check_canceled()
+        name = status.get('postprocessor')
+        if status.get('status') == 'started':
+            interrupted.add(name)
+            encode = needs_encode(status)
+            if encode and (job.pipeline or name == 'Merger'):
+                with spans.span(SPAN_WAIT_ENCODE):
+                    if job.pipeline:
+                        # Free the network slot for the next download while this item waits to encode
+                        job.tracker.set_phase(PHASE_STAGED)
+                        job.pipeline.enter_encode(job)
+                    if name == 'Merger':
+                        start_merge_encode(status)
+            span = postprocessor_span(status)
+            if span:
+                pp_spans[name] = span
+                attrs = {}
+                if span == SPAN_ENCODE and name == 'Merger':
+                    attrs['encoder'] = video_encoder((ydl.params.get('postprocessor_args') or {}).get('merger+ffmpeg'))
+                spans.start(span, name, **attrs)
+        elif status.get('status') == 'finished':
+            interrupted.discard(name)
+            if name == 'Merger':
+                finish_merge_encode()
+            if name in pp_spans:
+                spans.end(pp_spans.pop(name), name, nbytes=output_size(status))
+        job.tracker.postprocessor_hook(status)
+
+    archive = get_download_archive() if options.use_archive else None
+    ydl: Any = None
+
+    tried = [codec_choice]
+    from yt_dlp import YoutubeDL
+    from postprocessors import ArchiveRecorderPP, TimingMarkerPP
+    install_popen_hook(_process_registry)
+    governor.register(job.key, priority_weight(job.priority))
+    try:
+        while True:
+            # Format selection always follows the requested codec, so a fallback
+            # encode picks the same source streams that are already on disk
+            ydl_opts = build_ydl_opts(options.codec_choice, options.res_choice, logger, options.output_dir)
+            ydl_opts['progress_hooks'] = [progress_hook]
+            ydl_opts['postprocessor_hooks'] = [postprocessor_hook]
+            if archive:
+                # Checked by yt-dlp before extracting a URL or playlist entry
+                ydl_opts['download_archive'] = archive.view(options.codec_choice, options.res_choice,
+                                                            options.verify_archive)
+            interrupted.clear()
             try:
-                os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-            except Exception as e:
-                def show_error():
-                    try:
-                        messagebox.showerror("Error", f"Cannot create download directory: {e}")
-                    except Exception:
-                        pass
-                if root and hasattr(root, 'after'):
-                    root.after(0, show_error)
+                with YoutubeDL(ydl_opts) as ydl:
+                    # Format selection runs between these two stages of each item
+                    ydl.add_post_processor(TimingMarkerPP(
+                        ydl, lambda info: spans.start(SPAN_FORMAT_SELECT, info.get('id'))), when='after_filter')
+                    ydl.add_post_processor(TimingMarkerPP(
+                        ydl, lambda info: spans.end(SPAN_FORMAT_SELECT, info.get('id'))), when='before_dl')
+                    attach_codec_policy(ydl, codec_choice, encoder_args(codec_choice))
+                    attach_fragment_tuning(ydl, options.fragments)
+                    recorder = ArchiveRecorderPP(ydl, archive, options.codec_choice,
+                                                 options.res_choice) if archive else None
+                    if get_stream_cache().enabled:
+                        attach_stream_cache(ydl, get_stream_cache(), recorder.mark_placed if recorder else None)
+                    if recorder:
+                        ydl.add_post_processor(recorder, when='after_move')
+                    retcode, cached_key = download_with_info_cache(ydl, job.url, logger, spans)
+            finally:
+                # A failed or canceled encode must not keep its session
+                while held:
+                    sessions.release(held.pop())
+                cpu_encode.clear()
+                pp_spans.clear()
+                spans.end_all(spans.failure_status())  # Whatever is still open was interrupted
+            job.check_canceled()
+            if not retcode:
                 return
 
-        # Build ydl_opts with safe FFMPEG_PATH handling
-        ydl_opts = {
-            'format': format_selector,
-            'outtmpl': os.path.join(DOWNLOAD_DIR, '%(title)s.%(ext)s'),
-            'merge_output_format': 'mp4',
-            'postprocessors': postprocessors,
-            'noplaylist': False,
-            'ignoreerrors': True,
-            'logger': TkinterLogger(log_widget, prog_label, speed_label, progress_bar, phase_label, root),
-        }
-        
-        # Only add ffmpeg_location if FFMPEG_PATH is not None
-        if FFMPEG_PATH is not None:
-            ydl_opts['ffmpeg_location'] = FFMPEG_PATH
-            
-        if postprocessor_args:
-            ydl_opts['postprocessor_args'] = postprocessor_args
+            # Signed URLs from the cache were refused: extract afresh once
+            if cached_key and STALE_INFO_ERRORS.search(job.error or ""):
+                logger.warning("Cached video metadata is stale, extracting again...")
+                get_info_cache().invalidate(cached_key)
+                job.error = None
+                continue
 
-        try:
-            with YoutubeDL(ydl_opts) as ydl:
-                # Check for cancellation before starting download
-                if stop_event.is_set():
-                    raise Exception("Canceled by user")
-                
-                # Download each URL individually with cancellation checks
-                for url in valid_urls:
-                    if stop_event.is_set():
-                        raise Exception("Canceled by user")
-                    try:
-                        ydl.download([url])
-                    except Exception as e:
-                        if stop_event.is_set() or "Canceled by user" in str(e):
-                            raise Exception("Canceled by user")
-                        # For other errors, continue with next URL or re-raise depending on severity
-                        raise e
-
-            def update_completion():
+            # Hardware encode failed: re-run only this item's encode on the next usable encoder.
+            # Its streams are still on disk and its metadata is cached, so nothing is fetched again.
+            if not is_software_codec(codec_choice) and interrupted & set(ENCODING_PPS):
+                fallback = next_fallback_codec(codec_choice, tried)
+                if fallback:
+                    logger.warning(f"{codec_choice} encoding failed, re-encoding with {fallback}...")
+                    tried.append(fallback)
+                    codec_choice = fallback
+                    job.error = None
+                    continue
+            raise Exception(job.error or "Download failed")
+    finally:
+        governor.unregister(job.key)
+
+def expand_collection(job: DownloadJob, enqueue: Callable[[str], None]) -> None:
+    """Stream the videos of a playlist/channel URL into the queue as pages arrive.
+
+    Uses flat extraction, so only the listing pages are fetched here; each video
+    becomes its own job and can start downloading while enumeration continues.
+    Videos the archive already satisfies are skipped without being queued.
+    """
+    options = job.options
+    archive = get_download_archive() if options.use_archive else None
+    view = archive.view(options.codec_choice, options.res_choice, options.verify_archive) if archive else None
+    discovered = 0
+    ydl_opts = {
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+        'ignoreerrors': True,
+        'logger': JobLogger(job, job.logger),
+        'noprogress': True,
+        'color': 'no_color',
+    }
+    job.tracker.set_discovered(0, None)
+
+    from yt_dlp import YoutubeDL
+    from yt_dlp.utils import make_archive_id
+    with YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(job.url, download=False, process=False)
+        # Channel URLs usually resolve to their videos tab first
+        while info and info.get('_type') in ('url', 'url_transparent'):
+            job.check_canceled()
+            info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+        if not info:
+            raise Exception(job.error or "Could not list playlist")
+
+        estimate = info.get('playlist_count')
+        entries = info.get('entries') if info.get('_type') in ('playlist', 'multi_video') else [info]
+        for entry in entries or ():
+            job.check_canceled()
+            if not entry:
+                continue
+            discovered += 1
+            url = entry.get('url') or entry.get('webpage_url')
+            ie_key = entry.get('ie_key') or entry.get('extractor_key')
+            if url and not (view and ie_key and entry.get('id')
+                            and make_archive_id(ie_key, entry['id']) in view):
+                enqueue(url)
+            job.tracker.set_discovered(discovered, estimate)
+
+class DownloadManager:
+    """Job queue run as a two-stage pipeline: network slots, then encode slots.
+
+    Every job runs in its own YoutubeDL instance and starts in one of
+    `max_workers` network slots. When an item needs a real transcode it hands
+    its network slot to the next job, waits in the staging area (its
+    downloaded source streams) and then encodes in one of `encode_workers`
+    slots. No new download starts while `max_staged` items are waiting, so
+    the staging area stays bounded. New URLs are accepted while others are in
+    flight, and jobs can be canceled one at a time or all at once.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_CONCURRENCY,
+                 runner: Callable[[DownloadJob], None] = run_job,
+                 expander: Callable[[DownloadJob, Callable[[str], None]], None] = expand_collection,
+                 journal: Optional[JobJournal] = None,
+                 encode_workers: int = DEFAULT_ENCODE_WORKERS, max_staged: int = MAX_STAGED):
+        self.max_workers = max(1, min(MAX_CONCURRENCY, int(max_workers)))
+        self.encode_workers = max(1, min(MAX_CONCURRENCY, int(encode_workers)))
+        self.max_staged = max(1, int(max_staged))
+        self.runner = runner
+        self.expander = expander
+        self.journal = journal  # Records unfinished jobs so they can be resumed after a restart
+        self._cond = threading.Condition()
+        self._pending: deque = deque()
+        self._running: Dict[int, DownloadJob] = {}
+        self._expanding: Dict[int, DownloadJob] = {}  # Enumerate outside the worker slots
+        self._stages: Dict[int, str] = {}  # Running job id -> STAGE_* it is in
+
+    def submit(self, urls: List[str], options: DownloadOptions,
+               logger: Any = None,
+               on_done: Optional[Callable[[DownloadBatch], None]] = None,
+               on_progress: Optional[Callable[[DownloadJob, JobProgress], None]] = None,
+               on_queued: Optional[Callable[[DownloadJob], None]] = None) -> DownloadBatch:
+        """Queue one job per URL and return the batch tracking them"""
+        batch = DownloadBatch(on_done, on_progress, on_queued)
+        for url in urls:
+            self._enqueue(DownloadJob(url, options, batch, logger))
+        if not batch.jobs:
+            self._notify_batch(batch)
+        return batch
+
+    def _enqueue(self, job: DownloadJob) -> None:
+        if job.batch:
+            job.batch.jobs.append(job)
+            if job.batch.on_queued:
                 try:
-                    if stop_event.is_set():
-                        if log_widget and hasattr(log_widget, 'insert'):
-                            log_widget.insert("end", "❌ Download canceled by user\n", "error")
-                        if phase_label and hasattr(phase_label, 'configure'):
-                            phase_label.configure(text="⏹️ Canceled")
-                        if prog_label and hasattr(prog_label, 'configure'):
-                            prog_label.configure(text="Progress")
-                        if progress_bar and hasattr(progress_bar, 'set'):
-                            progress_bar.set(0.0)
-                        if speed_label and hasattr(speed_label, 'configure'):
-                            speed_label.configure(text="")
-                    else:
-                        if log_widget and hasattr(log_widget, 'insert'):
-                            log_widget.insert("end", translations["done"] + "\n")
-                        if progress_bar and hasattr(progress_bar, 'set'):
-                            progress_bar.set(1.0)
-                        if phase_label and hasattr(phase_label, 'configure'):
-                            phase_label.configure(text=translations["phase_done"])
-                        if prog_label and hasattr(prog_label, 'configure'):
-                            prog_label.configure(text=f"{translations['progress']} (100%)")
-                except Exception:
-                    pass
-            
-            if root and hasattr(root, 'after'):
-                root.after(0, update_completion)
+                    job.batch.on_queued(job)
+                except Exception as e:
+                    print(f"Batch callback error: {e}")
+        if self.journal:
+            job.journal = self.journal
+            self.journal.queued(job.key, job.url, job.options.to_dict(), job.parent_key)
+        job.spans.start(SPAN_JOB, codec=job.options.codec_choice, resolution=job.options.res_choice,
+                        priority=job.priority, parent=job.parent_key)
+        with self._cond:
+            if job.expands:
+                self._expanding[job.id] = job
+                threading.Thread(target=self._expand, args=(job,), daemon=True).start()
+            else:
+                job.spans.start(SPAN_QUEUE)
+                self._pending.append(job)
+                self._start_pending()
+
+    def _expand(self, parent: DownloadJob) -> None:
+        parent.state = JOB_RUNNING
+        if parent.journal:
+            parent.journal.state(parent.key, JOB_RUNNING)
 
+        def enqueue(url: str) -> None:
+            job = DownloadJob(url, parent.options, parent.batch, parent.logger)
+            job.parent_key = parent.key
+            job.priority = parent.priority
+            self._enqueue(job)
+
+        try:
+            with parent.spans.span(SPAN_EXTRACT, playlist=True):
+                self.expander(parent, enqueue)
+            state = JOB_DONE
         except Exception as e:
-            # Check if it's a user cancellation
-            if stop_event.is_set() or "Canceled by user" in str(e):
-                def show_canceled():
-                    try:
-                        if log_widget and hasattr(log_widget, 'insert'):
-                            log_widget.insert("end", "❌ Download canceled by user\n", "error")
-                        if phase_label and hasattr(phase_label, 'configure'):
-                            phase_label.configure(text="⏹️ Canceled")
-                        if prog_label and hasattr(prog_label, 'configure'):
-                            prog_label.configure(text="Progress")
-                        if progress_bar and hasattr(progress_bar, 'set'):
-                            progress_bar.set(0.0)
-                        if speed_label and hasattr(speed_label, 'configure'):
-                            speed_label.configure(text="")
-                    except Exception:
-                        pass
-                
-                if root and hasattr(root, 'after'):
-                    root.after(0, show_canceled)
-                return  # Don't try fallback for user cancellation
-            
-            # Enhanced fallback mechanism
-            if "amf" in codec_choice.lower() and ("not available" in str(e).lower() or "failed" in str(e).lower()):
-                def retry_with_fallback():
-                    try:
-                        if log_widget and hasattr(log_widget, 'insert'):
-                            log_widget.insert("end", "⚠️ AMD AMF encoding failed, retrying with CPU encoding...\n", "warning")
-                    except Exception:
-                        pass
-                
-                if root and hasattr(root, 'after'):
-                    root.after(0, retry_with_fallback)
-                
-                # Release lock before recursive call
-                if lock_acquired:
-                    try:
-                        download_active.release()
-                        lock_acquired = False
-                    except Exception:
-                        pass
-                        
-                return download_videos(valid_urls, "H.264 (CPU libx264)", res_choice,
-                                       log_widget, prog_label, speed_label,
-                                       download_btn, progress_bar, phase_label, root)
+            if parent.canceled or is_cancellation(e):
+                state = JOB_CANCELED
             else:
-                def show_error():
-                    try:
-                        if log_widget and hasattr(log_widget, 'insert'):
-                            log_widget.insert("end", translations["error"] + f": {e}\n", "error")
-                        messagebox.showerror(translations["error"], str(e))
-                    except Exception:
-                        pass
-                
-                if root and hasattr(root, 'after'):
-                    root.after(0, show_error)
-                
-    finally:
-        # Ensure UI is reset and lock is released safely
-        def reset_ui():
-            try:
-                if download_btn and hasattr(download_btn, 'configure'):
-                    download_btn.configure(text="⬇️ Download")
-                
-                # If download was canceled, ensure UI shows canceled state
-                if stop_event.is_set():
-                    if phase_label and hasattr(phase_label, 'configure'):
-                        phase_label.configure(text="⏹️ Canceled")
-                    if prog_label and hasattr(prog_label, 'configure'):
-                        prog_label.configure(text="Progress")
-                    if progress_bar and hasattr(progress_bar, 'set'):
-                        progress_bar.set(0.0)
-                    if speed_label and hasattr(speed_label, 'configure'):
-                        speed_label.configure(text="")
-            except Exception:
-                pass
-        
-        if root and hasattr(root, 'after'):
-            root.after(0, reset_ui)
-        
-        # Safe lock release
-        if lock_acquired:
-            try:
-                download_active.release()
-            except Exception:
-                pass
+                parent.error = parent.error or str(e)
+                state = JOB_FAILED
 
-# === Enhanced Cancel Function ===
-def cancel_download():
-    """Enhanced cancel with proper cleanup and immediate UI feedback"""
-    global current_processes
-    stop_event.set()
-    
-    # Additional cancellation for any running subprocesses
-    import signal
-    try:
-        # Try to terminate any running ffmpeg processes
-        for proc in current_processes:
+        with self._cond:
+            self._expanding.pop(parent.id, None)
+        self._finish(parent, state)
+
+    def set_max_workers(self, max_workers: int) -> None:
+        """Change the network slot count; running downloads are never interrupted"""
+        with self._cond:
+            self.max_workers = max(1, min(MAX_CONCURRENCY, int(max_workers)))
+            self._start_pending()
+
+    def set_encode_workers(self, encode_workers: int) -> None:
+        """Change the encode slot count"""
+        with self._cond:
+            self.encode_workers = max(1, min(MAX_CONCURRENCY, int(encode_workers)))
+            self._cond.notify_all()
+
+    def set_priority(self, job_id: int, priority: str) -> bool:
+        """Move a queued job ahead of lower priorities, or re-weight a running one's bandwidth"""
+        with self._cond:
+            job = (self._running.get(job_id) or self._expanding.get(job_id)
+                   or next((j for j in self._pending if j.id == job_id), None))
+            if job is None:
+                return False
+            job.priority = priority
+        get_bandwidth_governor().set_weight(job.key, priority_weight(priority))
+        return True
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a queued or running job"""
+        with self._cond:
+            job = self._running.get(job_id) or self._expanding.get(job_id)
+            if job is None:
+                job = next((j for j in self._pending if j.id == job_id), None)
+                if job is not None:
+                    self._pending.remove(job)
+        if job is None:
+            return False
+        job.cancel()
+        if job.state == JOB_QUEUED:
+            self._finish(job, JOB_CANCELED)
+        return True
+
+    def cancel_all(self) -> None:
+        """Cancel every queued and running job"""
+        with self._cond:
+            pending = list(self._pending)
+            self._pending.clear()
+            running = list(self._running.values()) + list(self._expanding.values())
+        for job in running:
+            job.cancel()
+        for job in pending:
+            job.cancel()
+            self._finish(job, JOB_CANCELED)
+
+    def running_jobs(self) -> List[DownloadJob]:
+        with self._cond:
+            return list(self._running.values())
+
+    def is_busy(self) -> bool:
+        with self._cond:
+            return bool(self._pending or self._running or self._expanding)
+
+    def queued_keys(self) -> Set[str]:
+        """Canonical keys (see canonical_youtube_url) of the jobs queued, running or expanding"""
+        with self._cond:
+            urls = [job.url for job in self._pending]
+            urls += [job.url for job in list(self._running.values()) + list(self._expanding.values())]
+        canonical = (canonical_youtube_url(url) for url in urls)
+        return {result[0] for result in canonical if result is not None}
+
+    def _count(self, stage: str) -> int:
+        return sum(1 for held in self._stages.values() if held == stage)
+
+    def _start_pending(self) -> None:
+        # Caller holds self._cond. Back-pressure: no new download while the staging area is full.
+        while (self._pending and self._count(STAGE_DOWNLOAD) < self.max_workers
+               and self._count(STAGE_STAGED) < self.max_staged):
+            # Highest priority first, in submission order within a priority
+            job = max(self._pending, key=lambda j: priority_weight(j.priority))
+            self._pending.remove(job)
+            job.spans.end(SPAN_QUEUE)
+            self._running[job.id] = job
+            self._stages[job.id] = STAGE_DOWNLOAD
+            job.state = JOB_RUNNING
+            job.pipeline = self
+            threading.Thread(target=self._worker, args=(job,), daemon=True).start()
+
+    def _move(self, job: DownloadJob, stage: str, limit: Callable[[], int]) -> None:
+        """Wait for a free slot in `stage`, giving up the job's current slot first"""
+        with self._cond:
+            if self._stages.get(job.id) in (stage, None):
+                return
+            self._stages[job.id] = STAGE_STAGED if stage == STAGE_ENCODE else STAGE_WAITING
+            self._start_pending()
+            self._cond.notify_all()
+            while self._count(stage) >= limit():
+                job.check_canceled()
+                self._cond.wait(0.5)
+            self._stages[job.id] = stage
+            self._start_pending()
+            self._cond.notify_all()
+
+    def enter_encode(self, job: DownloadJob) -> None:
+        """Called by a job whose sources are downloaded and need a transcode"""
+        self._move(job, STAGE_ENCODE, lambda: self.encode_workers)
+
+    def enter_download(self, job: DownloadJob) -> None:
+        """Called by a job that downloads again (e.g. its next item) after an encode"""
+        self._move(job, STAGE_DOWNLOAD, lambda: self.max_workers)
+
+    def stage_counts(self) -> Dict[str, int]:
+        """Running jobs per pipeline stage"""
+        with self._cond:
+            return {stage: self._count(stage)
+                    for stage in (STAGE_DOWNLOAD, STAGE_STAGED, STAGE_ENCODE, STAGE_WAITING)}
+
+    def _worker(self, job: DownloadJob) -> None:
+        if job.journal:
+            job.journal.state(job.key, JOB_RUNNING)
+        try:
+            # Processes yt-dlp starts for the job are registered so a cancel can kill them
+            with _process_registry.track(job.key, job.cancel_event):
+                self.runner(job)
+            state = JOB_DONE
+        except Exception as e:
+            if job.canceled or is_cancellation(e):
+                state = JOB_CANCELED
+            else:
+                job.error = job.error or str(e)
+                state = JOB_FAILED
+
+        with self._cond:
+            self._running.pop(job.id, None)
+            self._stages.pop(job.id, None)
+            self._start_pending()
+            self._cond.notify_all()
+        self._finish(job, state)
+
+    def _finish(self, job: DownloadJob, state: str) -> None:
+        job.state = state
+        job.spans.end_all("ok" if state == JOB_DONE else "canceled" if state == JOB_CANCELED else "error")
+        job.spans.end(SPAN_JOB, status=state, items=job.progress.items_done, error=job.error)
+        level = LEVEL_INFO if state == JOB_DONE else LEVEL_WARNING if state == JOB_CANCELED else LEVEL_ERROR
+        _job_log.append(level, f"Job {state}: {job.url}" + (f" ({job.error})" if state == JOB_FAILED else ""), job.id)
+        if job.journal:
+            # Canceled jobs stay journaled so they can be resumed from their partial files
+            if state == JOB_CANCELED:
+                job.journal.state(job.key, state)
+            else:
+                job.journal.finished(job.key)
+        job.tracker.set_phase(state)  # Job states double as final progress phases
+        if job.batch and job.batch.finished:
+            self._notify_batch(job.batch)
+
+    def _notify_batch(self, batch: DownloadBatch) -> None:
+        with self._cond:
+            callback, batch.on_done = batch.on_done, None  # Fire at most once
+            batch._done_event.set()
+        if callback:
             try:
-                if proc and proc.poll() is None:  # Process is still running
-                    proc.terminate()
-                    # Give it a moment to terminate gracefully
-                    try:
-                        proc.wait(timeout=2)
-                    except subprocess.TimeoutExpired:
-                        proc.kill()  # Force kill if necessary
-            except Exception:
-                pass
-        current_processes.clear()
-    except Exception:
-        pass
+                callback(batch)
+            except Exception as e:
+                print(f"Batch callback error: {e}")
+
+download_manager = DownloadManager(journal=JobJournal())
+_telemetry.add_gauge("pipeline_jobs", "Running jobs per pipeline stage", "stage", download_manager.stage_counts)
+_telemetry.add_gauge("stream_cache", "Source stream cache hits, misses, bytes saved and size", "stat",
+                     lambda: {k: v for k, v in _stream_cache.stats().items() if k != "max_bytes"})
 
+def resumable_batches(entries: Iterable[JournalEntry]) -> List[Tuple[DownloadOptions, List[str]]]:
+    """Group unfinished journal entries into (options, URLs) to submit again.
+
+    Videos queued by a playlist/channel that had not finished listing are left
+    out: listing it again re-queues them, and their partial files still resume.
+    """
+    entries = list(entries)
+    keys = {entry.key for entry in entries}
+    groups: Dict[str, Tuple[DownloadOptions, List[str]]] = {}
+    for entry in entries:
+        if entry.parent in keys:
+            continue
+        options = DownloadOptions.from_dict(entry.options)
+        group_key = repr(sorted(options.to_dict().items()))
+        urls = groups.setdefault(group_key, (options, []))[1]
+        if entry.url not in urls:
+            urls.append(entry.url)
+    return list(groups.values())
+
+# === Enhanced Cancel Function ===
+def cancel_download(job_id: Optional[int] = None):
+    """Cancel one job, or every queued and running job when no id is given"""
+    if job_id is not None:
+        download_manager.cancel(job_id)
+        return
+    download_manager.cancel_all()
+    _process_registry.kill_all()
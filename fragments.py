@@ -0,0 +1,104 @@
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+from config import load_fragment_tuning, save_fragment_tuning
+
+# === Fragment concurrency ===
+FRAGMENT_LEVELS = (1, 2, 4, 8, 16)  # Values tried for yt-dlp's concurrent_fragment_downloads
+DEFAULT_FRAGMENT_LEVEL = 4           # Starting point for hosts never measured
+SPEED_TOLERANCE = 0.1                # Prefer fewer connections unless more are >10% faster
+SPEED_SMOOTHING = 0.5                # Weight of the newest sample in the running average
+REPROBE_AFTER = 8                    # Samples at the chosen level before neighbours are re-measured
+MIN_SAMPLE_BYTES = 1024 * 1024       # Smaller streams finish too quickly to measure
+
+def fragment_host(url: Optional[str]) -> Optional[str]:
+    """Host key for tuning: 'rr3---sn-abc.googlevideo.com' -> 'googlevideo.com'"""
+    if not url:
+        return None
+    host = (urlparse(url).hostname or "").lower()
+    if not host:
+        return None
+    labels = host.split(".")
+    if host.replace(".", "").isdigit() or len(labels) <= 2:
+        return host
+    return ".".join(labels[-2:])
+
+class _HostState:
+    def __init__(self, level: int):
+        self.level = level        # Best level known so far (the one remembered)
+        self.next = level         # Level the next stream uses (may be a probe)
+        self.speeds: Dict[int, float] = {}
+        self.samples = 0          # Samples taken at `level` since neighbours were last measured
+
+class FragmentTuner:
+    """Picks how many fragments of a DASH/HLS stream are fetched in parallel.
+
+    Every finished fragmented stream reports its throughput for the level it
+    used; the tuner climbs towards the level with the best throughput, probing
+    one step up and down, and remembers the winner per host across sessions.
+    Safe to share between worker threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: Optional[Dict[str, _HostState]] = None  # Loaded on first use
+        self._saved: Dict[str, Any] = {}
+
+    def _state(self, host: str) -> _HostState:
+        if self._hosts is None:
+            self._hosts = {}
+            self._saved = load_fragment_tuning()
+            for name, level in self._saved.items():
+                if level in FRAGMENT_LEVELS:
+                    self._hosts[name] = _HostState(level)
+        if host not in self._hosts:
+            self._hosts[host] = _HostState(DEFAULT_FRAGMENT_LEVEL)
+        return self._hosts[host]
+
+    def level(self, host: Optional[str]) -> int:
+        """Level the next fragmented stream from this host should use"""
+        if not host:
+            return DEFAULT_FRAGMENT_LEVEL
+        with self._lock:
+            return self._state(host).next
+
+    def record(self, host: Optional[str], level: int, speed: float) -> int:
+        """Feed one stream's throughput (bytes/s) at `level`; returns the level to use next"""
+        if not host or level not in FRAGMENT_LEVELS or speed <= 0:
+            return self.level(host)
+        with self._lock:
+            state = self._state(host)
+            previous = state.speeds.get(level)
+            state.speeds[level] = speed if previous is None else (
+                SPEED_SMOOTHING * speed + (1 - SPEED_SMOOTHING) * previous)
+
+            # Lowest level within tolerance of the fastest one measured
+            fastest = max(state.speeds.values())
+            best = min(lvl for lvl, s in state.speeds.items() if s >= fastest * (1 - SPEED_TOLERANCE))
+            state.samples = state.samples + 1 if best == state.level else 0
+            if state.samples >= REPROBE_AFTER:
+                # Conditions change; let the neighbours be measured again
+                state.speeds = {best: state.speeds[best]}
+                state.samples = 0
+
+            index = FRAGMENT_LEVELS.index(best)
+            up = FRAGMENT_LEVELS[index + 1] if index + 1 < len(FRAGMENT_LEVELS) else None
+            down = FRAGMENT_LEVELS[index - 1] if index > 0 else None
+            if up is not None and up not in state.speeds:
+                state.next = up
+            elif down is not None and down not in state.speeds:
+                state.next = down
+            else:
+                state.next = best
+
+            state.level = best
+            remembered = self.snapshot()
+            if remembered != self._saved:
+                save_fragment_tuning(remembered)
+                self._saved = remembered
+            return state.next
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Remembered level per host"""
+        return {host: state.level for host, state in (self._hosts or {}).items()
+                if state.speeds or host in self._saved}
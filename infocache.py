@@ -0,0 +1,121 @@
+import copy, json, re, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# === Extraction cache ===
+DEFAULT_TTL = 30 * 60              # Seconds to keep info whose URLs carry no expiry
+EXPIRY_MARGIN = 30 * 60            # Leave this long before signed URLs expire to finish the download
+MAX_CACHE_BYTES = 64 * 1024 * 1024 # Approximate memory budget (JSON size of the cached dicts)
+
+# YouTube and similar CDNs sign media URLs with `expire=<unix time>` (or /expire/<t>/ in manifests)
+_EXPIRE_RE = re.compile(r'[?&/]expire[=/](\d{9,})')
+
+def signed_url_expiry(info: Dict[str, Any]) -> Optional[float]:
+    """Earliest expiry among the info's format/manifest URLs, if any are signed"""
+    expiries = []
+    for fmt in info.get('formats') or [info]:
+        for field in ('url', 'manifest_url', 'fragment_base_url'):
+            match = _EXPIRE_RE.search(str(fmt.get(field) or ""))
+            if match:
+                expiries.append(float(match.group(1)))
+    return min(expiries) if expiries else None
+
+class _CacheEntry:
+    def __init__(self, info: Dict[str, Any], expires: float, size: int):
+        self.info = info
+        self.expires = expires
+        self.size = size
+
+class InfoCache:
+    """Unprocessed yt-dlp extraction results keyed by "<extractor> <video id>".
+
+    Entries live until shortly before their signed media URLs expire, so a
+    retry, a fallback encode or another resolution of the same video can go
+    straight to format selection without fetching the page again. Least
+    recently used entries are evicted past the size budget. Thread-safe.
+    """
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES, default_ttl: float = DEFAULT_TTL):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._aliases: Dict[str, str] = {}  # URL -> key, for URLs whose ID is not known up front
+        self._bytes = 0
+        self.hits = self.misses = self.expired = self.evictions = 0
+
+    def key_for(self, url: str, video_key: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            return video_key or self._aliases.get(url)
+
+    def get(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """A private copy of the cached info (processing mutates it), or None"""
+        with self._lock:
+            entry = self._entries.get(key) if key else None
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires <= time.time():
+                self._drop(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            info = entry.info
+        return copy.deepcopy(info)
+
+    def put(self, info: Dict[str, Any], *urls: str) -> Optional[str]:
+        """Cache a single-video extraction result; returns its key"""
+        if not info or info.get('_type', 'video') != 'video' or not info.get('formats'):
+            return None
+        extractor, video_id = info.get('extractor_key') or info.get('ie_key'), info.get('id')
+        if not extractor or not video_id:
+            return None
+        key = f"{extractor.lower()} {video_id}"
+        expiry = signed_url_expiry(info)
+        expires = expiry - EXPIRY_MARGIN if expiry else time.time() + self.default_ttl
+        if expires <= time.time():
+            return key
+        try:
+            size = len(json.dumps(info, default=str))
+        except Exception:
+            return key
+        if size > self.max_bytes:
+            return key
+        info = copy.deepcopy(info)
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _CacheEntry(info, expires, size)
+            self._bytes += size
+            for url in set(urls) | {info.get('webpage_url'), info.get('original_url')}:
+                if url:
+                    self._aliases[url] = key
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+        return key
+
+    def invalidate(self, key: Optional[str]) -> None:
+        """Forget an entry whose URLs were rejected before they were due to expire"""
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def _drop(self, key: str) -> None:
+        # Caller holds self._lock
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for url in [u for u, k in self._aliases.items() if k == key]:
+            del self._aliases[url]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses, "expired": self.expired,
+                    "evictions": self.evictions,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0}
@@ -0,0 +1,114 @@
+import csv, os, re
+from typing import Collection, Iterable, List, Optional, Set
+from urllib.parse import unquote, urlsplit
+from downloader import canonical_youtube_url
+
+# === Bulk URL ingest ===
+LIST_EXTENSIONS = (".txt", ".list", ".csv", ".tsv")  # A line naming such a file is read as a list of links
+MAX_LIST_BYTES = 64 * 1024 * 1024
+
+# Links are picked out of whatever surrounds them: CSV cells, quotes, prose
+_LINK_RE = re.compile(r'(?<![\w./@-])(?:https?://)?(?:[\w-]+\.)*(?:youtube(?:-nocookie)?\.com|youtu\.be)/[^\s,;"\'<>|]*', re.I)
+_URLISH_RE = re.compile(r'://|www\.|\.[a-z]{2,6}/', re.I)
+_TRAILING = ".)]}>!?"
+
+class IngestResult:
+    """Canonical URLs to queue, in first-seen order, and what was left out.
+
+    A URL is dropped as a duplicate when an earlier line named the same video,
+    playlist or channel in any spelling, or when a job for it is already
+    queued or running (`queued`, canonical keys).
+    """
+
+    def __init__(self, queued: Collection[str] = ()):
+        self.queued = queued
+        self.urls: List[str] = []
+        self.invalid: List[str] = []
+        self.files: List[str] = []  # Link lists read
+        self.duplicates = 0         # Repeats within the batch
+        self.already_queued = 0     # Matches of jobs already queued or running
+        self._seen: Set[str] = set()
+
+    def add_text(self, text: str, read_files: bool = False) -> None:
+        """Every line of pasted text; with `read_files`, lines naming a link list are read"""
+        for line in text.splitlines():
+            path = list_path(line) if read_files else None
+            if path:
+                self.add_file(path)
+            else:
+                self._add_line(line, lenient=False)
+
+    def add_file(self, path: str) -> None:
+        """A text file with a link per line, or a CSV/TSV file with links in any column"""
+        path = os.path.realpath(path)
+        if path in self.files:
+            return
+        try:
+            if os.path.getsize(path) > MAX_LIST_BYTES:
+                self.invalid.append(f"{path} (larger than {MAX_LIST_BYTES // (1024 * 1024)} MiB)")
+                return
+            with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+                if path.lower().endswith((".csv", ".tsv")):
+                    delimiter = "\t" if path.lower().endswith(".tsv") else ","
+                    # Headers and title columns are no links; only rows that look like they hold one count
+                    for row in csv.reader(f, delimiter=delimiter):
+                        self._add_line(" ".join(row), lenient=True)
+                else:
+                    for line in f:
+                        self._add_line(line, lenient=False)
+            self.files.append(path)
+        except (OSError, csv.Error) as e:
+            self.invalid.append(f"{path} ({e})")
+
+    def _add_line(self, line: str, lenient: bool) -> None:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            return
+        links = _LINK_RE.findall(line)
+        if not links:
+            if not lenient or _URLISH_RE.search(line):
+                self.invalid.append(line)
+            return
+        for link in links:
+            canonical = canonical_youtube_url(link.rstrip(_TRAILING))
+            if canonical is None:
+                self.invalid.append(link)
+                continue
+            key, url = canonical
+            if key in self._seen:
+                self.duplicates += 1
+            elif key in self.queued:
+                self.already_queued += 1
+            else:
+                self.urls.append(url)
+            self._seen.add(key)
+
+    def summary(self) -> str:
+        """'120 links, 3 duplicates, 2 already queued, 1 invalid'; empty parts are left out"""
+        parts = [f"{len(self.urls)} link{'s' if len(self.urls) != 1 else ''}"]
+        if self.duplicates:
+            parts.append(f"{self.duplicates} duplicate{'s' if self.duplicates != 1 else ''}")
+        if self.already_queued:
+            parts.append(f"{self.already_queued} already queued")
+        if self.invalid:
+            parts.append(f"{len(self.invalid)} invalid")
+        return ", ".join(parts)
+
+def list_path(line: str) -> Optional[str]:
+    """The link list a line names ('/path/urls.csv', a quoted path or a file:// URI), if it exists"""
+    text = line.strip().strip('"\'')
+    if text.lower().startswith("file:"):
+        text = unquote(urlsplit(text).path)
+        if os.name == "nt" and re.match(r'^/[A-Za-z]:', text):
+            text = text[1:]
+    if not text.lower().endswith(LIST_EXTENSIONS):
+        return None
+    path = os.path.expanduser(text)
+    return path if os.path.isfile(path) else None
+
+def collect(texts: Iterable[str], queued: Collection[str] = (), read_files: bool = False) -> IngestResult:
+    """Canonicalize and de-duplicate the links in `texts` (pasted text, one URL each, ...)"""
+    result = IngestResult(queued)
+    for text in texts:
+        result.add_text(str(text), read_files)
+    return result
@@ -0,0 +1,240 @@
+import json, os, re, threading, time
+from array import array
+from bisect import bisect_right
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from config import LOG_DIR
+
+# === Structured job log ===
+LEVELS = ("debug", "info", "warning", "error")
+LEVEL_DEBUG, LEVEL_INFO, LEVEL_WARNING, LEVEL_ERROR = range(len(LEVELS))
+SEGMENT_BYTES = 4 * 1024 * 1024  # A new segment file is started past this size
+MAX_SEGMENTS = 10                # Earlier sessions' files are deleted past this count
+MAX_SESSION_BYTES = 1024 * 1024 * 1024  # This session's oldest segments are deleted past this size
+FLUSH_SECONDS = 1.0              # Buffered lines reach the disk at least this often
+
+_SEGMENT_RE = re.compile(r'^downloads-(\d+)\.jsonl$')
+
+class _Segment:
+    def __init__(self, number: int, path: str, first_seq: int):
+        self.number = number
+        self.path = path
+        self.first_seq = first_seq
+        # Per line: byte offset, level and job id; the text stays on disk
+        self.offsets = array('q')
+        self.levels = array('b')
+        self.jobs = array('l')
+        self.size = 0
+
+def level_of(name: Optional[str]) -> int:
+    """'warning' -> LEVEL_WARNING; unknown names count as info"""
+    return LEVELS.index(name) if name in LEVELS else LEVEL_INFO
+
+class JobLog:
+    """Every log line of every job, as JSON lines in rotating segment files.
+
+    Lines are numbered (`seq`) from 0 for this session. Only a few bytes per
+    line are held in memory (file offset, level, job id), so a long batch
+    costs the same per line at the end as at the start; text is searched and
+    read back from disk. This session's segments are all kept, so a long run
+    can be searched from its first line, until together they pass
+    `max_session_bytes` (1 GiB, some 7 million lines); then its oldest go.
+    Files from earlier sessions are deleted, oldest first, once there are
+    more than `max_segments` files in all; they are not indexed. Thread-safe.
+    """
+
+    def __init__(self, directory: Optional[str] = LOG_DIR, segment_bytes: int = SEGMENT_BYTES,
+                 max_segments: int = MAX_SEGMENTS, max_session_bytes: int = MAX_SESSION_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max(1, max_segments)
+        self.max_session_bytes = max(segment_bytes, max_session_bytes)
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._file: Any = None
+        self._next_seq = 0
+        self._flushed = 0.0
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    def add_listener(self, func: Callable[[Dict[str, Any]], None]) -> None:
+        """Call `func(record)` for each new line, on the thread that logged it; keep it cheap"""
+        self._listeners.append(func)
+
+    def remove_listener(self, func: Callable[[Dict[str, Any]], None]) -> None:
+        try:
+            self._listeners.remove(func)
+        except ValueError:
+            pass
+
+    # === Writing ===
+    def append(self, level: int, msg: str, job_id: int = 0) -> int:
+        """Log one line; returns its seq"""
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            record = {"seq": seq, "t": round(time.time(), 3), "job": job_id, "level": LEVELS[level], "msg": msg}
+            self._write(record, level, job_id)
+        for listener in list(self._listeners):
+            try:
+                listener(record)
+            except Exception as e:
+                print(f"Job log listener error: {e}")
+        return seq
+
+    def _write(self, record: Dict[str, Any], level: int, job_id: int) -> None:
+        # Caller holds self._lock
+        if not self._segments or self._segments[-1].size >= self.segment_bytes:
+            self._rotate(record["seq"])
+        segment = self._segments[-1]
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        segment.offsets.append(segment.size)
+        segment.levels.append(level)
+        segment.jobs.append(job_id)
+        segment.size += len(line)
+        if self._file is None:
+            return
+        try:
+            self._file.write(line)
+            now = time.monotonic()
+            if level >= LEVEL_WARNING or now - self._flushed >= FLUSH_SECONDS:
+                self._file.flush()
+                self._flushed = now
+        except Exception as e:
+            print(f"Job log write error: {e}")
+            self._file = None
+
+    def _rotate(self, first_seq: int) -> None:
+        # Caller holds self._lock
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            self._file = None
+        numbers = self._numbers_on_disk()
+        number = max(numbers + [s.number for s in self._segments] + [0]) + 1
+        path = os.path.join(self.directory, f"downloads-{number:05d}.jsonl") if self.directory else ""
+        self._segments.append(_Segment(number, path, first_seq))
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                self._file = open(path, "ab")
+            except Exception as e:
+                print(f"Job log open error: {e}")
+        # Earlier sessions' files make room first; this session's lines go only past its byte budget
+        ours = {s.number for s in self._segments}
+        earlier = sorted(n for n in numbers if n not in ours)
+        for old in earlier[:max(0, len(earlier) + len(self._segments) - self.max_segments)]:
+            self._remove(os.path.join(self.directory, f"downloads-{old:05d}.jsonl"))  # type: ignore[arg-type]
+        while len(self._segments) > 1 and sum(s.size for s in self._segments) > self.max_session_bytes:
+            oldest = self._segments.pop(0)
+            if oldest.path:
+                self._remove(oldest.path)
+
+    def _numbers_on_disk(self) -> List[int]:
+        if not self.directory:
+            return []
+        try:
+            return [int(m.group(1)) for m in map(_SEGMENT_RE.match, os.listdir(self.directory)) if m]
+        except OSError:
+            return []
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        # Caller holds self._lock
+        if self._file is not None:
+            try:
+                self._file.flush()
+                self._flushed = time.monotonic()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except Exception:
+                    pass
+                self._file = None
+
+    # === Reading ===
+    def span(self) -> tuple:
+        """(first seq still on disk, next seq to be written)"""
+        with self._lock:
+            first = self._segments[0].first_seq if self._segments else self._next_seq
+            return first, self._next_seq
+
+    def read(self, seqs: Iterable[int]) -> List[Optional[Dict[str, Any]]]:
+        """The records for `seqs`, in order; None for lines that were rotated away"""
+        with self._lock:
+            self._flush()
+            segments = list(self._segments)
+        starts = [s.first_seq for s in segments]
+        records: List[Optional[Dict[str, Any]]] = []
+        handles: Dict[int, Any] = {}
+        try:
+            for seq in seqs:
+                index = bisect_right(starts, seq) - 1
+                segment = segments[index] if index >= 0 else None
+                if segment is None or seq - segment.first_seq >= len(segment.offsets):
+                    records.append(None)
+                    continue
+                try:
+                    f = handles.get(segment.number)
+                    if f is None:
+                        f = handles[segment.number] = open(segment.path, "rb")
+                    f.seek(segment.offsets[seq - segment.first_seq])
+                    records.append(json.loads(f.readline()))
+                except (OSError, ValueError):
+                    records.append(None)
+        finally:
+            for f in handles.values():
+                f.close()
+        return records
+
+    def query(self, min_level: int = LEVEL_DEBUG, job_id: Optional[int] = None, text: str = "",
+              upto: Optional[int] = None, canceled: Optional[Callable[[], bool]] = None) -> array:
+        """Seqs of the lines (below `upto`) matching every given filter, oldest first.
+
+        Level and job are checked against the in-memory index; only lines that
+        pass those are searched for `text` (case-insensitive) on disk.
+        """
+        needle = text.lower()
+        with self._lock:
+            self._flush()
+            segments = list(self._segments)
+            upto = self._next_seq if upto is None else min(upto, self._next_seq)
+        result = array('q')
+        for segment in segments:
+            count = min(len(segment.offsets), upto - segment.first_seq)
+            if count <= 0:
+                continue
+            levels, jobs, first = segment.levels, segment.jobs, segment.first_seq
+            if not needle:
+                result.extend(first + i for i in range(count)
+                              if levels[i] >= min_level and (job_id is None or jobs[i] == job_id))
+                continue
+            try:
+                with open(segment.path, "rb") as f:
+                    for i in range(count):
+                        line = f.readline()
+                        if i % 4096 == 0 and canceled is not None and canceled():
+                            return result
+                        if levels[i] < min_level or (job_id is not None and jobs[i] != job_id):
+                            continue
+                        decoded = line.decode("utf-8", "replace")
+                        if needle in decoded.lower() and needle in json.loads(decoded)["msg"].lower():
+                            result.append(first + i)
+            except (OSError, ValueError, KeyError):
+                continue  # Rotated away or cut short
+        return result
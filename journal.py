@@ -0,0 +1,179 @@
+import glob, json, os, threading, time
+from typing import Any, Dict, Iterable, List, Optional
+from config import JOURNAL_FILE
+
+COMPACT_RATIO = 4  # Rewrite once the file holds this many lines per unfinished job
+
+class JournalEntry:
+    """Last known state of one journaled job"""
+
+    def __init__(self, key: str, url: str, options: Dict[str, Any], parent: Optional[str] = None):
+        self.key = key
+        self.url = url
+        self.options = options
+        self.parent = parent          # Key of the playlist/channel job that queued it
+        self.state = "queued"
+        self.video_ids: List[str] = []
+        self.partials: List[str] = []  # .part files that a resumed download continues from
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"op": "job", "key": self.key, "url": self.url, "options": self.options,
+                "parent": self.parent, "state": self.state,
+                "video_ids": self.video_ids, "partials": self.partials}
+
+class JobJournal:
+    """Append-only JSON-lines record of queued jobs, kept so a crash or close loses nothing.
+
+    Every change is appended and fsynced. Entries disappear once their job
+    finishes, and the file is rewritten with only the unfinished jobs when it
+    has grown well past them. Safe to share between worker threads.
+    """
+
+    def __init__(self, path: str = JOURNAL_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, JournalEntry]] = None  # Replayed on first use
+        self._file: Optional[Any] = None
+        self._lines = 0
+
+    # === Replay ===
+    def _load(self) -> Dict[str, JournalEntry]:
+        # Caller holds self._lock
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    self._lines += 1
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        continue  # A torn last line from a crash mid-write
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Job journal load error: {e}")
+        return self._entries
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        entries = self._entries
+        op, key = record["op"], record["key"]
+        if op in ("job", "queued"):
+            entry = JournalEntry(key, record["url"], record.get("options") or {}, record.get("parent"))
+            entry.state = record.get("state", "queued")
+            entry.video_ids = list(record.get("video_ids") or [])
+            entry.partials = list(record.get("partials") or [])
+            entries[key] = entry
+        elif key not in entries:
+            return
+        elif op == "state":
+            entries[key].state = record["state"]
+        elif op == "item":
+            entries[key].video_ids.append(record["video_id"])
+        elif op == "file":
+            entries[key].partials.append(record["path"])
+        elif op == "finished":
+            del entries[key]
+
+    # === Writing ===
+    def _append(self, record: Dict[str, Any]) -> None:
+        # Caller holds self._lock
+        self._load()
+        self._apply(record)
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._lines += 1
+        except Exception as e:
+            print(f"Job journal write error: {e}")
+
+    def queued(self, key: str, url: str, options: Dict[str, Any], parent: Optional[str] = None) -> None:
+        with self._lock:
+            self._append({"op": "queued", "key": key, "url": url, "options": options,
+                          "parent": parent, "time": round(time.time(), 3)})
+
+    def state(self, key: str, state: str) -> None:
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is not None and entry.state != state:
+                self._append({"op": "state", "key": key, "state": state})
+
+    def progress(self, key: str, status: Dict[str, Any]) -> None:
+        """yt-dlp progress hook data: records the video ID and partial file once each"""
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is None:
+                return
+            video_id = (status.get('info_dict') or {}).get('id')
+            if video_id and video_id not in entry.video_ids:
+                self._append({"op": "item", "key": key, "video_id": video_id})
+            path = status.get('tmpfilename')
+            if path and status.get('status') == 'downloading':
+                path = os.path.abspath(path)
+                if path not in entry.partials:
+                    self._append({"op": "file", "key": key, "path": path})
+
+    def finished(self, key: str) -> None:
+        with self._lock:
+            if key in self._load():
+                self._append({"op": "finished", "key": key})
+                self._maybe_compact()
+
+    # === Compaction ===
+    def _maybe_compact(self) -> None:
+        # Caller holds self._lock
+        if self._lines > COMPACT_RATIO * max(1, len(self._entries)):
+            self._compact()
+
+    def _compact(self) -> None:
+        try:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if not self._entries:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                self._lines = 0
+                return
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry.to_dict(), ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._lines = len(self._entries)
+        except Exception as e:
+            print(f"Job journal compaction error: {e}")
+
+    # === Restore ===
+    def pending(self) -> List[JournalEntry]:
+        """Jobs that were queued, running or canceled when the journal was last written"""
+        with self._lock:
+            return list(self._load().values())
+
+    def discard(self, entries: Iterable[JournalEntry], remove_partials: bool = False) -> None:
+        """Drop restored or declined entries; optionally delete their partial files"""
+        with self._lock:
+            self._load()
+            for entry in entries:
+                if remove_partials:
+                    remove_partial_files(entry.partials)
+                if entry.key in self._entries:
+                    self._append({"op": "finished", "key": entry.key})
+            self._maybe_compact()
+
+def remove_partial_files(paths: Iterable[str]) -> None:
+    """Delete .part files together with yt-dlp's fragment pieces and resume state"""
+    for path in paths:
+        base = path[:-len(".part")] if path.endswith(".part") else path
+        for leftover in [path, base + ".ytdl"] + glob.glob(glob.escape(path) + "-Frag*"):
+            try:
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            except OSError:
+                pass
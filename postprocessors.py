@@ -0,0 +1,143 @@
+import os
+from typing import Any, Dict, List, Optional, Set
+from yt_dlp.postprocessor import PostProcessor
+from yt_dlp.utils import make_archive_id
+from archive import DownloadArchive
+from fragments import FragmentTuner, MIN_SAMPLE_BYTES, fragment_host
+from progress import format_speed
+
+# yt-dlp postprocessors of the download engine. Kept out of downloader.py so
+# importing the engine does not import yt-dlp; run_job loads this on first use.
+
+def _matches(codec: Optional[str], prefixes: tuple) -> bool:
+    return bool(codec) and codec.lower().startswith(prefixes)  # pyright: ignore[reportOptionalMemberAccess]
+
+class StreamCopyPolicyPP(PostProcessor):
+    """Runs before each item downloads and decides how its streams are merged.
+
+    Streams already in the chosen codec are stream-copied; only mismatching
+    streams are transcoded by the merger.
+    """
+
+    def __init__(self, downloader: Any, video_prefixes: tuple, codec_args: Optional[List[str]],
+                 audio_prefixes: tuple, audio_args: List[str]):
+        super().__init__(downloader)
+        self.video_prefixes = video_prefixes
+        self.codec_args = codec_args or []
+        self.audio_prefixes = audio_prefixes
+        self.audio_args = audio_args
+
+    def run(self, info):
+        formats = info.get('requested_formats') or [info]
+        vcodec = next((f.get('vcodec') for f in formats if f.get('vcodec') not in (None, 'none')), None)
+        acodec = next((f.get('acodec') for f in formats if f.get('acodec') not in (None, 'none')), None)
+
+        merge_args = []
+        if vcodec and not _matches(vcodec, self.video_prefixes):
+            merge_args += self.codec_args
+        if acodec and not _matches(acodec, self.audio_prefixes):
+            merge_args += self.audio_args
+        self._downloader.params['postprocessor_args'] = {'merger+ffmpeg': merge_args}
+
+        if not info.get('requested_formats'):
+            pass  # Single-file download: nothing is merged
+        elif not merge_args:
+            self.to_screen(f'Source is {vcodec}/{acodec}; remuxing without re-encoding')
+        else:
+            self.to_screen(f'Source is {vcodec}/{acodec}; transcoding mismatching streams')
+        return [], info
+
+class ArchiveRecorderPP(PostProcessor):
+    """Records each finished item in the download archive once its file is in place.
+
+    Only files this job wrote are recorded. When yt-dlp finds the output
+    already on disk (its "has already been downloaded" path) the file may be
+    another codec's output, so it is left unrecorded; streams the stream cache
+    placed there for this job still count as written by it.
+    """
+
+    def __init__(self, downloader: Any, archive: DownloadArchive, codec_choice: str, res_choice: str):
+        super().__init__(downloader)
+        self.archive = archive
+        self.codec_choice = codec_choice
+        self.res_choice = res_choice
+        self.reused: Set[str] = set()   # Complete files yt-dlp found instead of writing them
+        self.placed: Set[str] = set()   # Files restored from the stream cache for this job
+        report = downloader.report_file_already_downloaded
+
+        def report_reused(file_name):
+            self.reused.add(os.path.abspath(file_name))
+            return report(file_name)
+        downloader.report_file_already_downloaded = report_reused
+
+    def mark_placed(self, path: str) -> None:
+        self.placed.add(os.path.abspath(path))
+
+    def run(self, info):
+        extractor = info.get('extractor_key') or info.get('ie_key')
+        filepath = info.get('filepath')
+        if filepath and os.path.abspath(filepath) in self.reused - self.placed:
+            self.to_screen(f'{filepath} was already on disk; not recording it in the archive')
+            return [], info
+        if extractor and info.get('id') and filepath:
+            self.archive.record(make_archive_id(extractor, info['id']), self.codec_choice,
+                                self.res_choice, filepath, info.get('title'))
+        return [], info
+
+class FragmentTuningPP(PostProcessor):
+    """Sets the parallel fragment count for each stream from the host's tuned level.
+
+    Runs before each item downloads; its progress hook measures every finished
+    DASH/HLS stream and lets the tuner pick the level for the next one.
+    """
+
+    def __init__(self, downloader: Any, tuner: FragmentTuner):
+        super().__init__(downloader)
+        self.tuner = tuner
+        self._started: Dict[str, int] = {}  # filename -> level used for that stream
+
+    @staticmethod
+    def _stream_url(info: Dict[str, Any]) -> Optional[str]:
+        return info.get('fragment_base_url') or info.get('url') or info.get('manifest_url')
+
+    def run(self, info):
+        formats = info.get('requested_formats') or [info]
+        host = next((fragment_host(self._stream_url(f)) for f in formats if self._stream_url(f)), None)
+        self._downloader.params['concurrent_fragment_downloads'] = self.tuner.level(host)
+        return [], info
+
+    def progress_hook(self, status: Dict[str, Any]) -> None:
+        info = status.get('info_dict') or {}
+        if not info.get('fragments') and not str(info.get('protocol', '')).startswith(('m3u8', 'http_dash')):
+            return  # Single-request download: fragment concurrency does not apply
+        filename = status.get('filename') or ""
+        params = self._downloader.params
+        if status.get('status') == 'downloading':
+            self._started.setdefault(filename, params.get('concurrent_fragment_downloads', 1))
+            return
+        level = self._started.pop(filename, None)
+        size = status.get('total_bytes') or status.get('downloaded_bytes') or 0
+        elapsed = status.get('elapsed') or 0
+        if status.get('status') != 'finished' or level is None or size < MIN_SAMPLE_BYTES or elapsed <= 0:
+            return
+        host = fragment_host(self._stream_url(info))
+        next_level = self.tuner.record(host, level, size / elapsed)
+        if next_level != level:
+            self.to_screen(f'{host}: {format_speed(size / elapsed)} with {level} parallel fragments; '
+                           f'trying {next_level} next')
+        params['concurrent_fragment_downloads'] = next_level
+
+class TimingMarkerPP(PostProcessor):
+    """Calls `on_run(info)` when yt-dlp reaches the stage it is registered for.
+
+    Marks points in an item's processing that no hook reports, such as the
+    start of format selection ('after_filter').
+    """
+
+    def __init__(self, downloader: Any, on_run: Any):
+        super().__init__(downloader)
+        self.on_run = on_run
+
+    def run(self, info):
+        self.on_run(info)
+        return [], info
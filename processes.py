@@ -0,0 +1,165 @@
+import os, signal, subprocess, threading, time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# === Child process registry ===
+TERMINATE_GRACE = 0.5  # Seconds a terminated process gets to exit before it is killed
+REAP_TIMEOUT = 2.0     # Longest wait for a killed process to be reaped
+
+def _output_path(args: Any) -> Optional[str]:
+    """The file an ffmpeg command line writes to, i.e. its last argument"""
+    if not isinstance(args, (list, tuple)) or len(args) < 2:
+        return None
+    if not os.path.basename(str(args[0])).lower().startswith(("ffmpeg", "avconv")):
+        return None
+    path = str(args[-1])
+    if path.startswith("file:"):
+        path = path[len("file:"):]
+    return None if path == "-" or "://" in path else path
+
+class _Child:
+    def __init__(self, proc: Any, output: Optional[str]):
+        self.proc = proc
+        self.output = output
+        self.signaled = False
+
+class ProcessRegistry:
+    """Child processes started by yt-dlp on behalf of each job.
+
+    A worker thread is bound to a job with `track`; every process yt-dlp
+    starts from that thread (ffmpeg merges, encodes, audio extraction,
+    external downloaders) is registered under the job and put in a process
+    group of its own. `kill` terminates a job's groups, kills whatever
+    is still alive TERMINATE_GRACE later and deletes the output files the
+    killed processes were writing. A process started after its job was
+    canceled is stopped straight away. Thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._children: Dict[Any, List[_Child]] = {}
+        self._cancel_events: Dict[Any, threading.Event] = {}
+
+    @contextmanager
+    def track(self, key: Any, cancel_event: Optional[threading.Event] = None) -> Iterator[None]:
+        """Register processes started by this thread under `key` for the duration of the block"""
+        previous = getattr(self._local, "key", None)
+        self._local.key = key
+        with self._lock:
+            self._children.setdefault(key, [])
+            if cancel_event is not None:
+                self._cancel_events[key] = cancel_event
+        try:
+            yield
+        finally:
+            self._local.key = previous
+            with self._lock:
+                children = self._children.pop(key, [])
+                self._cancel_events.pop(key, None)
+            # Nothing a finished job started may outlive it
+            self._stop([child for child in children if child.proc.poll() is None])
+
+    def current(self) -> Any:
+        return getattr(self._local, "key", None)
+
+    def register(self, key: Any, proc: Any, args: Any = None) -> None:
+        child = _Child(proc, _output_path(args))
+        with self._lock:
+            children = self._children.get(key)
+            if children is None:
+                return
+            children[:] = [c for c in children if c.proc.poll() is None] + [child]
+            event = self._cancel_events.get(key)
+        if event is not None and event.is_set():
+            self._stop([child])
+
+    def active(self, key: Any = None) -> int:
+        """Live child processes of one job, or of every job"""
+        with self._lock:
+            groups = [self._children.get(key, [])] if key is not None else list(self._children.values())
+            return sum(1 for children in groups for child in children if child.proc.poll() is None)
+
+    def processes(self, key: Any) -> List[Any]:
+        """The Popen objects registered under a job, live or not"""
+        with self._lock:
+            return [child.proc for child in self._children.get(key, [])]
+
+    # === Stopping ===
+    def kill(self, key: Any) -> int:
+        """Stop every live process of a job; returns how many were signaled. Does not block."""
+        with self._lock:
+            children = [child for child in self._children.get(key, []) if child.proc.poll() is None]
+        self._stop(children)
+        return len(children)
+
+    def kill_all(self) -> int:
+        with self._lock:
+            keys = list(self._children)
+        return sum(self.kill(key) for key in keys)
+
+    def _stop(self, children: List[_Child]) -> None:
+        children = [child for child in children if not child.signaled]
+        if not children:
+            return
+        for child in children:
+            child.signaled = True
+            _signal_group(child.proc, force=False)
+        # Escalate and clean up off the caller's thread, so a cancel from the UI returns at once
+        reaper = threading.Thread(target=self._reap, args=(children,), daemon=True)
+        reaper.start()
+
+    def _reap(self, children: List[_Child]) -> None:
+        deadline = time.monotonic() + TERMINATE_GRACE
+        for child in children:
+            try:
+                child.proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                _signal_group(child.proc, force=True)
+                try:
+                    child.proc.wait(timeout=REAP_TIMEOUT)
+                except subprocess.TimeoutExpired:
+                    print(f"Process {child.proc.pid} did not exit after being killed")
+                    continue
+            # A process that finished on its own wrote a complete file
+            if child.proc.returncode != 0 and child.output:
+                try:
+                    os.remove(child.output)
+                except OSError:
+                    pass
+
+def _signal_group(proc: Any, force: bool) -> None:
+    try:
+        if os.name == "nt":
+            proc.kill()  # TerminateProcess; ffmpeg starts no children of its own
+        else:
+            os.killpg(proc.pid, signal.SIGKILL if force else signal.SIGTERM)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+def new_group_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Popen arguments that start the child in a process group of its own"""
+    if os.name == "nt":
+        kwargs["creationflags"] = kwargs.get("creationflags", 0) | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs.setdefault("start_new_session", True)
+    return kwargs
+
+def install_popen_hook(registry: ProcessRegistry) -> None:
+    """Route yt-dlp's child processes through `registry`; only threads inside `track` are affected"""
+    from yt_dlp.utils import _utils
+    popen = _utils.Popen
+    if getattr(popen, "_registry_hook", None) is not None:
+        return
+    original_init = popen.__init__
+
+    def __init__(self, args, *remaining, **kwargs):
+        key = registry.current()
+        if key is not None:
+            kwargs = new_group_kwargs(kwargs)
+        original_init(self, args, *remaining, **kwargs)
+        if key is not None:
+            registry.register(key, self, args)
+
+    popen.__init__ = __init__
+    popen._registry_hook = registry
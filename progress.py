@@ -0,0 +1,183 @@
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional
+
+# === Phases ===
+PHASE_QUEUED = "queued"
+PHASE_EXPAND = "expand"          # Listing the videos of a playlist/channel
+PHASE_PREPARE = "prepare"
+PHASE_DOWNLOAD = "download"
+PHASE_STAGED = "staged"          # Sources downloaded, waiting for an encode slot
+PHASE_POST = "post"
+PHASE_DONE = "done"
+PHASE_FAILED = "failed"
+PHASE_CANCELED = "canceled"
+FINAL_PHASES = (PHASE_DONE, PHASE_FAILED, PHASE_CANCELED)
+
+# Share of an item's progress taken by the download; the rest is post-processing
+DOWNLOAD_SHARE = 0.9
+
+# Postprocessors that do not represent real work on the downloaded file
+_PRE_DOWNLOAD_PPS = ("StreamCopyPolicy", "FragmentTuning")
+_BOOKKEEPING_PPS = _PRE_DOWNLOAD_PPS + ("MoveFiles", "ArchiveRecorder", "TimingMarker")
+
+@dataclass
+class JobProgress:
+    """Progress of one job, built from yt-dlp hooks rather than log text"""
+    job_id: int
+    phase: str = PHASE_QUEUED
+    item_index: int = 1                    # 1-based item within a playlist/channel job
+    item_count: int = 1
+    items_done: int = 0
+    stream_index: int = 0                  # stream of the current item (video, audio, ...)
+    stream_count: int = 1
+    downloaded_bytes: int = 0
+    total_bytes: Optional[int] = None
+    speed: Optional[float] = None          # bytes per second
+    eta: Optional[float] = None            # seconds
+    fragment_index: Optional[int] = None
+    fragment_count: Optional[int] = None
+    postprocessor: Optional[str] = None
+    title: Optional[str] = None
+    allocated_rate: Optional[float] = None # bytes per second granted by the bandwidth cap; None if uncapped
+
+    @property
+    def stream_fraction(self) -> float:
+        if self.total_bytes:
+            return min(1.0, self.downloaded_bytes / self.total_bytes)
+        if self.fragment_index and self.fragment_count:
+            return min(1.0, self.fragment_index / self.fragment_count)
+        return 0.0
+
+    @property
+    def item_fraction(self) -> float:
+        if self.phase in (PHASE_STAGED, PHASE_POST):
+            return DOWNLOAD_SHARE
+        if self.phase != PHASE_DOWNLOAD:
+            return 0.0
+        streams = max(1, self.stream_count)
+        return DOWNLOAD_SHARE * min(1.0, (self.stream_index + self.stream_fraction) / streams)
+
+    @property
+    def fraction(self) -> float:
+        """Overall completion of the job in [0, 1]"""
+        if self.phase in FINAL_PHASES:
+            return 1.0
+        count = max(1, self.item_count, self.items_done)
+        return min(1.0, (self.items_done + self.item_fraction) / count)
+
+class ProgressTracker:
+    """Turns yt-dlp progress/postprocessor hook calls into JobProgress updates.
+
+    `on_update` receives a snapshot after every change and is called from the
+    worker thread running the job.
+    """
+
+    def __init__(self, job_id: int, on_update: Optional[Callable[[JobProgress], None]] = None):
+        self.progress = JobProgress(job_id)
+        self.on_update = on_update
+        self._item_key: Optional[Any] = None
+        self._format_ids: List[Any] = []
+
+    def snapshot(self) -> JobProgress:
+        return replace(self.progress)
+
+    def set_phase(self, phase: str) -> None:
+        self.progress.phase = phase
+        if phase in FINAL_PHASES:
+            self.progress.speed = None
+            self.progress.eta = None
+        self._emit()
+
+    def set_discovered(self, discovered: int, estimate: Optional[int]) -> None:
+        """Expansion jobs report videos found so far and the expected total (if known)"""
+        progress = self.progress
+        progress.phase = PHASE_EXPAND
+        progress.items_done = discovered
+        progress.item_count = max(discovered, estimate or 0)
+        self._emit()
+
+    def _emit(self) -> None:
+        if self.on_update:
+            self.on_update(self.snapshot())
+
+    def _enter_item(self, info: Dict[str, Any]) -> None:
+        """Reset per-item counters when yt-dlp moves on to another entry"""
+        progress = self.progress
+        key = info.get('id') or info.get('playlist_index')
+        count = info.get('n_entries') or info.get('playlist_count')
+        if count:
+            progress.item_count = int(count)
+        if key == self._item_key:
+            return
+        self._item_key = key
+        if info.get('playlist_index'):
+            progress.item_index = int(info['playlist_index'])
+        else:
+            progress.item_index = progress.items_done + 1
+        progress.title = info.get('title')
+        # Only the pre-download hooks see requested_formats; per-stream downloads do not
+        self._format_ids = [f.get('format_id') for f in info.get('requested_formats') or ()]
+        progress.stream_index = 0
+        progress.stream_count = max(1, len(self._format_ids))
+        progress.downloaded_bytes = 0
+        progress.total_bytes = None
+        progress.fragment_index = progress.fragment_count = None
+
+    def download_hook(self, status: Dict[str, Any]) -> None:
+        """yt-dlp `progress_hooks` entry"""
+        info = status.get('info_dict') or {}
+        self._enter_item(info)
+        progress = self.progress
+
+        if info.get('format_id') in self._format_ids:
+            progress.stream_index = self._format_ids.index(info.get('format_id'))
+
+        progress.phase = PHASE_DOWNLOAD
+        progress.postprocessor = None
+        progress.downloaded_bytes = status.get('downloaded_bytes') or 0
+        progress.total_bytes = status.get('total_bytes') or status.get('total_bytes_estimate')
+        progress.speed = status.get('speed')
+        progress.eta = status.get('eta')
+        progress.fragment_index = status.get('fragment_index')
+        progress.fragment_count = status.get('fragment_count')
+        if status.get('status') == 'finished':
+            progress.total_bytes = progress.total_bytes or progress.downloaded_bytes
+            progress.downloaded_bytes = progress.total_bytes or 0
+            progress.speed = progress.eta = None
+        self._emit()
+
+    def postprocessor_hook(self, status: Dict[str, Any]) -> None:
+        """yt-dlp `postprocessor_hooks` entry"""
+        name = status.get('postprocessor')
+        progress = self.progress
+        if name == "MoveFiles" and status.get('status') == 'finished':
+            # MoveFiles is the last step for every item
+            progress.items_done += 1
+            progress.phase = PHASE_PREPARE
+            progress.postprocessor = None
+            progress.speed = progress.eta = None
+            self._item_key = None
+        elif status.get('status') == 'started':
+            if name in _PRE_DOWNLOAD_PPS:
+                # The first hook that sees the item's requested formats
+                self._enter_item(status.get('info_dict') or {})
+                return
+            if name in _BOOKKEEPING_PPS:
+                return
+            self._enter_item(status.get('info_dict') or {})
+            progress.phase = PHASE_POST
+            progress.postprocessor = name
+            progress.speed = progress.eta = None
+        else:
+            return
+        self._emit()
+
+def format_speed(speed: Optional[float]) -> str:
+    """Bytes per second as a short human-readable string"""
+    if not speed:
+        return ""
+    for unit in ("B/s", "KiB/s", "MiB/s", "GiB/s"):
+        if speed < 1024 or unit == "GiB/s":
+            return f"{speed:.1f}{unit}"
+        speed /= 1024
+    return ""
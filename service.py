@@ -0,0 +1,581 @@
+"""Long-running download service (daemon) with an HTTP/JSON job API.
+
+    python -m service [--port 8711 | --socket PATH] [--jobs 3] [--output-dir DIR] [--limit-rate 2M]
+                     [--schedule 09:00-18:00=1M] [--goal fastest:0.95] [--stream-cache 4G]
+                     [--metrics-port 9464] [--resume]
+
+Endpoints (JSON in and out):
+
+    GET  /health                  engine status and job counts
+    POST /jobs                    {"urls": [...], "codec": "libx264", "resolution": "1080p",
+                                   "priority": "normal", "fragments": "auto",
+                                   "output_dir": "sub/dir"} -> queued jobs;
+                                  links are canonicalized, repeats and links already queued
+                                  are counted instead of queued, bad lines come back as "invalid";
+                                  output_dir must lie inside the service's --output-dir
+    GET  /jobs[?state=running]    every job the service knows about
+    GET  /jobs/ID                 one job with its progress
+    POST /jobs/ID/cancel          cancel one job
+    POST /jobs/ID/priority        {"priority": "high"}
+    POST /cancel                  cancel every job
+    GET  /events[?job=ID]         Server-Sent Events; each data line is a JSON record in the
+                                  format `python -m cli` prints (progress, job, log, ...)
+
+The service listens on 127.0.0.1 or on a Unix socket (mode 0600) only. POST
+bodies must be sent as application/json, so a web page cannot submit jobs, and
+over TCP the Host header must name 127.0.0.1 or localhost with the service's
+port, so a page on a rebound DNS name cannot read the API either.
+`python ui.py --attach [ADDRESS]` runs the window against a running service.
+"""
+import argparse, http.client, json, os, socket, socketserver, sys, threading, time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, urlsplit
+from config import DOWNLOAD_DIR, get_ffmpeg_path
+from downloader import (DownloadJob, DownloadOptions, download_manager,
+                        resolve_codec_name, resolve_resolution, parse_fragments, resumable_batches,
+                        configure_bandwidth, configure_encoder_goal, configure_stream_cache,
+                        get_telemetry, get_job_log, DEFAULT_CONCURRENCY, DEFAULT_ENCODE_WORKERS,
+                        JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED, JOB_CANCELED, FINISHED_STATES)
+from bandwidth import PRIORITY_WEIGHTS, DEFAULT_PRIORITY, parse_rate, parse_schedule
+from calibration import parse_goal
+from streamcache import parse_size
+from cli import JsonLinesReporter
+from ingest import collect
+
+DEFAULT_PORT = 8711
+DEFAULT_ADDRESS = f"http://127.0.0.1:{DEFAULT_PORT}"
+EVENT_BACKLOG = 2000     # Events buffered per subscriber; a client that falls further behind loses the oldest
+KEEPALIVE_SECONDS = 15   # Comment lines keep idle event streams (and proxies) open
+MAX_FINISHED_JOBS = 1000 # Finished jobs still listed by /jobs
+MAX_BODY_BYTES = 8 * 1024 * 1024
+SHUTDOWN_TIMEOUT = 10.0  # Seconds canceled jobs get to wind down on exit
+
+class ServiceError(Exception):
+    """An API call failed; `status` is the HTTP status (0 when the service could not be reached)"""
+
+    def __init__(self, message: str, status: int = 0):
+        super().__init__(message)
+        self.status = status
+
+# === Event fan-out ===
+class _Subscriber:
+    def __init__(self, job_id: Optional[int]):
+        self.job_id = job_id
+        self.events: deque = deque(maxlen=EVENT_BACKLOG)
+        self.dropped = 0
+
+class EventHub:
+    """File-like sink for JsonLinesReporter that hands every line to each event stream client"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._subscribers: List[_Subscriber] = []
+
+    def write(self, line: str) -> None:
+        line = line.strip()
+        if not line:
+            return
+        try:
+            job_id = json.loads(line).get("job")
+        except ValueError:
+            return
+        with self._cond:
+            for sub in self._subscribers:
+                if sub.job_id is None or sub.job_id == job_id:
+                    if len(sub.events) == sub.events.maxlen:
+                        sub.dropped += 1
+                    sub.events.append(line)
+            self._cond.notify_all()
+
+    def flush(self) -> None:
+        pass
+
+    def subscribe(self, job_id: Optional[int] = None) -> _Subscriber:
+        sub = _Subscriber(job_id)
+        with self._cond:
+            self._subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: _Subscriber) -> None:
+        with self._cond:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+            self._cond.notify_all()
+
+    def next_events(self, sub: _Subscriber, timeout: float) -> List[str]:
+        """Everything queued for `sub`, waiting up to `timeout` for the first event"""
+        with self._cond:
+            if not sub.events:
+                self._cond.wait(timeout)
+            events = list(sub.events)
+            sub.events.clear()
+            return events
+
+# === Engine side ===
+def job_dict(job: DownloadJob) -> Dict[str, Any]:
+    progress = job.progress
+    return {"id": job.id, "url": job.url, "state": job.state, "error": job.error,
+            "priority": job.priority, "playlist": job.expands, "options": job.options.to_dict(),
+            "progress": {"phase": progress.phase, "fraction": round(progress.fraction, 4),
+                         "title": progress.title, "item": progress.item_index, "items": progress.item_count,
+                         "downloaded_bytes": progress.downloaded_bytes, "total_bytes": progress.total_bytes,
+                         "speed": progress.speed, "eta": progress.eta,
+                         "postprocessor": progress.postprocessor}}
+
+class DownloadService:
+    """The download engine behind the HTTP API: the jobs it was given and their event stream"""
+
+    def __init__(self, output_dir: str = DOWNLOAD_DIR, manager: Any = download_manager):
+        self.output_dir = output_dir
+        self.manager = manager
+        self.hub = EventHub()
+        self.reporter = JsonLinesReporter(self.hub)  # type: ignore[arg-type]
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._jobs: Dict[int, DownloadJob] = {}
+        self._finished: "OrderedDict[int, None]" = OrderedDict()  # Ids of finished jobs, oldest first
+        get_job_log().add_listener(self._on_log)
+
+    def _on_log(self, record: Dict[str, Any]) -> None:
+        self.reporter.emit("log", job=record["job"], seq=record["seq"], level=record["level"], msg=record["msg"])
+
+    def _on_queued(self, job: DownloadJob) -> None:
+        # Playlist entries too, as they are discovered, so they can be listed and canceled while queued
+        with self._lock:
+            self._jobs[job.id] = job
+        self.reporter.emit("queued", job=job.id, url=job.url, options=job.options.to_dict())
+
+    def _on_progress(self, job: DownloadJob, progress: Any) -> None:
+        if progress.phase in FINISHED_STATES:
+            self._retire(job)
+        self.reporter.on_progress(job, progress)
+
+    def _retire(self, job: DownloadJob) -> None:
+        """Keep the newest MAX_FINISHED_JOBS finished jobs listed"""
+        with self._lock:
+            if job.id in self._finished or job.id not in self._jobs:
+                return
+            self._finished[job.id] = None
+            while len(self._finished) > MAX_FINISHED_JOBS:
+                old, _ = self._finished.popitem(last=False)
+                self._jobs.pop(old, None)
+
+    # === API operations ===
+    def submit(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        urls = request.get("urls")
+        if isinstance(urls, str):
+            urls = urls.splitlines()
+        if not isinstance(urls, list) or not urls:
+            raise ServiceError("'urls' must be a non-empty list", 400)
+        codec = resolve_codec_name(str(request.get("codec") or "libx264"))
+        if codec is None:
+            raise ServiceError(f"unknown codec: {request.get('codec')}", 400)
+        resolution = resolve_resolution(str(request.get("resolution") or "1080p"))
+        if resolution is None:
+            raise ServiceError(f"unknown resolution: {request.get('resolution')}", 400)
+        priority = request.get("priority") or DEFAULT_PRIORITY
+        if priority not in PRIORITY_WEIGHTS:
+            raise ServiceError(f"unknown priority: {priority}", 400)
+        try:
+            fragments = parse_fragments(request.get("fragments"))
+        except (TypeError, ValueError):
+            raise ServiceError(f"invalid fragment count: {request.get('fragments')}", 400)
+
+        # Never read files named in a request: the lines of a list would come back as "invalid"
+        ingest = collect([str(url) for url in urls], self.manager.queued_keys())
+        options = DownloadOptions(codec, resolution, self._output_dir(request.get("output_dir")),
+                                  use_archive=not request.get("no_archive"),
+                                  verify_archive=bool(request.get("verify_archive")),
+                                  fragments=fragments, priority=priority)
+        jobs: List[DownloadJob] = []
+        if ingest.urls:
+            jobs = self._submit(ingest.urls, options)
+        return {"jobs": [job_dict(job) for job in jobs], "invalid": ingest.invalid,
+                "duplicates": ingest.duplicates, "already_queued": ingest.already_queued}
+
+    def _output_dir(self, requested: Any) -> str:
+        """The service's output directory, or a directory inside it that a request asked for"""
+        if not requested:
+            return self.output_dir
+        base = os.path.realpath(self.output_dir)
+        path = os.path.realpath(os.path.join(base, str(requested)))
+        try:
+            inside = os.path.commonpath([base, path]) == base
+        except ValueError:  # Another drive
+            inside = False
+        if not inside:
+            raise ServiceError(f"output_dir must be inside {self.output_dir}", 400)
+        return path
+
+    def _submit(self, urls: List[str], options: DownloadOptions) -> List[DownloadJob]:
+        batch = self.manager.submit(urls, options, None, on_progress=self._on_progress,
+                                    on_queued=self._on_queued)
+        return list(batch.jobs)
+
+    def resume_unfinished(self) -> int:
+        """Queue the jobs an earlier run left unfinished; returns how many"""
+        journal = self.manager.journal
+        unfinished = journal.pending() if journal else []
+        for options, urls in resumable_batches(unfinished):
+            self._submit(urls, options)
+        if unfinished:
+            journal.discard(unfinished)  # Resubmitted under new journal entries
+        return len(unfinished)
+
+    def jobs(self, state: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job_dict(job) for job in jobs if state is None or job.state == state]
+
+    def job(self, job_id: int) -> Dict[str, Any]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise ServiceError(f"no job {job_id}", 404)
+        return job_dict(job)
+
+    def cancel(self, job_id: Optional[int] = None) -> Dict[str, Any]:
+        if job_id is None:
+            self.manager.cancel_all()
+            return {"canceled": True}
+        self.job(job_id)
+        return {"canceled": self.manager.cancel(job_id)}
+
+    def set_priority(self, job_id: int, priority: Any) -> Dict[str, Any]:
+        if priority not in PRIORITY_WEIGHTS:
+            raise ServiceError(f"unknown priority: {priority}", 400)
+        self.job(job_id)
+        return {"updated": self.manager.set_priority(job_id, priority)}
+
+    def wait_finished(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if all(job.finished for job in self._jobs.values()):
+                    return True
+            time.sleep(0.1)
+        return False
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        states = (JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED, JOB_CANCELED)
+        return {"ok": True, "pid": os.getpid(), "uptime": round(time.time() - self.started, 1),
+                "busy": self.manager.is_busy(), "ffmpeg": bool(get_ffmpeg_path()),
+                "jobs": {state: sum(1 for job in jobs if job.state == state) for state in states}}
+
+# === HTTP front ===
+class _Handler(BaseHTTPRequestHandler):
+    service: "DownloadService"  # Set on the per-server subclass
+    allowed_hosts: Optional[frozenset] = None  # Host headers accepted over TCP; None on a Unix socket
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def address_string(self) -> str:
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def _send_json(self, status: int, data: Any) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method: str) -> None:
+        # DNS rebinding: a web page on evil.example resolved to 127.0.0.1 still sends its own name
+        if self.allowed_hosts is not None and (self.headers.get("Host") or "").lower() not in self.allowed_hosts:
+            self._send_json(403, {"error": "requests must be addressed to 127.0.0.1 or localhost"})
+            return
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = parse_qs(url.query)
+        try:
+            if method == "GET" and parts == ["events"]:
+                self._stream_events(_int(query.get("job", [None])[0]))
+                return
+            self._send_json(200 if not (method == "POST" and parts == ["jobs"]) else 201,
+                            self._dispatch(method, parts, query))
+        except ServiceError as e:
+            self._send_json(e.status or 500, {"error": str(e)})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            print(f"Service request error: {e}", file=sys.stderr)
+            self._send_json(500, {"error": str(e)})
+
+    def _dispatch(self, method: str, parts: List[str], query: Dict[str, List[str]]) -> Any:
+        service = self.service
+        if method == "GET":
+            if parts == ["health"] or not parts:
+                return service.health()
+            if parts == ["jobs"]:
+                return {"jobs": service.jobs(query.get("state", [None])[0])}
+            if len(parts) == 2 and parts[0] == "jobs":
+                return service.job(_job_id(parts[1]))
+        elif method == "POST":
+            body = self._read_json()
+            if parts == ["jobs"]:
+                return service.submit(body)
+            if parts == ["cancel"]:
+                return service.cancel()
+            if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+                return service.cancel(_job_id(parts[1]))
+            if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "priority":
+                return service.set_priority(_job_id(parts[1]), body.get("priority"))
+        elif method == "DELETE" and len(parts) == 2 and parts[0] == "jobs":
+            return service.cancel(_job_id(parts[1]))
+        raise ServiceError(f"no such endpoint: {method} /{'/'.join(parts)}", 404)
+
+    def _read_json(self) -> Dict[str, Any]:
+        # Browsers cannot send this content type cross-origin without a preflight we never answer
+        if self.headers.get("Content-Type", "").split(";")[0].strip() != "application/json":
+            raise ServiceError("request body must be application/json", 415)
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ServiceError("request body too large", 413)
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise ServiceError("request body is not valid JSON", 400)
+        if not isinstance(data, dict):
+            raise ServiceError("request body must be a JSON object", 400)
+        return data
+
+    def _stream_events(self, job_id: Optional[int]) -> None:
+        hub = self.service.hub
+        sub = hub.subscribe(job_id)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(b": connected\n\n")
+            self.wfile.flush()
+            while True:
+                events = hub.next_events(sub, KEEPALIVE_SECONDS)
+                chunk = "".join(f"data: {line}\n\n" for line in events) if events else ": keepalive\n\n"
+                self.wfile.write(chunk.encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+        finally:
+            hub.unsubscribe(sub)
+
+    def do_GET(self) -> None:
+        self._route("GET")
+
+    def do_POST(self) -> None:
+        self._route("POST")
+
+    def do_DELETE(self) -> None:
+        self._route("DELETE")
+
+def _int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        raise ServiceError(f"not a number: {value}", 400)
+
+def _job_id(value: str) -> int:
+    return _int(value)  # type: ignore[return-value]
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(service: DownloadService, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+          socket_path: Optional[str] = None) -> socketserver.BaseServer:
+    """Start serving the API on a background thread; returns the server"""
+    handler = type("Handler", (_Handler,), {"service": service})
+    server: socketserver.BaseServer
+    if socket_path:
+        if os.path.exists(socket_path):
+            if _socket_alive(socket_path):
+                raise OSError(f"a service is already listening on {socket_path}")
+            os.remove(socket_path)  # Left behind by a service that did not shut down
+        server = _UnixServer(socket_path, handler)
+        os.chmod(socket_path, 0o600)
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        port = server.server_address[1]
+        names = ("127.0.0.1", "localhost")
+        handler.allowed_hosts = frozenset([f"{name}:{port}" for name in names]
+                                          + (list(names) if port == 80 else []))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def _socket_alive(path: str) -> bool:
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+# === Client ===
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class ServiceClient:
+    """Talks to a running service: 'http://127.0.0.1:8711', '127.0.0.1:8711' or 'unix:/path/to.sock'"""
+
+    def __init__(self, address: Optional[str] = None):
+        self.address = address or DEFAULT_ADDRESS
+        if self.address.startswith("unix:"):
+            self.socket_path: Optional[str] = self.address[len("unix:"):]
+            self.host, self.port = "localhost", 0
+        else:
+            parsed = urlsplit(self.address if "://" in self.address else "http://" + self.address)
+            self.socket_path = None
+            self.host, self.port = parsed.hostname or "127.0.0.1", parsed.port or DEFAULT_PORT
+
+    def _connection(self, timeout: Optional[float]) -> http.client.HTTPConnection:
+        if self.socket_path:
+            return _UnixHTTPConnection(self.socket_path, timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None,
+                timeout: float = 10.0) -> Any:
+        conn = self._connection(timeout)
+        try:
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+            response = conn.getresponse()
+            data = json.loads(response.read() or b"null")
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            raise ServiceError(f"service at {self.address} not reachable: {e}")
+        finally:
+            conn.close()
+        if response.status >= 400:
+            raise ServiceError((data or {}).get("error") or f"HTTP {response.status}", response.status)
+        return data
+
+    def wait_finished(self, timeout: float, interval: float = 0.5) -> bool:
+        """Poll /jobs until every job the service lists has finished; False on timeout"""
+        deadline = time.monotonic() + timeout
+        while True:
+            if all(job["state"] in FINISHED_STATES for job in self.jobs()):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+
+    def health(self) -> Dict[str, Any]:
+        return self.request("GET", "/health", timeout=2.0)
+
+    def submit(self, urls: List[str], codec: str, resolution: str, **extra: Any) -> Dict[str, Any]:
+        return self.request("POST", "/jobs", {"urls": urls, "codec": codec, "resolution": resolution, **extra})
+
+    def jobs(self, state: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.request("GET", "/jobs" + (f"?state={state}" if state else ""))["jobs"]
+
+    def job(self, job_id: int) -> Dict[str, Any]:
+        return self.request("GET", f"/jobs/{job_id}")
+
+    def cancel(self, job_id: Optional[int] = None) -> bool:
+        path = "/cancel" if job_id is None else f"/jobs/{job_id}/cancel"
+        return bool(self.request("POST", path, {}).get("canceled"))
+
+    def events(self, job_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yield event records until the connection drops (raises ServiceError)"""
+        conn = self._connection(KEEPALIVE_SECONDS * 2)
+        try:
+            conn.request("GET", "/events" + (f"?job={job_id}" if job_id is not None else ""))
+            response = conn.getresponse()
+            if response.status != 200:
+                raise ServiceError(f"HTTP {response.status}", response.status)
+            while True:
+                line = response.readline()
+                if not line:
+                    raise ServiceError("event stream closed")
+                if line.startswith(b"data: "):
+                    yield json.loads(line[len(b"data: "):])
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            raise ServiceError(f"event stream from {self.address} lost: {e}")
+        finally:
+            conn.close()
+
+# === Entry point ===
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m service",
+                                     description="Run the download engine as a local service with a JSON API.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port on 127.0.0.1")
+    parser.add_argument("--socket", metavar="PATH", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("-o", "--output-dir", default=DOWNLOAD_DIR, help="default directory for finished files")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_CONCURRENCY, help="simultaneous downloads")
+    parser.add_argument("-e", "--encode-jobs", type=int, default=DEFAULT_ENCODE_WORKERS,
+                        help="simultaneous transcodes")
+    parser.add_argument("--limit-rate", metavar="RATE", help="total download rate of all jobs, e.g. 2M")
+    parser.add_argument("--schedule", action="append", default=[], metavar="HH:MM-HH:MM=RATE",
+                        help="different total rate during a time of day (repeatable)")
+    parser.add_argument("--goal", metavar="GOAL", help="encoder goal, e.g. fastest:0.95 (see python -m calibration)")
+    parser.add_argument("--stream-cache", metavar="SIZE", help="disk budget for cached source streams, e.g. 4G")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT", help="serve Prometheus metrics on this port")
+    parser.add_argument("--resume", action="store_true", help="resume downloads left unfinished by an earlier run")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        parse_rate(args.limit_rate)
+        parse_schedule(args.schedule)
+        parse_goal(args.goal)
+        parse_size(args.stream_cache)
+    except ValueError as e:
+        parser.error(str(e))
+    configure_bandwidth(args.limit_rate, args.schedule)
+    configure_encoder_goal(args.goal)
+    configure_stream_cache(args.stream_cache)
+    download_manager.set_max_workers(args.jobs)
+    download_manager.set_encode_workers(args.encode_jobs)
+    if args.metrics_port:
+        try:
+            get_telemetry().serve(args.metrics_port)
+        except OSError as e:
+            parser.error(f"cannot serve metrics on port {args.metrics_port}: {e}")
+    if not get_ffmpeg_path():
+        print("WARNING: FFMPEG not found; merging and conversion will fail", file=sys.stderr)
+
+    service = DownloadService(args.output_dir)
+    try:
+        server = serve(service, port=args.port, socket_path=args.socket)
+    except OSError as e:
+        print(f"Cannot listen: {e}", file=sys.stderr)
+        return 2
+    address = f"unix:{args.socket}" if args.socket else f"http://127.0.0.1:{args.port}"
+    print(f"Listening on {address}", file=sys.stderr)
+    if args.resume:
+        print(f"Resumed {service.resume_unfinished()} unfinished download(s)", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        download_manager.cancel_all()
+        if args.socket:
+            try:
+                os.remove(args.socket)
+            except OSError:
+                pass
+    # Canceled jobs stay in the journal; --resume picks them up next time
+    service.wait_finished(SHUTDOWN_TIMEOUT)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
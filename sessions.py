@@ -0,0 +1,149 @@
+import threading, time
+from typing import Callable, Dict, List, Optional
+
+# === Hardware encoder sessions ===
+HARDWARE_ENCODER_SUFFIXES = ("_nvenc", "_amf", "_qsv", "_vaapi", "_videotoolbox")
+DEFAULT_ENCODE_RATE = 0.25   # Assumed hardware encode seconds per media second until measured
+DEFAULT_CPU_SLOWDOWN = 4.0   # Assumed CPU/hardware encode time ratio until both are measured
+RATE_SMOOTHING = 0.3         # Weight of the newest measurement in the running average
+
+def is_hardware_encoder(encoder: Optional[str]) -> bool:
+    return bool(encoder) and encoder.endswith(HARDWARE_ENCODER_SUFFIXES)  # pyright: ignore[reportOptionalMemberAccess]
+
+def video_encoder(args: Optional[List[str]]) -> Optional[str]:
+    """['-c:v', 'h264_nvenc', ...] -> 'h264_nvenc'"""
+    args = args or []
+    for flag in ("-c:v", "-codec:v", "-vcodec"):
+        if flag in args[:-1]:
+            return args[args.index(flag) + 1]
+    return None
+
+class EncoderSession:
+    """One granted encode on a hardware encoder"""
+
+    def __init__(self, encoder: str, media_seconds: float, expected: float):
+        self.encoder = encoder
+        self.media_seconds = media_seconds
+        self.expected = expected          # Expected encode duration in seconds
+        self.started: Optional[float] = None
+
+class EncoderSessionScheduler:
+    """Hands out encode sessions per hardware encoder and queues the excess.
+
+    Consumer GPUs cap concurrent encode sessions, so an encode over the cap
+    fails instead of waiting. Capacity comes from an override or from
+    `probe(encoder)` on first use. With `spill_to_cpu`, a job whose expected
+    wait plus hardware encode would take longer than encoding on the CPU is
+    told to use the CPU encoder instead. Thread-safe.
+    """
+
+    def __init__(self, probe: Callable[[str], int], spill_to_cpu: bool = False):
+        self.probe = probe
+        self.spill_to_cpu = spill_to_cpu
+        self.overrides: Dict[str, int] = {}
+        self._capacity: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._probe_lock = threading.Lock()
+        self._active: Dict[str, List[EncoderSession]] = {}
+        self._waiting: Dict[str, List[EncoderSession]] = {}
+        self._rates: Dict[str, float] = {}  # Encode seconds per media second, per encoder
+
+    def set_override(self, encoder: str, sessions: Optional[int]) -> None:
+        """Fix the session capacity of an encoder (None returns to probing)"""
+        with self._cond:
+            if sessions:
+                self.overrides[encoder] = max(1, int(sessions))
+            else:
+                self.overrides.pop(encoder, None)
+            self._cond.notify_all()
+
+    def capacity(self, encoder: str) -> int:
+        if encoder in self.overrides:
+            return self.overrides[encoder]
+        with self._probe_lock:
+            if encoder not in self._capacity:
+                try:
+                    self._capacity[encoder] = max(1, int(self.probe(encoder)))
+                except Exception as e:
+                    print(f"Encoder session probe failed for {encoder}: {e}")
+                    self._capacity[encoder] = 1
+            return self._capacity[encoder]
+
+    def rate(self, encoder: str) -> Optional[float]:
+        with self._cond:
+            return self._rates.get(encoder)
+
+    def _expected(self, encoder: str, media_seconds: float) -> float:
+        return self._rates.get(encoder, DEFAULT_ENCODE_RATE) * media_seconds
+
+    def _estimated_wait(self, encoder: str, ahead: Optional[List[EncoderSession]] = None) -> float:
+        """Seconds until a session would be free for a job queued behind `ahead`"""
+        # Caller holds self._cond
+        capacity = self.overrides.get(encoder) or self._capacity.get(encoder, 1)
+        now = time.monotonic()
+        free_at = sorted(max(now, (s.started or now) + s.expected) for s in self._active.get(encoder, []))
+        free_at += [now] * max(0, capacity - len(free_at))
+        free_at = sorted(free_at)[:capacity]
+        for session in ahead if ahead is not None else self._waiting.get(encoder, []):
+            start = free_at.pop(0)
+            free_at = sorted(free_at + [start + session.expected])
+        return max(0.0, free_at[0] - now) if free_at else 0.0
+
+    def acquire(self, encoder: str, media_seconds: float = 0.0, cpu_encoder: Optional[str] = None,
+                cancel_event: Optional[threading.Event] = None) -> Optional[EncoderSession]:
+        """Wait for a session. Returns None if the job should encode on `cpu_encoder`
+        instead, or if `cancel_event` was set while waiting."""
+        capacity = self.capacity(encoder)
+        with self._cond:
+            session = EncoderSession(encoder, media_seconds, self._expected(encoder, media_seconds))
+            active = self._active.setdefault(encoder, [])
+            waiting = self._waiting.setdefault(encoder, [])
+            if self.spill_to_cpu and cpu_encoder and media_seconds and len(active) >= capacity:
+                hardware_rate = self._rates.get(encoder, DEFAULT_ENCODE_RATE)
+                cpu_time = self._rates.get(cpu_encoder, hardware_rate * DEFAULT_CPU_SLOWDOWN) * media_seconds
+                if self._estimated_wait(encoder) + session.expected > cpu_time:
+                    return None
+            waiting.append(session)
+            try:
+                # First come, first served; overrides may change while jobs wait
+                while waiting[0] is not session or len(active) >= self.overrides.get(encoder, capacity):
+                    if cancel_event and cancel_event.is_set():
+                        return None
+                    self._cond.wait(0.5)
+            finally:
+                waiting.remove(session)
+                self._cond.notify_all()
+            session.started = time.monotonic()
+            active.append(session)
+            return session
+
+    def release(self, session: Optional[EncoderSession]) -> None:
+        """Free a session and learn the encoder's speed from how long it took"""
+        if session is None or session.started is None:
+            return
+        elapsed = time.monotonic() - session.started
+        with self._cond:
+            active = self._active.get(session.encoder, [])
+            if session in active:
+                active.remove(session)
+            session.started = None
+            self._cond.notify_all()
+        self.record(session.encoder, session.media_seconds, elapsed)
+
+    def record(self, encoder: str, media_seconds: float, elapsed: float) -> None:
+        """Learn an encoder's speed (hardware sessions and CPU encodes alike)"""
+        if media_seconds <= 0 or elapsed <= 0:
+            return
+        with self._cond:
+            rate = elapsed / media_seconds
+            previous = self._rates.get(encoder)
+            self._rates[encoder] = rate if previous is None else (
+                RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * previous)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._cond:
+            return {encoder: {"capacity": self.overrides.get(encoder) or self._capacity.get(encoder, 0),
+                              "active": len(self._active.get(encoder, [])),
+                              "waiting": len(self._waiting.get(encoder, [])),
+                              "rate": round(self._rates.get(encoder, 0.0), 3)}
+                    for encoder in set(self._active) | set(self._capacity) | set(self.overrides)}
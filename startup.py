@@ -0,0 +1,67 @@
+"""Cold-start timing, reported by `python ui.py --profile-startup`.
+
+Import this module first: phases are measured from its import. Marks are
+always recorded (they cost microseconds); the report is only produced in
+profile mode.
+"""
+import json, os, sys, threading, time
+from typing import Any, Dict, List, Optional
+
+PROFILE_FLAG = "--profile-startup"
+REPORT_FILE = "startup_profile.json"
+
+_origin = time.perf_counter()
+_last = _origin
+_lock = threading.Lock()
+_phases: List[Dict[str, Any]] = []
+
+def enabled() -> bool:
+    return PROFILE_FLAG in sys.argv
+
+def _record(name: str, start: float, end: float, thread: str) -> None:
+    with _lock:
+        _phases.append({"phase": name, "start": round(start - _origin, 4),
+                        "seconds": round(end - start, 4), "thread": thread})
+
+def mark(name: str) -> None:
+    """End a main-thread phase that began at the previous mark"""
+    global _last
+    now = time.perf_counter()
+    _record(name, _last, now, "main")
+    _last = now
+
+class span:
+    """Time a block, e.g. work done on a background thread"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> "span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        _record(self.name, self.start, time.perf_counter(), threading.current_thread().name)
+
+def report(extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    with _lock:
+        phases = sorted(_phases, key=lambda p: p["start"])
+    return {"total_seconds": round(time.perf_counter() - _origin, 4),
+            "modules_loaded": len(sys.modules),
+            "yt_dlp_loaded": "yt_dlp" in sys.modules,
+            "phases": phases, **(extra or {})}
+
+def write_report(directory: str, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Print the phase breakdown and save it as JSON next to the app"""
+    data = report(extra)
+    for phase in data["phases"]:
+        print(f"{phase['start']:8.3f}s {phase['seconds'] * 1000:9.1f} ms  {phase['phase']}"
+              f"{'' if phase['thread'] == 'main' else '  [' + phase['thread'] + ']'}")
+    print(f"Total {data['total_seconds']:.3f}s; {data['modules_loaded']} modules loaded")
+    try:
+        with open(os.path.join(directory, REPORT_FILE), "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    except Exception as e:
+        print(f"Startup profile save error: {e}")
+    return data
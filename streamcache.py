@@ -0,0 +1,176 @@
+import hashlib, json, os, re, shutil, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from config import STREAM_CACHE_DIR
+
+# === Source stream cache ===
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3  # Disk budget for cached source streams
+INDEX_FILE = "index.json"
+
+_SIZE_RE = re.compile(r'(?i)^(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?$')
+
+def parse_size(value: Any) -> int:
+    """'4G', '500M', 1048576 -> bytes (binary units); None or '' -> the default budget"""
+    if value is None or str(value).strip() == "":
+        return DEFAULT_MAX_BYTES
+    if isinstance(value, (int, float)):
+        return max(0, int(value))
+    match = _SIZE_RE.match(str(value).strip())
+    if not match:
+        raise ValueError(f"invalid size: {value}")
+    return int(float(match.group(1)) * 1024 ** " kmgt".index(match.group(2).lower() or " "))
+
+def stream_key(info: Dict[str, Any]) -> Optional[str]:
+    """'<extractor> <video id> <format id>' for one downloadable stream, or None if it cannot be cached"""
+    extractor = info.get('extractor_key') or info.get('ie_key')
+    format_id = str(info.get('format_id') or "")
+    if (not extractor or not info.get('id') or not format_id or '+' in format_id
+            or info.get('is_live') or info.get('section_start') or info.get('section_end')):
+        return None
+    return f"{extractor.lower()} {info['id']} {format_id}"
+
+def _link_or_copy(src: str, dst: str) -> None:
+    # A hard link costs no space or time; fall back to a copy across file systems
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+class StreamCache:
+    """Downloaded source streams on disk, keyed by "<extractor> <video id> <format id>".
+
+    A later job whose format selection resolves to a cached stream gets the
+    file placed where yt-dlp would download it, so it goes straight to the
+    merge or encode. Files are hard-linked in and out where the file system
+    allows. Least recently used streams are evicted past the size budget; the
+    index survives restarts. Thread-safe.
+    """
+
+    def __init__(self, directory: str = STREAM_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: Optional["OrderedDict[str, Dict[str, Any]]"] = None  # Loaded on first use
+        self._bytes = 0
+        self.hits = self.misses = self.stores = self.evictions = 0
+        self.bytes_saved = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    # === Index ===
+    def _load(self) -> "OrderedDict[str, Dict[str, Any]]":
+        # Caller holds self._lock
+        if self._entries is not None:
+            return self._entries
+        self._entries = OrderedDict()
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            for key, entry in sorted(entries.items(), key=lambda item: item[1].get("used", 0)):
+                path = os.path.join(self.directory, entry["file"])
+                if os.path.isfile(path) and os.path.getsize(path) == entry["size"]:
+                    self._entries[key] = entry
+                    self._bytes += entry["size"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Stream cache index load error: {e}")
+        return self._entries
+
+    def _save(self) -> None:
+        # Caller holds self._lock
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, INDEX_FILE)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(path + ".tmp", path)
+        except Exception as e:
+            print(f"Stream cache index save error: {e}")
+
+    def _drop(self, key: str) -> None:
+        # Caller holds self._lock
+        entry = self._load().pop(key)
+        self._bytes -= entry["size"]
+        try:
+            os.remove(os.path.join(self.directory, entry["file"]))
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        # Caller holds self._lock
+        entries = self._load()
+        while self._bytes > self.max_bytes and entries:
+            self._drop(next(iter(entries)))
+            self.evictions += 1
+
+    # === Use ===
+    def restore(self, key: str, destination: str) -> bool:
+        """Place the cached stream for `key` at `destination`; False on a miss"""
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is None:
+                self.misses += 1
+                return False
+            source = os.path.join(self.directory, entry["file"])
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+                _link_or_copy(source, destination)
+            except OSError as e:
+                print(f"Stream cache restore error: {e}")
+                self._drop(key)
+                self._save()
+                self.misses += 1
+                return False
+            entry["used"] = time.time()
+            self._entries.move_to_end(key)  # pyright: ignore[reportOptionalMemberAccess]
+            self.hits += 1
+            self.bytes_saved += entry["size"]
+            self._save()
+            return True
+
+    def store(self, key: str, path: str) -> None:
+        """Keep a freshly downloaded stream"""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        if size <= 0 or size > self.max_bytes:
+            return
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest() + os.path.splitext(path)[1]
+        with self._lock:
+            entries = self._load()
+            if key in entries:
+                self._drop(key)
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                target = os.path.join(self.directory, name)
+                if os.path.exists(target):
+                    os.remove(target)
+                _link_or_copy(path, target)
+            except OSError as e:
+                print(f"Stream cache store error: {e}")
+                return
+            entries[key] = {"file": name, "size": size, "used": time.time()}
+            self._bytes += size
+            self.stores += 1
+            self._evict()
+            self._save()
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = max(0, int(max_bytes))
+            if self._entries is not None:
+                self._evict()
+                self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._load()
+            lookups = self.hits + self.misses
+            return {"entries": len(entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "stores": self.stores,
+                    "evictions": self.evictions, "bytes_saved": self.bytes_saved,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0}
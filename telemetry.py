@@ -0,0 +1,253 @@
+import json, os, threading, time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import SPANS_FILE, METRICS_FILE
+
+# === Span names ===
+SPAN_JOB = "job"                      # Whole job, from being queued to its final state
+SPAN_QUEUE = "queue"                  # Waiting for a network slot
+SPAN_EXTRACT = "extract"              # Metadata extraction (or an info cache hit)
+SPAN_FORMAT_SELECT = "format_select"  # Format selection up to the first stream download
+SPAN_DOWNLOAD = "download"            # One stream (video, audio, ...)
+SPAN_WAIT_ENCODE = "wait_encode"      # Downloaded, waiting for an encode slot
+SPAN_MERGE = "merge"                  # Streams joined without re-encoding
+SPAN_ENCODE = "encode"                # Merge or conversion that transcodes
+SPAN_EXTRACT_AUDIO = "extract_audio"
+SPAN_FINALIZE = "finalize"            # Moving the finished file into place
+
+# Upper bounds (seconds) of the span duration histogram buckets
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+MAX_SPANS_BYTES = 16 * 1024 * 1024  # The span log rolls over to a single .1 file past this size
+METRIC_PREFIX = "ytdl_"
+
+class _Span:
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.wall = time.time()
+        self.started = time.monotonic()
+        self.retries = 0
+
+class JobSpans:
+    """Timed spans of one job.
+
+    Spans are either wrapped around a block (`span`) or opened and closed from
+    yt-dlp hooks (`start`/`end`, matched by name and key). Each closed span is
+    handed to the Telemetry sink. Thread-safe: fragment downloads report from
+    their own threads.
+    """
+
+    def __init__(self, telemetry: "Telemetry", job_key: str, job_id: int, url: str,
+                 cancel_event: Optional[threading.Event] = None):
+        self.telemetry = telemetry
+        self.job_key = job_key
+        self.job_id = job_id
+        self.url = url
+        self.cancel_event = cancel_event
+        self._lock = threading.Lock()
+        self._open: Dict[Tuple[str, Any], _Span] = {}
+
+    def start(self, name: str, key: Any = None, **attrs: Any) -> None:
+        with self._lock:
+            self._open.setdefault((name, key), _Span(name, attrs))
+
+    def is_open(self, name: str, key: Any = None) -> bool:
+        with self._lock:
+            return (name, key) in self._open
+
+    def end(self, name: str, key: Any = None, status: str = "ok",
+            nbytes: Optional[int] = None, **attrs: Any) -> None:
+        with self._lock:
+            span = self._open.pop((name, key), None)
+        if span is not None:
+            self._emit(span, status, nbytes, attrs)
+
+    def end_all(self, status: str) -> None:
+        """Close whatever is still open except the job span, e.g. when the job fails or is canceled"""
+        with self._lock:
+            keys = [key for key in self._open if key[0] != SPAN_JOB]
+            spans = [self._open.pop(key) for key in keys]
+        for span in spans:
+            self._emit(span, status, None, {})
+
+    def retry(self) -> None:
+        """Count a retry against the most recently opened span"""
+        with self._lock:
+            if self._open:
+                list(self._open.values())[-1].retries += 1
+
+    def failure_status(self) -> str:
+        return "canceled" if self.cancel_event is not None and self.cancel_event.is_set() else "error"
+
+    def span(self, name: str, **attrs: Any) -> "_SpanBlock":
+        """Context manager timing a block; an exception closes it as failed"""
+        return _SpanBlock(self, name, attrs)
+
+    def _emit(self, span: _Span, status: str, nbytes: Optional[int], attrs: Dict[str, Any]) -> None:
+        record = {"job": self.job_key, "job_id": self.job_id, "url": self.url, "span": span.name,
+                  "start": round(span.wall, 3), "seconds": round(time.monotonic() - span.started, 4),
+                  "status": status, "bytes": nbytes, "retries": span.retries, **span.attrs, **attrs}
+        self.telemetry.record(record)
+
+class _SpanBlock:
+    def __init__(self, spans: JobSpans, name: str, attrs: Dict[str, Any]):
+        self.spans = spans
+        self.name = name
+        self.key = object()  # Never collides with hook-driven spans of the same name
+        self.attrs = attrs
+        self.nbytes: Optional[int] = None
+        self.extra: Dict[str, Any] = {}  # Attributes only known once the block has run
+
+    def note(self, **attrs: Any) -> None:
+        self.extra.update(attrs)
+
+    def __enter__(self) -> "_SpanBlock":
+        self.spans.start(self.name, self.key, **self.attrs)
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        status = "ok" if exc_type is None else self.spans.failure_status()
+        self.spans.end(self.name, self.key, status, self.nbytes, **self.extra)
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+class Telemetry:
+    """Process-wide sink for job spans.
+
+    Every span is appended to a JSON-lines file and folded into counters and
+    duration histograms, which are rendered in the Prometheus text format:
+    rewritten to a file whenever a job finishes, and optionally served on a
+    local HTTP endpoint. Thread-safe.
+    """
+
+    def __init__(self, spans_path: Optional[str] = SPANS_FILE, metrics_path: Optional[str] = METRICS_FILE):
+        self.spans_path = spans_path
+        self.metrics_path = metrics_path
+        self._lock = threading.Lock()
+        self._spans: Dict[Tuple[str, str], int] = {}   # (span, status) -> count
+        self._durations: Dict[str, _Histogram] = {}
+        self._bytes: Dict[str, int] = {}
+        self._retries: Dict[str, int] = {}
+        self._jobs: Dict[str, int] = {}                # final state -> count
+        self._gauges: List[Tuple[str, str, str, Callable[[], Dict[str, float]]]] = []
+        self._server: Optional[Any] = None  # ThreadingHTTPServer once serve() was called
+
+    def add_gauge(self, name: str, help_text: str, label: str, read: Callable[[], Dict[str, float]]) -> None:
+        """Expose values read at scrape time, e.g. jobs per pipeline stage"""
+        self._gauges.append((name, help_text, label, read))
+
+    # === Recording ===
+    def record(self, record: Dict[str, Any]) -> None:
+        name, status = record["span"], record["status"]
+        with self._lock:
+            self._spans[(name, status)] = self._spans.get((name, status), 0) + 1
+            self._durations.setdefault(name, _Histogram()).observe(record["seconds"])
+            if record.get("bytes"):
+                self._bytes[name] = self._bytes.get(name, 0) + int(record["bytes"])
+            if record.get("retries"):
+                self._retries[name] = self._retries.get(name, 0) + int(record["retries"])
+            if name == SPAN_JOB:
+                self._jobs[status] = self._jobs.get(status, 0) + 1
+            self._append(record)
+        if name == SPAN_JOB:
+            self.write_metrics()
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        # Caller holds self._lock
+        if not self.spans_path:
+            return
+        try:
+            if os.path.exists(self.spans_path) and os.path.getsize(self.spans_path) > MAX_SPANS_BYTES:
+                os.replace(self.spans_path, self.spans_path + ".1")
+            with open(self.spans_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"Span log write error: {e}")
+
+    # === Prometheus text format ===
+    def render(self) -> str:
+        p = METRIC_PREFIX
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {p}{name} {help_text}")
+            lines.append(f"# TYPE {p}{name} {kind}")
+
+        with self._lock:
+            family("jobs_total", "counter", "Jobs finished, by final state")
+            for state, count in sorted(self._jobs.items()):
+                lines.append(f'{p}jobs_total{{state="{state}"}} {count}')
+            family("spans_total", "counter", "Spans closed, by span and status")
+            for (name, status), count in sorted(self._spans.items()):
+                lines.append(f'{p}spans_total{{span="{name}",status="{status}"}} {count}')
+            family("span_seconds", "histogram", "Time spent per span")
+            for name, hist in sorted(self._durations.items()):
+                for bound, count in zip(DURATION_BUCKETS, hist.buckets):
+                    lines.append(f'{p}span_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+                lines.append(f'{p}span_seconds_bucket{{span="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'{p}span_seconds_sum{{span="{name}"}} {hist.total:.4f}')
+                lines.append(f'{p}span_seconds_count{{span="{name}"}} {hist.count}')
+            family("span_bytes_total", "counter", "Bytes downloaded or written, by span")
+            for name, total in sorted(self._bytes.items()):
+                lines.append(f'{p}span_bytes_total{{span="{name}"}} {total}')
+            family("retries_total", "counter", "Retries reported by yt-dlp, by span")
+            for name, total in sorted(self._retries.items()):
+                lines.append(f'{p}retries_total{{span="{name}"}} {total}')
+        for name, help_text, label, read in self._gauges:
+            try:
+                values = read()
+            except Exception as e:
+                print(f"Metrics gauge error ({name}): {e}")
+                continue
+            family(name, "gauge", help_text)
+            for value_label, value in sorted(values.items()):
+                lines.append(f'{p}{name}{{{label}="{value_label}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self) -> None:
+        """Rewrite the Prometheus text file (for node_exporter's textfile collector)"""
+        if not self.metrics_path:
+            return
+        try:
+            tmp_path = self.metrics_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.render())
+            os.replace(tmp_path, self.metrics_path)
+        except Exception as e:
+            print(f"Metrics write error: {e}")
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> Any:
+        """Serve GET /metrics on a background thread; returns the running server"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Not on the startup path
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = telemetry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Scrapes would otherwise flood stderr
+
+        if self._server is None:
+            self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
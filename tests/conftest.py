@@ -0,0 +1,94 @@
+import os, stat, sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+pytest.importorskip("yt_dlp")
+
+import config  # noqa: E402
+
+REAL_FFMPEG = config.find_ffmpeg_path()  # Probes without remembering the location in the checkout
+
+STUB_HEADER = f'''#!{sys.executable}
+import os, subprocess, sys, time
+REAL = {REAL_FFMPEG!r}
+args = sys.argv[1:]
+'''
+
+def write_stub_ffmpeg(directory: str, body: str) -> str:
+    """An executable named ffmpeg that runs `body` (Python, with `REAL` and `args` set)"""
+    path = os.path.join(directory, "ffmpeg")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(STUB_HEADER + body)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+@pytest.fixture(scope="session", autouse=True)
+def ffmpeg_location(tmp_path_factory):
+    """Remember the ffmpeg location outside the checkout, before session fixtures resolve it"""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(config, "FFMPEG_LOCATION_FILE", str(tmp_path_factory.mktemp("ffmpeg") / "ffmpeg_location.json"))
+        patch.setattr(config, "_ffmpeg_resolved", False)
+        yield
+
+@pytest.fixture(autouse=True)
+def app_state(monkeypatch, tmp_path):
+    """Point every file the engine keeps next to config.json into the test's tmp_path.
+
+    The module-level singletons were built at import with paths in the
+    checkout; a test run must not touch a real user's archive, codec cache,
+    logs or metrics. Yields the directory.
+    """
+    import downloader
+    from archive import DownloadArchive
+    from fragments import FragmentTuner
+    from joblog import JobLog
+    from streamcache import StreamCache
+    state = tmp_path / "app_state"
+    state.mkdir()
+    for name, file_name in (("CODEC_CACHE_FILE", "codec_cache.json"),
+                            ("FRAGMENT_TUNING_FILE", "fragment_tuning.json"),
+                            ("CALIBRATION_FILE", "calibration.json")):
+        monkeypatch.setattr(config, name, str(state / file_name))
+    telemetry = downloader.get_telemetry()
+    monkeypatch.setattr(telemetry, "spans_path", str(state / "job_spans.jsonl"))
+    monkeypatch.setattr(telemetry, "metrics_path", str(state / "metrics.prom"))
+    job_log = JobLog(str(state / "logs"))
+    monkeypatch.setattr(downloader, "_job_log", job_log)
+    archive = DownloadArchive(str(state / "archive.sqlite3"))
+    monkeypatch.setattr(downloader, "_archive", archive)
+    monkeypatch.setattr(downloader, "_fragment_tuner", FragmentTuner())
+    monkeypatch.setattr(downloader, "_stream_cache", StreamCache(str(state / "stream_cache")))
+    yield state
+    job_log.close()
+    archive.close()
+
+@pytest.fixture(scope="session")
+def media_server(tmp_path_factory):
+    """Small generated DASH media served on localhost; yields (base URL, cases)"""
+    if REAL_FFMPEG is None or os.name == "nt":
+        pytest.skip("needs ffmpeg and a POSIX shell")
+    from benchmark import generate_media, start_server
+    media_dir = str(tmp_path_factory.mktemp("media"))
+    cases = generate_media(media_dir, [240], 2)
+    server, base_url = start_server(media_dir, latency=0.0, bandwidth=None)
+    yield base_url, {case["kind"]: case for case in cases}
+    server.shutdown()
+
+@pytest.fixture
+def engine(monkeypatch, tmp_path):
+    """A fresh DownloadManager whose jobs use a stub ffmpeg (see `use_ffmpeg`); app state as in `app_state`"""
+    import downloader
+    downloader.configure_stream_cache(0)  # Every job fetches and encodes on its own
+    monkeypatch.setattr(downloader, "detect_available_codecs",
+                        lambda path: {name: args for name, args in downloader.CODEC_MAP.items()})
+
+    def use_ffmpeg(path: str) -> None:
+        monkeypatch.setattr(downloader, "get_ffmpeg_path", lambda: path)
+
+    manager = downloader.DownloadManager(max_workers=4, encode_workers=4, journal=None)
+    yield manager, use_ffmpeg
+    manager.cancel_all()
+    downloader.configure_stream_cache(None)
@@ -0,0 +1,80 @@
+import os, signal, time
+from conftest import write_stub_ffmpeg
+from downloader import DownloadOptions, JOB_CANCELED, get_process_registry
+from processes import REAP_TIMEOUT, TERMINATE_GRACE
+
+CANCEL_BOUND = TERMINATE_GRACE + REAP_TIMEOUT  # From cancel to a finished job with no processes left
+
+# A merge that hangs: writes part of its output, starts a child in its process
+# group (as a real ffmpeg's helpers would be) and never finishes on its own
+HANGING_MERGE = '''
+if any(".temp." in a for a in args):
+    output = args[-1][len("file:"):] if args[-1].startswith("file:") else args[-1]
+    with open(output, "wb") as f:
+        f.write(b"\\0" * 4096)
+    helper = subprocess.Popen(["sleep", "60"])
+    pids = os.path.join(os.path.dirname(os.path.abspath(__file__)), "merge.pids")
+    with open(pids + ".tmp", "w") as f:
+        f.write(f"{os.getpid()} {helper.pid}")
+    os.replace(pids + ".tmp", pids)
+    time.sleep(60)
+    sys.exit(0)
+os.execv(REAL, [REAL] + args)
+'''
+
+def _group_alive(pgid: int) -> bool:
+    """Whether any process of the group still runs; zombies awaiting their reaper do not count"""
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    if not os.path.isdir("/proc"):
+        return True
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[2]) == pgid and fields[0] != "Z":
+            return True
+    return False
+
+def test_cancel_during_merge_stops_process_group_and_removes_partials(engine, media_server, tmp_path):
+    manager, use_ffmpeg = engine
+    base_url, cases = media_server
+    stub_dir = tmp_path / "bin"
+    stub_dir.mkdir()
+    use_ffmpeg(write_stub_ffmpeg(str(stub_dir), HANGING_MERGE))
+    out_dir = tmp_path / "out"
+    pids_file = stub_dir / "merge.pids"
+
+    batch = manager.submit([base_url + cases["dash"]["path"]],
+                           DownloadOptions("H.264 (CPU libx264)", "240p", str(out_dir), use_archive=False))
+    job = batch.jobs[0]
+    deadline = time.monotonic() + 60
+    while not pids_file.exists():
+        assert not job.finished, job.error
+        assert time.monotonic() < deadline, "the merge never started"
+        time.sleep(0.05)
+    merge_pid, helper_pid = map(int, pids_file.read_text().split())
+    try:
+        assert os.getpgid(helper_pid) == merge_pid  # The merge runs in a process group of its own
+        assert any(".temp." in name for name in os.listdir(out_dir))
+
+        started = time.monotonic()
+        assert manager.cancel(job.id)
+        while not job.finished or _group_alive(merge_pid):
+            assert time.monotonic() - started < CANCEL_BOUND, "the merge outlived its canceled job"
+            time.sleep(0.01)
+
+        assert job.state == JOB_CANCELED
+        assert get_process_registry().active(job.key) == 0
+        time.sleep(TERMINATE_GRACE)  # The partial output is removed once its process is reaped
+        leftovers = [name for name in os.listdir(out_dir) if name.endswith(".part") or ".temp." in name]
+        assert leftovers == []
+    finally:
+        try:
+            os.kill(helper_pid, signal.SIGKILL)  # Never leave the helper behind when an assert failed
+        except ProcessLookupError:
+            pass
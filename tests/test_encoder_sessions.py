@@ -0,0 +1,78 @@
+import os
+from conftest import write_stub_ffmpeg
+import downloader
+from downloader import DownloadOptions, JOB_DONE
+from sessions import EncoderSessionScheduler
+
+SESSION_LIMIT = 1
+JOBS = 4
+MEDIA_SECONDS = 2.0
+
+# An "NVENC" that holds each session for a while and fails once more than
+# SESSION_LIMIT are open, like a consumer GPU; the encode itself is libx264.
+FAKE_NVENC = f'''
+LIMIT = {SESSION_LIMIT}
+log_dir = os.path.dirname(os.path.abspath(__file__))
+def log(line):
+    with open(os.path.join(log_dir, "encodes.log"), "a") as f:
+        f.write(line + "\\n")
+if "h264_nvenc" in args:
+    slot = None
+    for i in range(LIMIT):
+        try:
+            os.close(os.open(os.path.join(log_dir, f"session{{i}}"), os.O_CREAT | os.O_EXCL))
+            slot = os.path.join(log_dir, f"session{{i}}")
+            break
+        except FileExistsError:
+            pass
+    if slot is None:
+        log("overloaded")
+        sys.stderr.write("OpenEncodeSessionEx failed: out of memory (10)\\n")
+        sys.exit(1)
+    try:
+        log("h264_nvenc")
+        time.sleep(2)  # Keep the session busy while the other jobs reach their encode
+        args = ["libx264" if a == "h264_nvenc" else "ultrafast" if a == "p4" else a for a in args]
+        sys.exit(subprocess.call([REAL] + args))
+    finally:
+        os.remove(slot)
+if "libx264" in args:
+    log("libx264")
+os.execv(REAL, [REAL] + args)
+'''
+
+def test_busy_hardware_sessions_spill_to_cpu(engine, media_server, tmp_path, monkeypatch):
+    manager, use_ffmpeg = engine
+    base_url, cases = media_server
+    stub_dir = tmp_path / "bin"
+    stub_dir.mkdir()
+    use_ffmpeg(write_stub_ffmpeg(str(stub_dir), FAKE_NVENC))
+
+    sessions = EncoderSessionScheduler(lambda encoder: SESSION_LIMIT, spill_to_cpu=True)
+    sessions.record("h264_nvenc", 1.0, 5.0)  # A busy GPU is slower than waiting is worth
+    sessions.record("libx264", 1.0, 0.5)
+    monkeypatch.setattr(downloader, "_encoder_sessions", sessions)
+
+    # YouTube metadata always carries the duration the spill decision needs; the generated media does not
+    def with_duration(info, incomplete=False):
+        info.setdefault("duration", MEDIA_SECONDS)
+        return None
+    build_ydl_opts = downloader.build_ydl_opts
+    monkeypatch.setattr(downloader, "build_ydl_opts",
+                        lambda *args, **kwargs: {**build_ydl_opts(*args, **kwargs), "match_filter": with_duration})
+
+    # One output directory per job: the generated media all share one title
+    batches = [manager.submit([base_url + cases["dash"]["path"]],
+                              DownloadOptions("H.264 (NVIDIA NVENC)", "240p", str(tmp_path / f"out{i}"),
+                                              use_archive=False))
+               for i in range(JOBS)]
+    assert all(batch.wait(120) for batch in batches)
+
+    jobs = [job for batch in batches for job in batch.jobs]
+    assert [job.state for job in jobs] == [JOB_DONE] * JOBS, [job.error for job in jobs]
+    encodes = (stub_dir / "encodes.log").read_text().split()
+    assert "overloaded" not in encodes
+    assert encodes.count("h264_nvenc") >= 1
+    assert encodes.count("libx264") >= 1
+    assert len(encodes) == JOBS
+    assert all(len(os.listdir(tmp_path / f"out{i}")) == 1 for i in range(JOBS))
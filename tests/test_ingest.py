@@ -0,0 +1,31 @@
+import pytest
+from downloader import canonical_youtube_url
+from ingest import collect
+
+@pytest.mark.parametrize("spellings", [
+    ["youtu.be/dQw4w9WgXcQ", "https://m.youtube.com/watch?v=dQw4w9WgXcQ&t=30",
+     "youtube.com/shorts/dQw4w9WgXcQ"],
+    ["youtube.com/@SomeChannel", "https://www.youtube.com/@somechannel", "m.youtube.com/@SOMECHANNEL/"],
+    ["youtube.com/@SomeChannel/videos", "https://www.youtube.com/@somechannel/videos"],
+    ["youtube.com/c/SomeName", "youtube.com/c/somename/"],
+    ["youtube.com/channel/UCabcDEF123", "https://www.youtube.com/channel/UCabcDEF123/"],
+])
+def test_spellings_of_one_target_share_a_key(spellings):
+    keys = {canonical_youtube_url(url)[0] for url in spellings}
+    assert len(keys) == 1, keys
+
+@pytest.mark.parametrize("first, second", [
+    ("youtube.com/@somechannel", "youtube.com/@somechannel/videos"),   # Every upload vs. videos only
+    ("youtube.com/@somechannel", "youtube.com/@somechannel/shorts"),   # Another tab
+    ("youtube.com/channel/UCabc", "youtube.com/channel/UCABC"),        # Channel IDs are case-sensitive
+    ("youtube.com/@videos", "youtube.com/@other"),                     # A handle named like the tab
+])
+def test_different_targets_keep_their_keys(first, second):
+    assert canonical_youtube_url(first)[0] != canonical_youtube_url(second)[0]
+
+def test_collect_queues_each_channel_once_and_keeps_its_tab():
+    result = collect(["https://www.youtube.com/@Chan\nyoutube.com/@chan\n"
+                      "youtube.com/@chan/videos\nm.youtube.com/@CHAN/videos\nnot a link"])
+    assert result.urls == ["https://www.youtube.com/@chan", "https://www.youtube.com/@chan/videos"]
+    assert result.duplicates == 2
+    assert result.invalid == ["not a link"]
@@ -0,0 +1,99 @@
+import http.client, json, os, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from downloader import DownloadManager, JOB_CANCELED, JOB_QUEUED
+from service import DownloadService, ServiceClient, ServiceError, serve
+
+PLAYLIST = "https://www.youtube.com/playlist?list=PLtest"
+ENTRIES = 3
+
+@pytest.fixture
+def held_server():
+    """A web server that answers nothing until released; yields (base URL, release event)"""
+    release = threading.Event()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            release.wait(30)
+            self.send_error(404)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", release
+    release.set()
+    server.shutdown()
+
+@pytest.fixture
+def service(held_server, tmp_path):
+    """A service on a free port whose playlists list ENTRIES videos on the held server; yields (service, port)"""
+    base_url, release = held_server
+
+    def expander(parent, enqueue):
+        for i in range(ENTRIES):
+            enqueue(f"{base_url}/video{i}.mp4")
+
+    manager = DownloadManager(max_workers=1, encode_workers=1, expander=expander, journal=None)
+    svc = DownloadService(str(tmp_path / "out"), manager)
+    server = serve(svc, port=0)
+    yield svc, server.server_address[1]
+    manager.cancel_all()
+    release.set()
+    server.shutdown()
+
+def _raw(port, method, path, headers, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        conn.putrequest(method, path, skip_host=True)
+        for name, value in headers.items():
+            conn.putheader(name, value)
+        conn.endheaders(body)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        conn.close()
+
+def test_requests_for_other_hosts_and_non_json_posts_are_refused(service):
+    _, port = service
+    assert _raw(port, "GET", "/health", {"Host": "evil.example"})[0] == 403
+    assert _raw(port, "GET", "/health", {"Host": f"evil.example:{port}"})[0] == 403
+    assert _raw(port, "GET", "/health", {"Host": f"localhost:{port}"})[0] == 200
+    body = json.dumps({"urls": [PLAYLIST]}).encode()
+    status, _ = _raw(port, "POST", "/jobs", {"Host": f"127.0.0.1:{port}", "Content-Type": "text/plain",
+                                            "Content-Length": str(len(body))}, body)
+    assert status == 415
+
+def test_output_dir_must_stay_inside_the_service_directory(service):
+    svc, port = service
+    client = ServiceClient(f"127.0.0.1:{port}")
+    for outside in ("../elsewhere", "/tmp", "sub/../../elsewhere"):
+        with pytest.raises(ServiceError) as error:
+            client.submit([PLAYLIST], "libx264", "720p", output_dir=outside)
+        assert error.value.status == 400
+
+def test_queued_playlist_entries_are_listed_and_cancelable(service, held_server):
+    svc, port = service
+    _, release = held_server
+    client = ServiceClient(f"127.0.0.1:{port}")
+    client.submit([PLAYLIST], "libx264", "720p", output_dir="playlist")
+
+    deadline = time.monotonic() + 10
+    while len(client.jobs()) < 1 + ENTRIES:
+        assert time.monotonic() < deadline, client.jobs()
+        time.sleep(0.05)
+    entries = [job for job in client.jobs() if not job["playlist"]]
+    playlist_dir = os.path.join(os.path.realpath(svc.output_dir), "playlist")
+    assert all(job["options"]["output_dir"] == playlist_dir for job in entries)
+
+    last = entries[-1]
+    assert last["state"] == JOB_QUEUED  # The first entry holds the only download slot
+    status, result = _raw(port, "DELETE", f"/jobs/{last['id']}", {"Host": f"127.0.0.1:{port}"})
+    assert (status, result) == (200, {"canceled": True})
+    assert client.job(last["id"])["state"] == JOB_CANCELED
+
+    release.set()
+    client.cancel()
+    assert client.wait_finished(30, interval=0.1)
@@ -0,0 +1,16 @@
+import subprocess, sys
+import pytest
+from conftest import ROOT
+
+SERVICE_ONLY = ("service", "http.server", "http.client", "socketserver")
+
+def test_gui_import_leaves_the_service_modules_unloaded():
+    pytest.importorskip("customtkinter")
+    probe = f"import sys, ui; print(' '.join(m for m in {SERVICE_ONLY!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
+
+def test_default_service_address_matches_the_service():
+    import service, ui
+    assert ui.DEFAULT_SERVICE_ADDRESS == service.DEFAULT_ADDRESS
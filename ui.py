@@ -1,10 +1,33 @@
+import startup  # First, so the startup profile covers every import below
 import customtkinter as ctk
-from tkinter import messagebox, Menu
+from tkinter import messagebox, filedialog, Menu
 import threading
+import itertools
 import platform
 import sys
-from config import load_config, save_config, DOWNLOAD_DIR, open_folder, FFMPEG_PATH
-from downloader import download_videos, cancel_download, translations, detect_available_codecs
+import os
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+startup.mark("import customtkinter")
+from config import load_config, save_config, BASE_DIR, DOWNLOAD_DIR, open_folder, get_ffmpeg_path, cached_ffmpeg_path
+startup.mark("import config")
+from downloader import (cancel_download, translations, detect_available_codecs, validate_youtube_url,
+                        cached_available_codecs, software_codecs, format_detection_timings, CODEC_MAP,
+                        download_manager, DEFAULT_CONCURRENCY, MAX_CONCURRENCY,
+                        DownloadOptions, DownloadBatch, DownloadJob, JOB_CANCELED, JOB_FAILED,
+                        parse_fragments, resumable_batches, configure_encoder_sessions,
+                        configure_bandwidth, get_bandwidth_governor, preload_yt_dlp, get_telemetry,
+                        configure_encoder_goal, configure_stream_cache, get_job_log)
+from fragments import FRAGMENT_LEVELS
+from bandwidth import parse_rate
+from ingest import IngestResult, collect
+from joblog import JobLog, LEVEL_DEBUG, LEVEL_INFO, LEVEL_WARNING, LEVEL_ERROR, level_of
+from progress import (JobProgress, PHASE_EXPAND, PHASE_PREPARE, PHASE_STAGED, PHASE_DOWNLOAD,
+                      PHASE_POST, format_speed)
+startup.mark("import engine")
 
 # Windows-specific import with fallback
 try:
@@ -12,6 +35,537 @@ try:
 except ImportError:
     winreg = None
 
+# Optional: files and text dropped on the URL box
+try:
+    from tkinterdnd2 import TkinterDnD, DND_FILES, DND_TEXT
+except ImportError:
+    TkinterDnD = None
+
+# === Coalesced UI update pump ===
+UI_PUMP_INTERVAL_MS = 50     # 20 Hz
+
+class UiPump:
+    """Thread-safe queue between worker threads and the Tk main loop.
+
+    Workers push per-widget state updates from any thread; log lines go to
+    the job log. The main loop drains the queue every UI_PUMP_INTERVAL_MS,
+    applies only the latest update per key and lets the log view catch up
+    once, so UI cost stays bounded however many jobs run or however chatty
+    yt-dlp gets.
+    """
+
+    def __init__(self, root: Any, log_view: Any, interval_ms: int = UI_PUMP_INTERVAL_MS):
+        self.root = root
+        self.log_view = log_view
+        self.interval_ms = interval_ms
+        self._lock = threading.Lock()
+        self._updates: Dict[str, Callable[[], None]] = {}
+        self._started = False
+
+    def log(self, line: str, tag: Optional[str] = None) -> None:
+        """Log an app message (not tied to a job); `tag` is 'warning', 'error' or None"""
+        line = line.rstrip("\n")
+        if line.strip():
+            get_job_log().append(level_of(tag), line)
+
+    def set(self, key: str, func: Callable[[], None]) -> None:
+        """Schedule `func` for the next tick, replacing any pending update with the same key"""
+        with self._lock:
+            self._updates.pop(key, None)  # Keep keys in submission order
+            self._updates[key] = func
+
+    def start(self) -> None:
+        if not self._started:
+            self._started = True
+            self._schedule()
+
+    def _schedule(self) -> None:
+        try:
+            if self.root.winfo_exists():
+                self.root.after(self.interval_ms, self._drain)
+        except Exception:
+            pass
+
+    def _drain(self) -> None:
+        with self._lock:
+            updates, self._updates = self._updates, {}
+
+        try:
+            self.log_view.refresh()
+        except Exception:
+            pass
+        for func in updates.values():
+            try:
+                func()
+            except Exception:
+                pass
+        self._schedule()
+
+# === Virtualized log view ===
+LOG_RECORD_CACHE = 2000      # Recent lines kept in memory so following the tail needs no disk reads
+LOG_FILTER_DELAY_MS = 300    # Typing pause before a text filter is applied
+LOG_WHEEL_LINES = 3
+LOG_LEVEL_FILTERS = {"All levels": LEVEL_DEBUG, "Info": LEVEL_INFO,
+                     "Warnings": LEVEL_WARNING, "Errors": LEVEL_ERROR}
+
+class LogView:
+    """Draws only the job log lines in view into a text box.
+
+    Rows are job log seqs: every line, or the lines matching the level, job
+    and text filters. The history is matched on a worker thread against the
+    log files; lines logged afterwards are matched as they arrive. The text
+    box never holds more than one screen of lines, so a redraw costs the
+    same after a million lines as after ten. Main thread only, except for
+    the job log listener.
+    """
+
+    def __init__(self, text_widget: Any, scrollbar: Any, store: JobLog,
+                 on_status: Optional[Callable[[str], None]] = None):
+        self.text = text_widget
+        self.scrollbar = scrollbar
+        self.store = store
+        self.on_status = on_status
+        self.visible = 8                 # Rows that fit in the text box
+        self.top = 0                     # Row shown first
+        self.follow = True               # Keep the newest line in view
+        self.rows: Optional[array] = None  # Matching seqs; None shows every line
+        self._filter = (LEVEL_DEBUG, None, "")
+        self._generation = 0
+        self._collected: Optional[array] = None  # Matches logged while a search runs
+        self._first = 0
+        self._cache: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._drawn: Optional[tuple] = None
+        self._status = ""
+        self._lock = threading.Lock()
+        self._pending: List[Dict[str, Any]] = []
+        self._ready: Optional[tuple] = None      # (generation, snapshot seq, seqs) of a finished search
+        store.add_listener(self._on_record)
+
+    def _on_record(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._pending.append(record)
+
+    @property
+    def filtered(self) -> bool:
+        return self._filter != (LEVEL_DEBUG, None, "")
+
+    def _matches(self, record: Dict[str, Any]) -> bool:
+        min_level, job_id, text = self._filter
+        return (level_of(record["level"]) >= min_level and (job_id is None or record["job"] == job_id)
+                and (not text or text in record["msg"].lower()))
+
+    # === Main loop ===
+    def refresh(self) -> None:
+        """Take in new lines and finished searches; redraw if the view changed"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            ready, self._ready = self._ready, None
+        changed = bool(pending)
+        for record in pending:
+            self._cache[record["seq"]] = record
+        while len(self._cache) > LOG_RECORD_CACHE:
+            self._cache.popitem(last=False)
+
+        if self.filtered:
+            target = self._collected if self._collected is not None else self.rows
+            if target is not None:
+                target.extend(record["seq"] for record in pending if self._matches(record))
+        if ready is not None and ready[0] == self._generation and self._collected is not None:
+            _, snapshot, seqs = ready
+            seqs.extend(seq for seq in self._collected if seq >= snapshot)
+            self.rows, self._collected = seqs, None
+            changed = True
+
+        first, _ = self.store.span()
+        if first != self._first:
+            # Lines rotated out of the log files are gone from the view as well
+            if self.rows is not None:
+                cut = bisect_left(self.rows, first)
+                del self.rows[:cut]
+                self.top -= cut
+            else:
+                self.top -= first - self._first
+            self._first = first
+            changed = True
+        if changed:
+            self._draw()
+
+    def _total(self) -> int:
+        if self.rows is not None:
+            return len(self.rows)
+        first, end = self.store.span()
+        return end - first
+
+    def _draw(self) -> None:
+        total = self._total()
+        if self.follow:
+            self.top = total - self.visible
+        self.top = max(0, min(self.top, total - self.visible))
+        end = min(total, self.top + self.visible)
+        if self.rows is not None:
+            seqs = tuple(self.rows[self.top:end])
+        else:
+            first = self.store.span()[0]
+            seqs = tuple(range(first + self.top, first + end))
+        try:
+            self.scrollbar.set(self.top / total, end / total) if total else self.scrollbar.set(0.0, 1.0)
+        except Exception:
+            pass
+        if seqs != self._drawn:
+            self._drawn = seqs
+            self._render(self._records(seqs))
+        if self._collected is not None:
+            status = "Searching…"
+        elif self.rows is not None:
+            status = f"{total:,} matching"
+        else:
+            status = f"{total:,} lines"
+        if status != self._status and self.on_status:
+            self._status = status
+            self.on_status(status)
+
+    def _records(self, seqs: tuple) -> List[Dict[str, Any]]:
+        missing = [seq for seq in seqs if seq not in self._cache]
+        found = dict(zip(missing, self.store.read(missing))) if missing else {}
+        records = []
+        for seq in seqs:
+            record = self._cache.get(seq) or found.get(seq)
+            if record is not None:
+                records.append(record)
+        return records
+
+    def _render(self, records: List[Dict[str, Any]]) -> None:
+        try:
+            self.text.configure(state="normal")
+            self.text.delete("1.0", "end")
+            for i, record in enumerate(records):
+                line = (datetime.fromtimestamp(record["t"]).strftime("[%H:%M:%S] ")
+                        + (f"#{record['job']} " if record["job"] else "")
+                        + record["msg"].replace("\n", " ") + ("\n" if i < len(records) - 1 else ""))
+                tag = record["level"] if record["level"] in ("warning", "error") else None
+                self.text.insert("end", line, tag)
+            self.text.configure(state="disabled")
+        except Exception:
+            pass
+
+    # === User actions ===
+    def set_filter(self, min_level: int = LEVEL_DEBUG, job_id: Optional[int] = None, text: str = "") -> None:
+        """Show only matching lines; the history is searched in the background"""
+        new_filter = (min_level, job_id, text.strip().lower())
+        if new_filter == self._filter:
+            return
+        self._filter = new_filter
+        self._generation += 1
+        self.follow, self.top = True, 0
+        if not self.filtered:
+            self.rows = self._collected = None
+            self._draw()
+            return
+        self.rows, self._collected = array('q'), array('q')  # Rows stay empty until the search finishes
+        generation, snapshot = self._generation, self.store.span()[1]
+
+        def search():
+            seqs = self.store.query(min_level, job_id, new_filter[2], upto=snapshot,
+                                    canceled=lambda: generation != self._generation)
+            with self._lock:
+                if generation == self._generation:
+                    self._ready = (generation, snapshot, seqs)
+        threading.Thread(target=search, daemon=True).start()
+        self._draw()
+
+    def jump_to_end(self) -> None:
+        self.follow = True
+        self._draw()
+
+    def scroll(self, *args: Any) -> None:
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units' | 'pages')"""
+        total = self._total()
+        try:
+            if args[0] == "moveto":
+                self.top = int(float(args[1]) * total)
+            elif args[0] == "scroll":
+                self.top += int(args[1]) * (self.visible if args[2] == "pages" else 1)
+        except (IndexError, ValueError):
+            return
+        self.follow = self.top >= total - self.visible
+        self._draw()
+
+    def on_wheel(self, event: Any) -> str:
+        up = getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0
+        self.scroll("scroll", -LOG_WHEEL_LINES if up else LOG_WHEEL_LINES, "units")
+        return "break"
+
+    def on_resize(self, event: Any) -> None:
+        try:
+            info = self.text.dlineinfo("1.0")
+            line_height = info[3] if info else 16
+            self.visible = max(1, (event.height - 6) // max(1, line_height))
+        except Exception:
+            return
+        self._drawn = None
+        self._draw()
+
+# === Tk front-end for the job queue ===
+def download_videos(urls: List[str], codec_choice: str, res_choice: str,
+                    log_view: Any, prog_label: Any, speed_label: Any, 
+                    download_btn: Any, progress_bar: Any, phase_label: Any, root: Any,
+                    pump: Optional[UiPump] = None, fragments: Optional[int] = None,
+                    options: Optional[DownloadOptions] = None) -> Optional[DownloadBatch]:
+    """Validate URLs and queue them; widgets are updated through the (shared) UI pump.
+
+    Callable from a worker thread, which keeps the journal writes of large
+    submissions off the main loop.
+    """
+    # Validate inputs with thread safety
+    if not urls or not isinstance(urls, list):
+        return None
+
+    # Enhanced URL validation
+    valid_urls = []
+    for url in urls:
+        if isinstance(url, str) and validate_youtube_url(url.strip()):
+            valid_urls.append(url.strip())
+
+    if not valid_urls:
+        def show_warning():
+            try:
+                messagebox.showwarning(translations["warning"], translations["warn_url"])
+            except Exception:
+                pass
+        if root and hasattr(root, 'after'):
+            root.after(0, show_warning)
+        return None
+
+    # Validate output directory
+    if not os.path.exists(DOWNLOAD_DIR):
+        try:
+            os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        except Exception as e:
+            message = f"Cannot create download directory: {e}"
+
+            def show_error():
+                try:
+                    messagebox.showerror("Error", message)
+                except Exception:
+                    pass
+            if root and hasattr(root, 'after'):
+                root.after(0, show_error)
+            return None
+
+    if pump is None:
+        pump = UiPump(root, log_view)
+        pump.start()
+    phase_texts = {PHASE_EXPAND: translations["phase_expand"],
+                   PHASE_PREPARE: translations["phase_prepare"],
+                   PHASE_DOWNLOAD: translations["phase_download"],
+                   PHASE_STAGED: translations["phase_staged"],
+                   PHASE_POST: translations["phase_post"]}
+
+    def on_batch_progress(job: DownloadJob, progress: JobProgress) -> None:
+        batch = job.batch
+        if batch is None or progress.phase not in phase_texts:
+            return
+        phase = phase_texts[progress.phase]
+
+        def update_progress():
+            # Runs on the main loop at most once per tick, so aggregate here
+            try:
+                fraction = batch.fraction()
+                speed = format_speed(batch.speed())
+                limit = get_bandwidth_governor().current_limit()
+                if speed and limit:
+                    speed += f" (limit {format_speed(limit)})"
+                downloads = batch.downloads()
+                finished = sum(1 for j in downloads if j.finished)
+                text = f"{translations['progress']} ({fraction * 100:.1f}%) · {finished}/{len(downloads)}"
+                discovery = batch.discovery()
+                if discovery:
+                    found, total = discovery
+                    text += f" · {found} of ~{total} discovered" if total else f" · {found} discovered"
+                progress_bar.configure(mode="determinate")
+                progress_bar.set(fraction)
+                phase_label.configure(text=phase)
+                prog_label.configure(text=text)
+                speed_label.configure(text=f"⚡ {speed}" if speed else "")
+            except Exception:
+                pass
+
+        pump.set("progress", update_progress)
+
+    def on_batch_done(batch: DownloadBatch) -> None:
+        canceled = batch.count(JOB_CANCELED)
+        failed = [job for job in batch.jobs if job.state == JOB_FAILED]
+        busy = download_manager.is_busy()
+
+        if canceled:
+            pump.log(f"❌ {canceled} download(s) canceled by user\n", "error")
+        if not busy and canceled < len(batch.jobs):
+            pump.log(translations["done"] + "\n")
+
+        def update_completion():
+            try:
+                if busy:
+                    return  # Other batches are still running; leave the progress display to them
+                if canceled == len(batch.jobs):
+                    phase_label.configure(text="⏹️ Canceled")
+                    prog_label.configure(text="Progress")
+                    progress_bar.set(0.0)
+                    speed_label.configure(text="")
+                else:
+                    progress_bar.set(1.0)
+                    speed_label.configure(text="")
+                    phase_label.configure(text=translations["phase_done"])
+                    prog_label.configure(text=f"{translations['progress']} (100%)")
+                if failed:
+                    messagebox.showerror(translations["error"],
+                                         f"{len(failed)} of {len(batch.jobs)} downloads failed:\n{failed[0].error}")
+            except Exception:
+                pass
+
+        # Same key as progress updates, so a stale progress tick cannot overwrite it
+        pump.set("progress", update_completion)
+
+    # Verify archived files so anything the user deleted is fetched again
+    if options is None:
+        options = DownloadOptions(codec_choice, res_choice, DOWNLOAD_DIR, verify_archive=True,
+                                  fragments=fragments)
+    # Job output goes to the job log (and from there to the log view) through the job's own logger
+    return download_manager.submit(valid_urls, options,
+                                   None, on_batch_done, on_batch_progress)
+
+# === Front-end for a running download service (python -m service) ===
+# The service module (http.server, http.client, ...) is only imported once a service is used
+SERVICE_RECONNECT_SECONDS = 2.0
+DEFAULT_SERVICE_ADDRESS = "http://127.0.0.1:8711"  # python -m service without --port
+
+def service_address(config: Dict[str, Any]) -> Optional[str]:
+    """`--attach [ADDRESS]` on the command line, else config.json's "service"; None runs the built-in engine"""
+    if "--attach" in sys.argv:
+        index = sys.argv.index("--attach")
+        value = sys.argv[index + 1] if index + 1 < len(sys.argv) else ""
+        return value if value and not value.startswith("--") else DEFAULT_SERVICE_ADDRESS
+    return config.get("service") or None
+
+INVALID_LINES_SHOWN = 10  # Invalid lines quoted in the log; the rest are counted
+
+def invalid_lines_message(invalid: List[str]) -> str:
+    """One warning for every invalid line of a submission"""
+    shown = ", ".join(invalid[:INVALID_LINES_SHOWN])
+    more = len(invalid) - INVALID_LINES_SHOWN
+    return f"⚠️ {len(invalid)} invalid line(s): {shown}" + (f" … and {more} more" if more > 0 else "")
+
+class ServiceFrontend:
+    """Drives the window from a download service instead of the built-in engine.
+
+    Submissions and cancels are sent from worker threads; the service's event
+    stream feeds the progress widgets through the UI pump and its job log
+    lines into the local log view.
+    """
+
+    def __init__(self, client: Any, pump: UiPump, prog_label: Any, speed_label: Any,
+                 progress_bar: Any, phase_label: Any):
+        self.client = client
+        self.pump = pump
+        self.widgets = (prog_label, speed_label, progress_bar, phase_label)
+        self._lock = threading.Lock()
+        self._jobs: Dict[int, Dict[str, Any]] = {}  # Latest event per job since the display was last idle
+        self._mirror_logs = True
+        self.closed = threading.Event()
+
+    def start(self) -> None:
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def submit(self, urls: List[str], codec_choice: str, res_choice: str, fragments: Optional[int]) -> None:
+        from service import ServiceError
+
+        def send():
+            try:
+                result = self.client.submit(urls, codec_choice, res_choice, fragments=fragments,
+                                            verify_archive=True)
+            except ServiceError as e:
+                self.pump.log(f"❌ {e}", "error")
+                return
+            with self._lock:
+                if all(event.get("event") == "job" for event in self._jobs.values()):
+                    self._jobs.clear()  # Everything shown had finished; start a fresh total
+                for job in result["jobs"]:
+                    self._jobs.setdefault(job["id"], {"event": "queued", "job": job["id"]})
+            if result["invalid"]:
+                self.pump.log(invalid_lines_message(result["invalid"]), "warning")
+            if result.get("already_queued"):
+                self.pump.log(f"ℹ️ {result['already_queued']} link(s) already queued on the service")
+            self.pump.set("progress", self._update_progress)
+        threading.Thread(target=send, daemon=True).start()
+
+    def cancel_all(self) -> None:
+        from service import ServiceError
+
+        def send():
+            try:
+                self.client.cancel()
+            except ServiceError as e:
+                self.pump.log(f"❌ {e}", "error")
+        threading.Thread(target=send, daemon=True).start()
+
+    def _listen(self) -> None:
+        from service import ServiceError
+        connected = True
+        while not self.closed.is_set():
+            try:
+                # A service in this very process already writes to our job log
+                self._mirror_logs = self.client.health().get("pid") != os.getpid()
+                for event in self.client.events():
+                    if not connected:
+                        connected = True
+                        self.pump.log(f"🔗 Reconnected to {self.client.address}")
+                    self._on_event(event)
+                    if self.closed.is_set():
+                        return
+            except ServiceError as e:
+                if connected:
+                    connected = False
+                    self.pump.log(f"⚠️ {e}; retrying", "warning")
+            self.closed.wait(SERVICE_RECONNECT_SECONDS)
+
+    def _on_event(self, event: Dict[str, Any]) -> None:
+        kind = event.get("event")
+        if kind == "log":
+            if self._mirror_logs:
+                get_job_log().append(level_of(event.get("level")), event.get("msg") or "", event.get("job") or 0)
+            return
+        if kind not in ("queued", "progress", "discovered", "job"):
+            return
+        with self._lock:
+            if kind != "queued" or event["job"] not in self._jobs:
+                self._jobs[event["job"]] = event
+        self.pump.set("progress", self._update_progress)
+
+    def _update_progress(self) -> None:
+        prog_label, speed_label, progress_bar, phase_label = self.widgets
+        with self._lock:
+            events = list(self._jobs.values())
+        if not events:
+            return
+        finished = [e for e in events if e["event"] == "job"]
+        running = [e for e in events if e["event"] == "progress"]
+        fraction = (len(finished) + sum(e.get("fraction") or 0 for e in running)) / len(events)
+        speed = format_speed(sum(e.get("speed") or 0 for e in running))
+        try:
+            progress_bar.configure(mode="determinate")
+            progress_bar.set(fraction)
+            prog_label.configure(text=f"{translations['progress']} ({fraction * 100:.1f}%) · "
+                                      f"{len(finished)}/{len(events)}")
+            speed_label.configure(text=f"⚡ {speed}" if speed and running else "")
+            if len(finished) == len(events):
+                failed = sum(1 for e in finished if e.get("state") == JOB_FAILED)
+                phase_label.configure(text=translations["phase_done"] if not failed
+                                      else f"{failed} of {len(events)} failed")
+            elif running:
+                latest = max(running, key=lambda e: e.get("time") or 0)
+                phase_label.configure(text=translations.get(f"phase_{latest.get('phase')}", ""))
+        except Exception:
+            pass
+
 def detect_system_theme():
     """Detect system theme (light/dark)"""
     try:
@@ -69,15 +623,30 @@ def get_theme_colors(theme_mode):
 
 def main():
     config = load_config()
+    configure_encoder_sessions(config.get("encoder_sessions"), config.get("spill_to_cpu", False))
+    configure_bandwidth(config.get("rate_limit"), config.get("rate_schedule"))
+    configure_encoder_goal(config.get("encoder_goal"))
+    configure_stream_cache(config.get("stream_cache_size"))
+    if config.get("metrics_port"):
+        try:
+            get_telemetry().serve(int(config["metrics_port"]))
+        except Exception as e:
+            print(f"Metrics endpoint error: {e}")
+    startup.mark("load config")
 
-    # === Validate FFMPEG before proceeding ===
-    if not FFMPEG_PATH:
-        messagebox.showerror("Error", "FFMPEG not found! Please install FFMPEG or place it in the application directory.")
-        return
+    # FFMPEG is located and validated in the background once the window is up (see background_startup)
 
     # === Auto-detect system theme ===
-    system_theme = detect_system_theme()
+    # macOS needs a `defaults` subprocess: start with the theme seen last time
+    # and refresh it in the background for the next start
+    if platform.system() == "Darwin" and config.get("theme") in ("light", "dark"):
+        system_theme = config["theme"]
+        threading.Thread(target=lambda: config.update(theme=detect_system_theme()), daemon=True).start()
+    else:
+        system_theme = detect_system_theme()
+        config["theme"] = system_theme
     colors = get_theme_colors(system_theme)
+    startup.mark("detect theme")
     
     # Extract colors for easier use
     BG_COLOR = colors["BG_COLOR"]
@@ -136,35 +705,64 @@ def main():
     input_frame = ctk.CTkFrame(container, fg_color="transparent")
     input_frame.pack(fill="x", padx=25, pady=(5, 10))
 
-    url_text = ctk.CTkEntry(input_frame, placeholder_text="Paste YouTube Link Here",
-                            fg_color=ACCENT_COLOR, text_color=TEXT_COLOR,
-                            border_color=BORDER_COLOR, border_width=1,
-                            placeholder_text_color=colors["PLACEHOLDER_COLOR"],
-                            height=40, corner_radius=12)
+    # One link per line; a line naming a .txt/.csv file queues every link in it
+    url_text = ctk.CTkTextbox(input_frame, fg_color=ACCENT_COLOR, text_color=TEXT_COLOR,
+                              border_color=BORDER_COLOR, border_width=1,
+                              height=72, corner_radius=12, wrap="none")
     url_text.pack(side="left", fill="x", expand=True, padx=(0, 10))
+    ingest_ids = itertools.count(1)
 
-    def start_or_cancel():
-        if download_btn.cget("text") == "Cancel":
-            cancel_download()
+    def queue_links(ingest: IngestResult, codec_choice: str, res_choice: str, fragments: Optional[int]) -> None:
+        # Runs on the ingest thread: queuing thousands of links means a journal fsync and a
+        # span per link, so only widget updates go back to the main loop through the pump
+        if not ingest.urls:
+            if not ingest.duplicates and not ingest.already_queued:
+                ui_pump.set(f"ingest {next(ingest_ids)}",
+                            lambda: messagebox.showwarning(translations["warning"], translations["warn_url"]))
+            return
+        if frontend:
+            frontend.submit(ingest.urls, codec_choice, res_choice, fragments)
             return
-        urls = [u.strip() for u in url_text.get().splitlines() if u.strip()]
-        if not urls:
+        if not download_manager.is_busy():
+            ui_pump.set("progress", lambda: progress_bar.set(0.0))
+        download_videos(ingest.urls, codec_choice, res_choice,
+                        log_view, prog_label, speed_label, download_btn, progress_bar, phase_label, root,
+                        ui_pump, fragments)
+
+    def start_download():
+        """Queue the entered URLs; works while other downloads are still running"""
+        text = url_text.get("1.0", "end")
+        if not text.strip():
             messagebox.showwarning(translations["warning"], translations["warn_url"])
             return
-        log_widget.delete("1.0", "end")
-        log_widget.insert("end", translations["start_download"] + "\n")
-        progress_bar.set(0.0)
-        download_btn.configure(text="Cancel")
-        threading.Thread(target=download_videos,
-                         args=(urls, codec_choice_var.get(), res_choice_var.get(),
-                               log_widget, prog_label, speed_label, download_btn, progress_bar, phase_label, root),
-                         daemon=True).start()
-
-    download_btn = ctk.CTkButton(input_frame, text="Download", command=start_or_cancel,
+        log_view.jump_to_end()  # Earlier lines stay in the log; filter or scroll up to see them
+        ui_pump.log(translations["start_download"])
+        choices = (codec_choice_var.get(), res_choice_var.get(), parse_fragments(fragments_var.get()))
+
+        def ingest_links():
+            # Lists of thousands of links and the files they name are read off the main loop
+            queued = set() if frontend else download_manager.queued_keys()  # The service checks its own queue
+            ingest = collect([text], queued, read_files=True)
+            if len(ingest.urls) > 1 or ingest.files or ingest.duplicates or ingest.already_queued:
+                ui_pump.log(f"📋 {ingest.summary()}")
+            if ingest.invalid:
+                ui_pump.log(invalid_lines_message(ingest.invalid), "warning")
+            queue_links(ingest, *choices)
+        threading.Thread(target=ingest_links, daemon=True).start()
+
+    download_btn = ctk.CTkButton(input_frame, text="Download", command=start_download,
                                  height=40, width=110, corner_radius=12,
                                  fg_color=PRIMARY_COLOR, hover_color=HOVER_COLOR, text_color="white")
     download_btn.pack(side="left")
 
+    cancel_btn = ctk.CTkButton(input_frame, text="Cancel",
+                               command=lambda: frontend.cancel_all() if frontend else cancel_download(),
+                               height=40, width=90, corner_radius=12,
+                               fg_color=SECONDARY_COLOR,
+                               hover_color="#4B5563" if system_theme == "dark" else "#D1D5DB",
+                               text_color=TEXT_COLOR)
+    cancel_btn.pack(side="left", padx=(10, 0))
+
     open_btn = ctk.CTkButton(input_frame, text="Open Folder", command=lambda: open_folder(DOWNLOAD_DIR),
                              height=40, width=120, corner_radius=12,
                              fg_color=SECONDARY_COLOR, 
@@ -189,21 +787,32 @@ def main():
                                 text_color=colors["LABEL_COLOR"])
     res_label.pack(side="left", padx=(165, 0))
 
+    parallel_label = ctk.CTkLabel(label_frame, text="Parallel",
+                                  font=("Arial", 11, "bold"),
+                                  text_color=colors["LABEL_COLOR"])
+    parallel_label.pack(side="right", padx=(0, 25))
+
+    fragments_label = ctk.CTkLabel(label_frame, text="Fragments",
+                                   font=("Arial", 11, "bold"),
+                                   text_color=colors["LABEL_COLOR"])
+    fragments_label.pack(side="right", padx=(0, 35))
+
+    limit_label = ctk.CTkLabel(label_frame, text="Limit",
+                               font=("Arial", 11, "bold"),
+                               text_color=colors["LABEL_COLOR"])
+    limit_label.pack(side="right", padx=(0, 58))
+
     # Now pack the option frame
     option_frame.pack(fill="x", padx=25, pady=(0, 15))
 
-    try:
-        available_codecs = detect_available_codecs(FFMPEG_PATH)
-        codec_values = list(available_codecs.keys())
-        
-        # Ensure we have at least one codec
-        if not codec_values:
-            codec_values = ["H.264 (CPU libx264)"]  # Fallback
-            messagebox.showwarning("Warning", "No hardware encoders detected. Using CPU encoding.")
-            
-    except Exception as e:
-        codec_values = ["H.264 (CPU libx264)"]  # Safe fallback
-        messagebox.showerror("Error", f"Codec detection failed: {e}")
+    # Warm cache: the full codec list is known without probing.
+    # Cold cache: open with CPU codecs and add hardware entries as they verify.
+    # Only a remembered, unchanged ffmpeg is used here; anything else is resolved in the background
+    cached_codecs = cached_available_codecs(cached_ffmpeg_path())
+    discovery_pending = cached_codecs is None
+    codec_values = list((cached_codecs if cached_codecs is not None else software_codecs()).keys())
+    if not codec_values:
+        codec_values = ["H.264 (CPU libx264)"]  # Fallback
 
     # Validate codec from config
     saved_codec = config.get("codec", "")
@@ -287,6 +896,87 @@ def main():
     except Exception:
         pass
 
+    # === Number of simultaneous downloads ===
+    try:
+        concurrency = int(config.get("concurrency", DEFAULT_CONCURRENCY))
+    except (TypeError, ValueError):
+        concurrency = DEFAULT_CONCURRENCY
+    concurrency = max(1, min(MAX_CONCURRENCY, concurrency))
+    download_manager.set_max_workers(concurrency)
+
+    parallel_var = ctk.StringVar(value=str(concurrency))
+    parallel_dropdown = ctk.CTkOptionMenu(
+        option_frame,
+        variable=parallel_var,
+        values=[str(n) for n in range(1, MAX_CONCURRENCY + 1)],
+        command=lambda value: download_manager.set_max_workers(int(value)),
+        fg_color=ACCENT_COLOR,
+        text_color=TEXT_COLOR,
+        button_color=ACCENT_COLOR,
+        button_hover_color="#374151" if system_theme == "dark" else "#DBEAFE",
+        dropdown_fg_color=CARD_COLOR,
+        dropdown_hover_color=PRIMARY_COLOR,
+        dropdown_text_color=TEXT_COLOR,
+        width=80,
+        height=40,
+        corner_radius=8,
+        font=("Arial", 12),
+        anchor="w"
+    )
+    parallel_dropdown.pack(side="right")
+
+    # === Parallel DASH/HLS fragments per stream ("Auto" tunes it per host) ===
+    fragment_values = ["Auto"] + [str(n) for n in FRAGMENT_LEVELS]
+    saved_fragments = str(config.get("fragments", "Auto"))
+    fragments_var = ctk.StringVar(value=saved_fragments if saved_fragments in fragment_values else "Auto")
+    fragments_dropdown = ctk.CTkOptionMenu(
+        option_frame,
+        variable=fragments_var,
+        values=fragment_values,
+        fg_color=ACCENT_COLOR,
+        text_color=TEXT_COLOR,
+        button_color=ACCENT_COLOR,
+        button_hover_color="#374151" if system_theme == "dark" else "#DBEAFE",
+        dropdown_fg_color=CARD_COLOR,
+        dropdown_hover_color=PRIMARY_COLOR,
+        dropdown_text_color=TEXT_COLOR,
+        width=80,
+        height=40,
+        corner_radius=8,
+        font=("Arial", 12),
+        anchor="w"
+    )
+    fragments_dropdown.pack(side="right", padx=(0, 10))
+
+    # === Total download rate of all jobs; applies to running downloads immediately ===
+    limit_values = ["Unlimited", "500K", "1M", "2M", "5M", "10M", "20M"]
+    saved_limit = str(config.get("rate_limit") or "Unlimited")
+    try:
+        if saved_limit not in limit_values and parse_rate(saved_limit):
+            limit_values.append(saved_limit)  # A custom rate set in config.json
+    except ValueError:
+        saved_limit = "Unlimited"
+    limit_var = ctk.StringVar(value=saved_limit if saved_limit in limit_values else "Unlimited")
+    limit_dropdown = ctk.CTkOptionMenu(
+        option_frame,
+        variable=limit_var,
+        values=limit_values,
+        command=lambda value: configure_bandwidth(value, config.get("rate_schedule")),
+        fg_color=ACCENT_COLOR,
+        text_color=TEXT_COLOR,
+        button_color=ACCENT_COLOR,
+        button_hover_color="#374151" if system_theme == "dark" else "#DBEAFE",
+        dropdown_fg_color=CARD_COLOR,
+        dropdown_hover_color=PRIMARY_COLOR,
+        dropdown_text_color=TEXT_COLOR,
+        width=100,
+        height=40,
+        corner_radius=8,
+        font=("Arial", 12),
+        anchor="w"
+    )
+    limit_dropdown.pack(side="right", padx=(0, 10))
+
     # === Callback function to show/hide resolution options ===
     def on_codec_change(*args):
         """Hide resolution dropdown when audio-only format is selected"""
@@ -309,6 +999,47 @@ def main():
     # Initialize the UI state based on current codec selection
     on_codec_change()
 
+    # === Background encoder discovery (cold cache only) ===
+    discovery_cancel = threading.Event()
+
+    def set_codec_values(names):
+        """Replace dropdown entries, keeping CODEC_MAP order"""
+        try:
+            if not codec_dropdown.winfo_exists():
+                return
+            ordered = [name for name in CODEC_MAP if name in names] or ["H.264 (CPU libx264)"]
+            codec_values[:] = ordered
+            codec_dropdown.configure(values=ordered)
+            current = codec_choice_var.get()
+            if saved_codec in ordered and current == default_codec:
+                codec_choice_var.set(saved_codec)  # Restore a saved hardware codec
+            elif current not in ordered:
+                codec_choice_var.set(ordered[0])
+        except Exception:
+            pass
+
+    def on_codec_verified(name, args):
+        if name not in codec_values:
+            root.after(0, lambda: set_codec_values(codec_values + [name]))
+
+    def discover_codecs(ffmpeg_path):
+        try:
+            found = detect_available_codecs(ffmpeg_path, on_codec=on_codec_verified,
+                                            cancel_event=discovery_cancel)
+        except Exception as e:
+            message = f"Codec detection failed: {e}"
+            root.after(0, lambda: messagebox.showerror("Error", message))
+            return
+        if discovery_cancel.is_set():
+            return
+        timings = format_detection_timings()
+
+        def finish():
+            set_codec_values(list(found.keys()))
+            ui_pump.log(f"🔍 Encoder discovery: {timings}")
+        root.after(0, finish)
+
+
     # === Progress Section ===
     prog_label = ctk.CTkLabel(container, text="Progress", font=("Arial", 12, "bold"), text_color=PRIMARY_COLOR)
     prog_label.pack(anchor="w", padx=25, pady=(0, 2))
@@ -325,25 +1056,111 @@ def main():
     speed_label.pack(anchor="e", padx=25, pady=(0, 5))
 
     # === Logs Section ===
-    log_label = ctk.CTkLabel(container, text="Logs", font=("Arial", 12, "bold"), text_color=PRIMARY_COLOR)
-    log_label.pack(anchor="w", padx=25, pady=(0, 2))
+    log_header = ctk.CTkFrame(container, fg_color="transparent")
+    log_header.pack(fill="x", padx=25, pady=(0, 4))
+    log_label = ctk.CTkLabel(log_header, text="Logs", font=("Arial", 12, "bold"), text_color=PRIMARY_COLOR)
+    log_label.pack(side="left")
+    log_status = ctk.CTkLabel(log_header, text="", font=("Arial", 11), text_color=colors["LABEL_COLOR"])
+    log_status.pack(side="left", padx=(8, 0))
+
+    # Filters: job number, minimum level and text (searched through the whole log on disk)
+    log_job_entry = ctk.CTkEntry(log_header, placeholder_text="Job #", width=60, height=28,
+                                 fg_color=ACCENT_COLOR, text_color=TEXT_COLOR,
+                                 border_color=BORDER_COLOR, border_width=1,
+                                 placeholder_text_color=colors["PLACEHOLDER_COLOR"], corner_radius=8)
+    log_job_entry.pack(side="right")
+    log_level_var = ctk.StringVar(value=next(iter(LOG_LEVEL_FILTERS)))
+    log_level_dropdown = ctk.CTkOptionMenu(
+        log_header,
+        variable=log_level_var,
+        values=list(LOG_LEVEL_FILTERS),
+        command=lambda value: apply_log_filter(),
+        fg_color=ACCENT_COLOR,
+        text_color=TEXT_COLOR,
+        button_color=ACCENT_COLOR,
+        button_hover_color="#374151" if system_theme == "dark" else "#DBEAFE",
+        dropdown_fg_color=CARD_COLOR,
+        dropdown_hover_color=PRIMARY_COLOR,
+        dropdown_text_color=TEXT_COLOR,
+        width=110,
+        height=28,
+        corner_radius=8,
+        font=("Arial", 12),
+        anchor="w"
+    )
+    log_level_dropdown.pack(side="right", padx=(0, 6))
+    log_text_entry = ctk.CTkEntry(log_header, placeholder_text="Filter logs", width=160, height=28,
+                                  fg_color=ACCENT_COLOR, text_color=TEXT_COLOR,
+                                  border_color=BORDER_COLOR, border_width=1,
+                                  placeholder_text_color=colors["PLACEHOLDER_COLOR"], corner_radius=8)
+    log_text_entry.pack(side="right", padx=(0, 6))
 
-    log_widget = ctk.CTkTextbox(container, height=140, fg_color=ACCENT_COLOR, text_color=TEXT_COLOR,
-                                border_width=1, border_color=BORDER_COLOR, corner_radius=12)
-    log_widget.pack(fill="both", expand=True, padx=25, pady=(0, 20))
+    log_body = ctk.CTkFrame(container, fg_color="transparent")
+    log_body.pack(fill="both", expand=True, padx=25, pady=(0, 20))
+    log_widget = ctk.CTkTextbox(log_body, height=140, fg_color=ACCENT_COLOR, text_color=TEXT_COLOR,
+                                border_width=1, border_color=BORDER_COLOR, corner_radius=12,
+                                activate_scrollbars=False, wrap="none")
+    log_scrollbar = ctk.CTkScrollbar(log_body)
+    log_scrollbar.pack(side="right", fill="y", padx=(4, 0))
+    log_widget.pack(side="left", fill="both", expand=True)
     log_widget.tag_config("warning", foreground=colors["WARNING_COLOR"])
     log_widget.tag_config("error", foreground=colors["ERROR_COLOR"])
 
+    # The text box only ever holds the lines in view; the log itself lives on disk
+    log_view = LogView(log_widget, log_scrollbar, get_job_log(),
+                       on_status=lambda text: log_status.configure(text=text))
+    log_scrollbar.configure(command=log_view.scroll)
+    for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+        log_widget.bind(sequence, log_view.on_wheel)
+    log_widget.bind("<Configure>", log_view.on_resize)
+
+    log_filter_after: List[Any] = [None]
+
+    def apply_log_filter():
+        log_filter_after[0] = None
+        job = log_job_entry.get().strip().lstrip("#")
+        log_view.set_filter(LOG_LEVEL_FILTERS.get(log_level_var.get(), LEVEL_DEBUG),
+                            int(job) if job.isdigit() else None, log_text_entry.get())
+
+    def schedule_log_filter(event=None):
+        if log_filter_after[0] is not None:
+            root.after_cancel(log_filter_after[0])
+        log_filter_after[0] = root.after(LOG_FILTER_DELAY_MS, apply_log_filter)
+
+    log_text_entry.bind("<KeyRelease>", schedule_log_filter)
+    log_job_entry.bind("<KeyRelease>", schedule_log_filter)
+
+    # All worker-thread UI updates go through one rate-limited pump
+    ui_pump = UiPump(root, log_view)
+    ui_pump.start()
+
+    # Attached to a download service, the window only submits, cancels and shows progress;
+    # downloads keep running there when the window closes
+    address = service_address(config)
+    frontend = None
+    if address:
+        from service import ServiceClient
+        frontend = ServiceFrontend(ServiceClient(address), ui_pump, prog_label, speed_label, progress_bar,
+                                   phase_label)
+        ui_pump.log(f"🔗 Using the download service at {frontend.client.address}")
+        frontend.start()
+
     # === Enhanced Context Menu with widget validation ===
+    def add_lines(text: str) -> None:
+        """Append text on lines of its own below what is already in the box"""
+        current = url_text.get("1.0", "end-1c")
+        if current and not current.endswith("\n"):
+            text = "\n" + text
+        url_text.insert("end", text.rstrip("\n") + "\n")
+        url_text.see("end")
+
     def paste_text():
         try:
             if not url_text.winfo_exists():
                 return
             clip = root.clipboard_get()
             if clip:
-                # Clear existing text and insert new
-                url_text.delete(0, "end")
-                url_text.insert(0, clip)
+                add_lines(clip)
         except Exception:
             pass
 
@@ -351,13 +1168,29 @@ def main():
         try:
             if not url_text.winfo_exists():
                 return
-            text = url_text.get()
+            text = url_text.get("1.0", "end-1c")
             if text:
                 root.clipboard_clear()
                 root.clipboard_append(text)
         except Exception:
             pass
 
+    def add_list_files():
+        try:
+            paths = filedialog.askopenfilenames(
+                parent=root, title="Add links from files",
+                filetypes=[("Link lists", "*.txt *.list *.csv *.tsv"), ("All files", "*.*")])
+            if paths:
+                add_lines("\n".join(paths))
+        except Exception:
+            pass
+
+    def clear_text():
+        try:
+            url_text.delete("1.0", "end")
+        except Exception:
+            pass
+
     def show_context_menu(event):
         try:
             if url_text.winfo_exists() and menu.winfo_exists():
@@ -371,17 +1204,42 @@ def main():
                 relief="flat", bd=0)
     menu.add_command(label="Copy", command=copy_text)
     menu.add_command(label="Paste", command=paste_text)
+    menu.add_command(label="Add from files…", command=add_list_files)
+    menu.add_command(label="Clear", command=clear_text)
 
     url_text.bind("<Button-3>", show_context_menu)
 
+    def on_drop(event):
+        # Dropped files go in as paths, so their links are read with the rest of the box
+        try:
+            paths = root.tk.splitlist(event.data)
+            add_lines("\n".join(paths) if paths and all(os.path.isfile(p) for p in paths) else event.data)
+        except Exception:
+            pass
+        return event.action
+
+    if TkinterDnD is not None:
+        try:
+            TkinterDnD._require(root)
+            url_text._textbox.drop_target_register(DND_FILES, DND_TEXT)
+            url_text._textbox.dnd_bind("<<Drop>>", on_drop)
+        except Exception as e:
+            print(f"Drag and drop unavailable: {e}")
+
     # === Enhanced Close Handler ===
     def on_close():
         try:
-            # Cancel any ongoing downloads
-            cancel_download()
+            # Cancel any ongoing downloads and encoder discovery
+            if frontend:
+                frontend.closed.set()
+            else:
+                cancel_download()
+            discovery_cancel.set()
             
-            # Save configuration safely
-            config_data = {}
+            # Save configuration safely (settings without a widget are kept as they were)
+            config_data = {key: config[key] for key in ("encoder_sessions", "spill_to_cpu", "rate_schedule",
+                                                        "theme", "metrics_port", "encoder_goal",
+                                                        "stream_cache_size", "service") if key in config}
             try:
                 config_data["codec"] = codec_choice_var.get()
             except Exception:
@@ -390,6 +1248,18 @@ def main():
                 config_data["resolution"] = res_choice_var.get()
             except Exception:
                 pass
+            try:
+                config_data["concurrency"] = int(parallel_var.get())
+            except Exception:
+                pass
+            try:
+                config_data["fragments"] = fragments_var.get()
+            except Exception:
+                pass
+            try:
+                config_data["rate_limit"] = limit_var.get()
+            except Exception:
+                pass
             try:
                 config_data["geometry"] = root.geometry()
             except Exception:
@@ -407,6 +1277,72 @@ def main():
                 pass
 
     root.protocol("WM_DELETE_WINDOW", on_close)
+
+    # === Offer to resume downloads left unfinished by the last session ===
+    def offer_resume():
+        if frontend:
+            return  # Unfinished jobs belong to the service (python -m service --resume)
+        try:
+            journal = download_manager.journal
+            unfinished = journal.pending() if journal else []
+            if not unfinished:
+                return
+            if messagebox.askyesno(translations["resume_title"],
+                                   translations["resume_prompt"].format(count=len(unfinished))):
+                ui_pump.log(translations["start_download"])
+
+                def resubmit():
+                    # Off the main loop, like new links: every job is journaled again
+                    try:
+                        for options, urls in resumable_batches(unfinished):
+                            download_videos(urls, options.codec_choice, options.res_choice,
+                                            log_view, prog_label, speed_label, download_btn, progress_bar,
+                                            phase_label, root, ui_pump, options=options)
+                        journal.discard(unfinished)  # Resubmitted under new journal entries
+                    except Exception as e:
+                        print(f"Resume error: {e}")
+                threading.Thread(target=resubmit, daemon=True).start()
+            else:
+                journal.discard(unfinished, remove_partials=True)
+        except Exception as e:
+            print(f"Resume error: {e}")
+
+    # === Startup work deferred until the window is painted ===
+    def ffmpeg_missing():
+        messagebox.showerror("Error", "FFMPEG not found! Please install FFMPEG or place it in the application directory.")
+        on_close()
+
+    def background_startup():
+        with startup.span("ffmpeg discovery"):
+            ffmpeg_path = get_ffmpeg_path()
+        if not ffmpeg_path:
+            root.after(0, ffmpeg_missing)
+            return
+        if discovery_pending:
+            with startup.span("codec discovery"):
+                discover_codecs(ffmpeg_path)
+
+    def preload_engine():
+        with startup.span("yt-dlp preload"):
+            preload_yt_dlp()
+
+    def painted():
+        root.update_idletasks()
+        startup.mark("first paint")
+        tasks = [threading.Thread(target=target, daemon=True) for target in (background_startup, preload_engine)]
+        for task in tasks:
+            task.start()
+        if startup.enabled():
+            def finish_profile():
+                for task in tasks:
+                    task.join()
+                root.after(0, lambda: (startup.write_report(BASE_DIR), on_close()))
+            threading.Thread(target=finish_profile, daemon=True).start()
+
+    startup.mark("build window")
+    root.after(0, painted)
+    if not startup.enabled():
+        root.after(500, offer_resume)
     
     # Handle application shutdown gracefully
     try: